@@ -0,0 +1,148 @@
+# answer_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """Answer cache looked up by question-embedding similarity.
+
+    Question vectors live in one preallocated float32 matrix, so a lookup is a
+    single matmul over every live entry. Entries are evicted least-recently-used
+    once `max_entries` is reached, and ignored once older than `ttl` seconds.
+    The cache is keyed on meaning only, so it can be shared across API keys.
+    """
+
+    def __init__(self, threshold: float = 0.9, max_entries: int = 1000, ttl: float = 1800.0):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # slot -> entry, oldest use first
+        self._matrix = None
+        self._live = np.zeros(max_entries, dtype=bool)
+
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self.saved_tokens = 0
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def _evict(self, slot: int):
+        self._entries.pop(slot, None)
+        self._live[slot] = False
+
+    def lookup(self, vector) -> Optional[Dict]:
+        """Return the cached response for the closest prior question, if close enough"""
+        query = self._normalize(vector)
+        now = time.time()
+        with self._lock:
+            if self._matrix is None or not self._entries:
+                self.misses += 1
+                return None
+
+            scores = self._matrix @ query
+            scores[~self._live] = -np.inf
+            while True:
+                slot = int(np.argmax(scores))
+                if scores[slot] < self.threshold:
+                    self.misses += 1
+                    return None
+                entry = self._entries[slot]
+                if now - entry["created"] <= self.ttl:
+                    break
+                self._evict(slot)
+                scores[slot] = -np.inf
+
+            self._entries.move_to_end(slot)
+            self.hits += 1
+            self.saved_seconds += entry["latency"]
+            self.saved_tokens += entry["tokens"]
+            return {
+                "answer": entry["answer"],
+                "sources": list(entry["sources"]),
+                "cached_question": entry["question"],
+                "similarity": float(scores[slot])
+            }
+
+    def store(self, question: str, vector, response: Dict, latency: float = 0.0, tokens: int = 0):
+        """Remember a response along with what it cost to produce"""
+        query = self._normalize(vector)
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.zeros((self.max_entries, len(query)), dtype=np.float32)
+
+            if len(self._entries) >= self.max_entries:
+                self._evict(next(iter(self._entries)))
+            slot = int(np.argmin(self._live))  # first free slot
+
+            self._matrix[slot] = query
+            self._live[slot] = True
+            self._entries[slot] = {
+                "question": question,
+                "answer": response["answer"],
+                "sources": list(response.get("sources", [])),
+                "created": time.time(),
+                "latency": latency,
+                "tokens": tokens
+            }
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "saved_seconds": self.saved_seconds,
+                "saved_tokens": self.saved_tokens
+            }
+
+
+class RecentAnswers:
+    """Exact-repeat answer cache shared by every session of the app.
+
+    Keyed by (question, API key fingerprint), never the key itself. Each
+    entry expires `ttl` seconds after it was stored and the least recently
+    used go first past `max_entries`; every access holds one lock, since
+    sessions run on their own threads.
+    """
+
+    def __init__(self, max_entries: int = 500, ttl: float = 1800.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (question, fingerprint) -> (expires at, response)
+
+    def get(self, question: str, fingerprint: str) -> Optional[Dict]:
+        key = (question, fingerprint)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, question: str, fingerprint: str, response: Dict):
+        with self._lock:
+            self._entries[question, fingerprint] = (time.monotonic() + self.ttl, response)
+            self._entries.move_to_end((question, fingerprint))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,89 @@
+# answer_client.py
+
+import json
+import threading
+from typing import Dict, Iterator, Optional
+
+from chatengine import error_answer
+
+BUSY_ANSWER = "Sorry yaar, abhi bahut saare sawaal ek saath aa rahe hain. Thodi der mein phir se try karo!"
+
+_http_client = None
+_http_lock = threading.Lock()
+
+
+def shared_service_client():
+    """One pooled HTTP client for every key's AnswerServiceClient in the process"""
+    global _http_client
+    with _http_lock:
+        if _http_client is None:
+            import httpx
+
+            _http_client = httpx.Client(timeout=httpx.Timeout(120.0, connect=5.0))
+        return _http_client
+
+
+class AnswerServiceClient:
+    """ChatEngine stand-in that asks a running answer_service over HTTP.
+
+    Same `get_answer`/`stream_answer` as ChatEngine, so the Streamlit app can
+    hand questions to the service instead of retrieving and generating
+    in-process. A busy service (503) or an unreachable one comes back as an
+    answer, like ChatEngine's errors.
+    """
+
+    def __init__(self, base_url: str, api_key: str):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+
+    @property
+    def headers(self) -> Dict:
+        return {"Authorization": f"Bearer {self.api_key}"}
+
+    def get_answer(self, question: str) -> Dict:
+        try:
+            response = shared_service_client().post(
+                f"{self.base_url}/answer", json={"question": question}, headers=self.headers
+            )
+            if response.status_code == 503:
+                return {"answer": BUSY_ANSWER, "sources": []}
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            return {"answer": error_answer(e), "sources": []}
+
+    def stream_answer(self, question: str) -> Iterator[Dict]:
+        """Events as the service streams them: sources, text deltas, then usage.
+
+        A failed or turned-away answer starts with an {"type": "error"} event.
+        """
+        sources_sent = False
+        try:
+            with shared_service_client().stream(
+                "POST", f"{self.base_url}/stream", json={"question": question}, headers=self.headers
+            ) as response:
+                if response.status_code == 503:
+                    yield {"type": "error", "error": "Busy"}
+                    yield {"type": "sources", "sources": []}
+                    yield {"type": "delta", "text": BUSY_ANSWER}
+                    return
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if line:
+                        event = json.loads(line)
+                        sources_sent = sources_sent or event["type"] == "sources"
+                        yield event
+        except Exception as e:
+            yield {"type": "error", "error": type(e).__name__}
+            if not sources_sent:
+                yield {"type": "sources", "sources": []}
+            yield {"type": "delta", "text": error_answer(e)}
+
+    def stats(self) -> Optional[Dict]:
+        """Counters of whichever worker answers, or None if the service can't be reached"""
+        try:
+            response = shared_service_client().get(f"{self.base_url}/health", timeout=1.0)
+            response.raise_for_status()
+            return response.json()
+        except Exception:
+            return None
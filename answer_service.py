@@ -0,0 +1,535 @@
+# answer_service.py
+#
+# Headless HTTP answer service: AsyncChatEngine on an event loop per worker
+# process, every worker serving off the same memory-mapped index.
+#
+#   POST /answer   {"question": ...} -> {"answer", "sources", "usage", "coalesced"}
+#   POST /stream   {"question": ...} -> NDJSON, one stream_answer event per line
+#   GET  /health   this worker's counters
+#   GET  /metrics  this worker's tracer, Prometheus text
+#
+# Every question needs an `Authorization: Bearer <key>`, checked with the
+# free `models.list` call (verdicts cached per worker) and billed for the
+# answers it starts. Only with ANSWER_ALLOW_SERVER_KEY=1 do requests without
+# one fall back to the operator's OPENAI_API_KEY. Listens on 127.0.0.1
+# unless --host says otherwise.
+#
+#   python answer_service.py --port 8000 --workers 4
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from answer_cache import SemanticAnswerCache
+from async_chatengine import AsyncChatEngine, close_shared_clients
+from answer_client import BUSY_ANSWER
+from credentials import INVALID_KEY_TTL, VALID_KEY_TTL, KeyValidator, key_fingerprint
+from query_cache import QueryEmbeddingCache, normalize_query
+from reranker import MMR_LAMBDA, Reranker
+from tracing import incr, observe, tracer
+from vector_store import VectorStore
+
+logger = logging.getLogger(__name__)
+
+# Upstream answers one worker runs at once, and how many more may queue for
+# a slot (for at most QUEUE_TIMEOUT seconds) before requests get a 503
+MAX_INFLIGHT = 64
+MAX_QUEUE = 256
+QUEUE_TIMEOUT = 10.0
+MAX_BODY_BYTES = 64 * 1024
+# Upstream errors that mean the key itself is bad, not the request
+AUTH_ERRORS = ("AuthenticationError", "PermissionDeniedError")
+
+STATUS_TEXT = {
+    200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+    405: "Method Not Allowed", 413: "Payload Too Large", 503: "Service Unavailable"
+}
+
+
+class Flight:
+    """One upstream answer, replayed to every request that joined it"""
+
+    def __init__(self):
+        self.events = []
+        self.done = False
+        self.joined = 0
+        self.task = None
+        self._changed = asyncio.Event()
+
+    def publish(self, event: Dict = None, done: bool = False):
+        if event is not None:
+            self.events.append(event)
+        self.done = self.done or done
+        # Wake everyone waiting on the current event, then start a new one
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self) -> AsyncIterator[Dict]:
+        """Every event so far, then the rest as they arrive"""
+        i = 0
+        while True:
+            while i < len(self.events):
+                yield self.events[i]
+                i += 1
+            if self.done:
+                return
+            await self._changed.wait()
+
+
+class SingleFlight:
+    """Identical questions in flight at the same time share one upstream call.
+
+    Keyed on the normalized question (the query cache's key). A flight runs
+    as its own task, so it finishes, and lands in the answer cache, even if
+    the request that started it disconnects. It is forgotten once done; later
+    repeats are the answer cache's job.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.flights: Dict[str, Flight] = {}
+        self.started = 0
+        self.joined = 0
+
+    def get(self, key: str) -> Optional[Flight]:
+        flight = self.flights.get(key) if self.enabled else None
+        if flight is not None:
+            flight.joined += 1
+            self.joined += 1
+        return flight
+
+    def start(self, key: str, events: AsyncIterator[Dict], on_done=None) -> Flight:
+        flight = Flight()
+        self.started += 1
+        if self.enabled:
+            self.flights[key] = flight
+
+        async def pump():
+            try:
+                async for event in events:
+                    flight.publish(event)
+            finally:
+                flight.publish(done=True)
+                if self.flights.get(key) is flight:
+                    del self.flights[key]
+                if on_done is not None:
+                    on_done()
+
+        flight.task = asyncio.ensure_future(pump())
+        return flight
+
+
+class Admission:
+    """At most `max_inflight` flights run; up to `max_queue` more wait for a slot.
+
+    Anything beyond that, or waiting longer than `timeout`, is turned away
+    straight off instead of piling onto a backlog nobody will wait for.
+    """
+
+    def __init__(self, max_inflight: int, max_queue: int, timeout: float):
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.running = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._slots = asyncio.Semaphore(max_inflight)
+
+    async def acquire(self) -> bool:
+        if self._slots.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            incr("service_rejections", reason="queue_full")
+            return False
+        start = time.perf_counter()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            incr("service_rejections", reason="queue_timeout")
+            return False
+        finally:
+            self.waiting -= 1
+        observe("service.queue_wait", time.perf_counter() - start)
+        self.running += 1
+        return True
+
+    def release(self):
+        self.running -= 1
+        self._slots.release()
+
+
+class AnswerService:
+    """HTTP front for AsyncChatEngine with single-flight and admission control.
+
+    One per worker process and event loop. Engines are per API key (up to
+    `max_engines`) on the shared store, answer cache and reranker, like the
+    Streamlit app's.
+    """
+
+    def __init__(
+        self,
+        vector_store: VectorStore,
+        answer_cache: Optional[SemanticAnswerCache] = None,
+        reranker: Optional[Reranker] = None,
+        max_inflight: int = None,
+        max_queue: int = None,
+        queue_timeout: float = None,
+        single_flight: bool = None,
+        max_engines: int = None,
+        api_key: str = None,
+        allow_server_key: bool = None,
+        key_validator: KeyValidator = None
+    ):
+        self.vector_store = vector_store
+        self.answer_cache = answer_cache
+        self.reranker = reranker
+        # The operator's key answers keyless requests only when asked to
+        if allow_server_key is None:
+            allow_server_key = os.getenv("ANSWER_ALLOW_SERVER_KEY", "0") == "1"
+        self.server_key = (api_key or os.getenv("OPENAI_API_KEY")) if allow_server_key else None
+        self.key_validator = key_validator or KeyValidator(
+            ttl=float(os.getenv("KEY_CHECK_TTL", VALID_KEY_TTL)),
+            invalid_ttl=float(os.getenv("INVALID_KEY_CHECK_TTL", INVALID_KEY_TTL))
+        )
+        self.max_engines = max_engines or int(os.getenv("MAX_CHAT_ENGINES", "1000"))
+        self._engines = OrderedDict()  # key fingerprint -> AsyncChatEngine
+        self._key_checks = {}  # key fingerprint -> in-flight validation, shared by its requests
+        self.admission = Admission(
+            max_inflight or int(os.getenv("ANSWER_MAX_INFLIGHT", MAX_INFLIGHT)),
+            max_queue if max_queue is not None else int(os.getenv("ANSWER_MAX_QUEUE", MAX_QUEUE)),
+            queue_timeout or float(os.getenv("ANSWER_QUEUE_TIMEOUT", QUEUE_TIMEOUT))
+        )
+        if single_flight is None:
+            single_flight = os.getenv("ANSWER_SINGLE_FLIGHT", "1") != "0"
+        self.single_flight = SingleFlight(enabled=single_flight)
+
+    def engine(self, api_key: str) -> AsyncChatEngine:
+        key_id = key_fingerprint(api_key)
+        engine = self._engines.get(key_id)
+        if engine is None:
+            engine = self._engines[key_id] = AsyncChatEngine(
+                api_key=api_key,
+                vector_store=self.vector_store,
+                answer_cache=self.answer_cache,
+                reranker=self.reranker
+            )
+            while len(self._engines) > self.max_engines:
+                self._engines.popitem(last=False)
+        self._engines.move_to_end(key_id)
+        return engine
+
+    async def check_key(self, api_key: str) -> Optional[bool]:
+        """True/False for a good/bad key (cached), None if OpenAI couldn't be reached.
+
+        Concurrent first requests on one key wait on a single validation.
+        """
+        fingerprint = key_fingerprint(api_key)
+        check = self._key_checks.get(fingerprint)
+        if check is None:
+            check = asyncio.ensure_future(asyncio.to_thread(self.key_validator.validate, api_key))
+            self._key_checks[fingerprint] = check
+            check.add_done_callback(lambda _: self._key_checks.pop(fingerprint, None))
+        try:
+            # Shielded: one waiter going away doesn't cancel everyone's check
+            return await asyncio.shield(check)
+        except Exception:
+            return None
+
+    async def flight(self, question: str, api_key: str) -> Tuple[Optional[Flight], bool]:
+        """(flight answering `question`, whether it was joined rather than started); None when turned away.
+
+        `api_key` must already be validated: flights are only ever started,
+        and so joined, on checked keys.
+        """
+        key = normalize_query(question)
+        flight = self.single_flight.get(key)
+        if flight is not None:
+            incr("service_requests", outcome="joined")
+            return flight, True
+        if not await self.admission.acquire():
+            incr("service_requests", outcome="rejected")
+            return None, False
+        # Someone may have started the same question while this one queued
+        flight = self.single_flight.get(key)
+        if flight is not None:
+            self.admission.release()
+            incr("service_requests", outcome="joined")
+            return flight, True
+        incr("service_requests", outcome="started")
+        events = self.engine(api_key).stream_answer(question)
+        return self.single_flight.start(key, events, on_done=self.admission.release), False
+
+    async def events(self, flight: Flight, joined: bool, question: str, api_key: str) -> AsyncIterator[Dict]:
+        """One request's answer events from its flight.
+
+        The starter gets its own key's error answer if the flight fails
+        (after an {"type": "error"} event, so clients don't keep it). A
+        request that joined never gets another key's failure: it answers the
+        question again on its own key instead.
+        """
+        sources_sent = False
+        async for event in flight.subscribe():
+            if event["type"] == "error":
+                if not joined:
+                    if event["error"] in AUTH_ERRORS:
+                        self.key_validator.forget(api_key)
+                    yield event
+                    continue
+                incr("service_requests", outcome="retried")
+                async for own in self._own_answer(question, api_key):
+                    if own["type"] == "sources" and sources_sent:
+                        continue
+                    yield own
+                return
+            sources_sent = sources_sent or event["type"] == "sources"
+            yield event
+
+    async def _own_answer(self, question: str, api_key: str) -> AsyncIterator[Dict]:
+        """An unshared answer on `api_key`, within admission control"""
+        if not await self.admission.acquire():
+            yield {"type": "error", "error": "Busy"}
+            yield {"type": "sources", "sources": []}
+            yield {"type": "delta", "text": BUSY_ANSWER}
+            return
+        try:
+            async for event in self.engine(api_key).stream_answer(question):
+                if event["type"] == "error" and event["error"] in AUTH_ERRORS:
+                    self.key_validator.forget(api_key)
+                yield event
+        finally:
+            self.admission.release()
+
+    def stats(self) -> Dict:
+        return {
+            "worker": os.getpid(),
+            "in_flight": self.admission.running,
+            "queued": self.admission.waiting,
+            "rejected": self.admission.rejected,
+            "flights": self.single_flight.started,
+            "coalesced": self.single_flight.joined,
+            "answer_cache": self.answer_cache.stats() if self.answer_cache is not None else None
+        }
+
+    # HTTP/1.1 with keep-alive, just enough for JSON in and JSON/NDJSON out
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY_BYTES:
+                    await self._send_json(writer, 413, {"error": "request body too large"}, close=True)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                await self._dispatch(writer, method, path.split("?")[0], headers, body, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, writer, method: str, path: str, headers: Dict, body: bytes, keep_alive: bool):
+        close = not keep_alive
+        if path == "/health" and method == "GET":
+            return await self._send_json(writer, 200, dict(self.stats(), status="ok"), close=close)
+        if path == "/metrics" and method == "GET":
+            return await self._send(
+                writer, 200, tracer.render_prometheus().encode("utf-8"),
+                "text/plain; version=0.0.4; charset=utf-8", close=close
+            )
+        if path not in ("/answer", "/stream"):
+            return await self._send_json(writer, 404, {"error": f"unknown path {path}"}, close=close)
+        if method != "POST":
+            return await self._send_json(writer, 405, {"error": "use POST"}, close=close)
+
+        # 1. Question and key
+        try:
+            question = (json.loads(body or b"{}").get("question") or "").strip()
+        except (ValueError, AttributeError):
+            question = ""
+        if not question:
+            return await self._send_json(writer, 400, {"error": "body must be JSON with a \"question\""}, close=close)
+        api_key = headers.get("authorization", "").removeprefix("Bearer ").strip() or self.server_key
+        if not api_key:
+            return await self._send_json(writer, 401, {"error": "no API key (Authorization: Bearer <key>)"}, close=close)
+        valid = await self.check_key(api_key)
+        if valid is None:
+            return await self._send_json(
+                writer, 503, {"error": "couldn't reach OpenAI to check the API key"},
+                close=close, extra={"Retry-After": "1"}
+            )
+        if not valid:
+            return await self._send_json(writer, 401, {"error": "invalid API key"}, close=close)
+
+        # 2. Join the question's flight, or start one if there's room
+        start = time.perf_counter()
+        flight, coalesced = await self.flight(question, api_key)
+        if flight is None:
+            return await self._send_json(
+                writer, 503, {"error": "too many questions in flight, try again shortly"},
+                close=close, extra={"Retry-After": "1"}
+            )
+        events = self.events(flight, coalesced, question, api_key)
+
+        # 3. Stream events as they come, or collect them into one answer
+        if path == "/stream":
+            await self._send_stream(writer, events, close=close)
+        else:
+            parts, sources, usage, error = [], [], None, None
+            async for event in events:
+                if event["type"] == "error":
+                    error = event["error"]
+                elif event["type"] == "sources":
+                    sources = event["sources"]
+                elif event["type"] == "delta":
+                    parts.append(event["text"])
+                elif event["type"] == "usage":
+                    usage = event["usage"]
+            result = {"answer": "".join(parts).strip(), "sources": sources, "coalesced": coalesced}
+            if usage:
+                result["usage"] = usage
+            if error:
+                result["error"] = error
+            await self._send_json(writer, 200, result, close=close)
+        observe("service.request", time.perf_counter() - start)
+
+    @staticmethod
+    def _head(status: int, headers: Dict, close: bool) -> bytes:
+        lines = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        if close:
+            lines.append("Connection: close")
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    async def _send(self, writer, status: int, body: bytes, content_type: str, close: bool = False, extra: Dict = None):
+        headers = {"Content-Type": content_type, "Content-Length": str(len(body)), **(extra or {})}
+        writer.write(self._head(status, headers, close) + body)
+        await writer.drain()
+
+    async def _send_json(self, writer, status: int, payload: Dict, close: bool = False, extra: Dict = None):
+        await self._send(writer, status, json.dumps(payload).encode("utf-8"), "application/json", close, extra)
+
+    async def _send_stream(self, writer, events: AsyncIterator[Dict], close: bool = False):
+        writer.write(self._head(200, {"Content-Type": "application/x-ndjson", "Transfer-Encoding": "chunked"}, close))
+        async for event in events:
+            data = (json.dumps(event) + "\n").encode("utf-8")
+            writer.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+
+def make_service(vector_store: VectorStore) -> AnswerService:
+    """Service with the same caches and reranker settings as the Streamlit app"""
+    return AnswerService(
+        vector_store,
+        answer_cache=SemanticAnswerCache(
+            threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9")),
+            max_entries=int(os.getenv("SEMANTIC_CACHE_SIZE", "1000")),
+            ttl=float(os.getenv("SEMANTIC_CACHE_TTL", "1800"))
+        ),
+        reranker=Reranker(
+            lambda_=float(os.getenv("MMR_LAMBDA", MMR_LAMBDA)),
+            cross_encoder=os.getenv("RERANKER_MODEL") or None
+        )
+    )
+
+
+async def _serve(sock: socket.socket, vector_store: VectorStore):
+    service = make_service(vector_store)
+    server = await asyncio.start_server(service.handle, sock=sock)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await close_shared_clients()
+
+
+def run_worker(sock: socket.socket, vector_store: VectorStore):
+    try:
+        asyncio.run(_serve(sock, vector_store))
+    except KeyboardInterrupt:
+        pass
+
+
+def load_store() -> VectorStore:
+    """The shared index, with BM25 and the shard router built up front.
+
+    Workers are forked after this, so they start warm and share the
+    snapshot's mmapped vectors (and, copy-on-write, the BM25 arrays) instead
+    of each loading its own copy. A remote Qdrant connection is closed
+    before the fork; each worker opens its own on first use.
+    """
+    store = VectorStore(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        query_cache=QueryEmbeddingCache(max_entries=int(os.getenv("QUERY_CACHE_SIZE", "2048")))
+    )
+    store.lexical_search("warm up", k=1)
+    store.route("warm up")
+    store.disconnect()
+    return store
+
+
+def serve(host: str = "127.0.0.1", port: int = 8000, workers: int = None):
+    """Listen on host:port and answer from `workers` forked processes (one socket, kernel-balanced)"""
+    workers = workers or int(os.getenv("ANSWER_WORKERS", os.cpu_count() or 1))
+    sock = socket.create_server((host, port), backlog=1024)
+    store = load_store()
+    logger.info(f"Answer service on http://{host}:{sock.getsockname()[1]} with {workers} worker(s)")
+    if workers == 1:
+        run_worker(sock, store)
+        return
+
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=run_worker, args=(sock, store), daemon=True) for _ in range(workers)]
+    for process in processes:
+        process.start()
+
+    def stop(*_):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+            process.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve answers over HTTP")
+    parser.add_argument("--host", default=os.getenv("ANSWER_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("ANSWER_PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default ANSWER_WORKERS or one per core)")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+# async_chatengine.py
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+import weakref
+from typing import AsyncIterator, Dict, List, Optional
+
+import numpy as np
+
+from answer_cache import SemanticAnswerCache
+from chatengine import ChatEngine, NO_CONTEXT_ANSWER
+from lexical_index import reciprocal_rank_fusion
+from query_cache import normalize_query
+from reranker import Reranker
+from tracing import incr, span
+from vector_store import CONTENT_KEY, EMBEDDING_MODEL, FUSION_FETCH_FACTOR, METADATA_KEY, VectorStore
+
+logger = logging.getLogger(__name__)
+
+# Connections kept open to OpenAI (shared by every API key) and to Qdrant
+OPENAI_POOL_SIZE = 256
+QDRANT_POOL_SIZE = 64
+# OpenAI calls in flight per API key, so one busy user can't hog the pool
+# or trip their own rate limit
+MAX_CONCURRENT_PER_KEY = 16
+
+# Clients and pools are bound to the event loop that created them
+_loop_resources = weakref.WeakKeyDictionary()
+
+
+def _resources() -> Dict:
+    """HTTP pool, per-key clients/limiters and Qdrant clients for the running loop"""
+    loop = asyncio.get_running_loop()
+    resources = _loop_resources.get(loop)
+    if resources is None:
+        import httpx
+        from openai import DefaultAsyncHttpxClient
+
+        pool_size = int(os.getenv("OPENAI_POOL_SIZE", OPENAI_POOL_SIZE))
+        resources = _loop_resources[loop] = {
+            "http": DefaultAsyncHttpxClient(
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+            ),
+            "openai": {},
+            "limiters": {},
+            "qdrant": {}
+        }
+    return resources
+
+
+async def close_shared_clients():
+    """Close the pools opened on the running loop (call before the loop shuts down)"""
+    resources = _loop_resources.pop(asyncio.get_running_loop(), None)
+    if resources is None:
+        return
+    for qdrant in resources["qdrant"].values():
+        await qdrant.close()
+    await resources["http"].aclose()
+
+
+class AsyncChatEngine(ChatEngine):
+    """asyncio-native ChatEngine for serving many concurrent users.
+
+    Every engine on an event loop shares one HTTP connection pool: an
+    AsyncOpenAI client per API key sits on top of it, and a semaphore per
+    key caps that key's in-flight OpenAI calls. Question embeddings go through
+    the store's query cache. With the Qdrant backend and a `qdrant_url`,
+    dense search uses a pooled AsyncQdrantClient and BM25 runs in a worker
+    thread. With the local backend the whole search runs in a worker thread.
+    Prompting and answer caching are the same as ChatEngine.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        vector_store: VectorStore,
+        answer_cache: Optional[SemanticAnswerCache] = None,
+        max_concurrent: int = None,
+        qdrant_url: str = None,
+        reranker: Optional[Reranker] = None
+    ):
+        super().__init__(api_key, vector_store, answer_cache=answer_cache, reranker=reranker)
+        self.max_concurrent = max_concurrent or int(os.getenv("OPENAI_MAX_CONCURRENT_PER_KEY", MAX_CONCURRENT_PER_KEY))
+        self.qdrant_url = qdrant_url or os.getenv("QDRANT_URL")
+        self._key_id = hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+    @property
+    def client(self):
+        # ChatEngine._complete works unchanged: on AsyncOpenAI it returns an awaitable
+        resources = _resources()
+        client = resources["openai"].get(self._key_id)
+        if client is None:
+            from openai import AsyncOpenAI
+
+            client = resources["openai"][self._key_id] = AsyncOpenAI(
+                api_key=self.api_key,
+                http_client=resources["http"],
+                timeout=60.0
+            )
+        return client
+
+    @property
+    def limiter(self) -> asyncio.Semaphore:
+        limiters = _resources()["limiters"]
+        if self._key_id not in limiters:
+            limiters[self._key_id] = asyncio.Semaphore(self.max_concurrent)
+        return limiters[self._key_id]
+
+    def _qdrant(self):
+        """Pooled AsyncQdrantClient for this loop, or None to search in a thread"""
+        if self.vector_store.backend != "qdrant" or not self.qdrant_url:
+            return None
+        clients = _resources()["qdrant"]
+        if self.qdrant_url not in clients:
+            from qdrant_client import AsyncQdrantClient
+
+            clients[self.qdrant_url] = AsyncQdrantClient(
+                url=self.qdrant_url,
+                pool_size=int(os.getenv("QDRANT_POOL_SIZE", QDRANT_POOL_SIZE))
+            )
+        return clients[self.qdrant_url]
+
+    async def _embed(self, question: str):
+        key = normalize_query(question)
+        vector = self.vector_store.query_cache.get(key)
+        incr("query_embeddings", cache="miss" if vector is None else "hit")
+        if vector is None:
+            async with self.limiter:
+                response = await self.client.embeddings.create(model=EMBEDDING_MODEL, input=[question])
+            vector = self.vector_store.query_cache.put(key, response.data[0].embedding)
+        return vector
+
+    async def _cached(self, question: str):
+        """Embed the question and check the semantic cache; returns (vector, hit).
+
+        The embedding gets the store's `dense_timeout`; if it misses it the
+        vector is None and the answer comes from BM25 alone.
+        """
+        with span("answer.cache"):
+            try:
+                vector = await asyncio.wait_for(self._embed(question), timeout=self.vector_store.dense_timeout)
+            except Exception as e:
+                timeout = isinstance(e, asyncio.TimeoutError)
+                incr("dense_fallbacks", reason="timeout" if timeout else "error")
+                logger.warning(f"Question embedding failed or timed out ({e!r}), answering from BM25 only")
+                return None, None
+            hit = self.answer_cache.lookup(vector) if self.answer_cache is not None else None
+        if hit:
+            logger.info(f"Semantic cache hit ({hit['similarity']:.3f}) for: {question[:50]}...")
+        return vector, hit
+
+    async def _retrieve(self, question: str, vector=None):
+        """Retrieve candidate chunks and build the combined context + source list"""
+        logger.info(f"Searching for relevant chunks for question: {question[:50]}...")
+        with span("answer.retrieve"):
+            qdrant = self._qdrant()
+            if vector is None:
+                # No embedding to search with: BM25 only, no API call
+                hits = await asyncio.to_thread(
+                    self.vector_store.search, question, self.rerank_fetch_k, None, "lexical", True, self.api_key
+                )
+            elif qdrant is None:
+                hits = await asyncio.to_thread(
+                    self.vector_store.search, question, self.rerank_fetch_k, vector, "hybrid", True, self.api_key
+                )
+            else:
+                hits = await self._search_qdrant(qdrant, question, vector)
+            return await self._rerank_and_format(question, hits)
+
+    async def _search_qdrant(self, qdrant, question: str, vector) -> List[Dict]:
+        with span("search", mode="hybrid"):
+            # Routing may build BM25 on first use, so it runs off the loop
+            shards = await asyncio.to_thread(self.vector_store.route, question, vector)
+            incr("shard_routes", result="routed" if shards else "all")
+            hits = await self._search_shards(qdrant, question, vector, shards)
+            if shards and len(hits) < self.rerank_fetch_k:
+                # The router's shards were too narrow: search everything instead
+                incr("shard_routes", result="fallback")
+                hits = await self._search_shards(qdrant, question, vector, None)
+            return hits
+
+    async def _search_shards(self, qdrant, question: str, vector, shards: List[str] = None) -> List[Dict]:
+        # Dense search on the async client while BM25 runs in a thread;
+        # dense hits come back with their vectors for MMR
+        fetch_k = self.rerank_fetch_k * FUSION_FETCH_FACTOR
+
+        async def dense_search():
+            with span("search.dense", backend="qdrant"):
+                return await qdrant.query_points(
+                    collection_name=self.vector_store.collection_name,
+                    query=vector.tolist(),
+                    limit=fetch_k,
+                    with_payload=True,
+                    with_vectors=True,
+                    search_params=self.vector_store.search_params(),
+                    query_filter=self.vector_store.shard_filter(shards)
+                )
+
+        dense_task = asyncio.ensure_future(dense_search())
+        with span("search.lexical"):
+            lexical = await asyncio.to_thread(self.vector_store.lexical_search, question, fetch_k, shards)
+        dense = []
+        try:
+            response = await asyncio.wait_for(dense_task, timeout=self.vector_store.dense_timeout)
+            dense = [
+                {
+                    "content": point.payload.get(CONTENT_KEY, ""),
+                    "metadata": point.payload.get(METADATA_KEY, {}),
+                    "score": point.score,
+                    "vector": np.asarray(point.vector, dtype=np.float32) if point.vector else None
+                }
+                for point in response.points
+            ]
+        except Exception as e:
+            incr("dense_fallbacks", reason="timeout" if isinstance(e, asyncio.TimeoutError) else "error")
+            logger.warning(f"Dense retrieval failed or timed out ({e!r}), answering from BM25 only")
+
+        with span("search.fuse"):
+            if dense and lexical:
+                return reciprocal_rank_fusion([dense, lexical], k=self.rerank_fetch_k)
+            return (dense or lexical)[:self.rerank_fetch_k]
+
+    async def _rerank_and_format(self, question: str, hits: List[Dict]):
+        if self.reranker.cross_encoder is not None:
+            # Model inference would stall every other request on the loop
+            hits = await asyncio.to_thread(self._rerank, question, hits)
+        else:
+            hits = self._rerank(question, hits)
+        return self._format_context(hits)
+
+    async def get_answer(self, question: str) -> Dict:
+        """ChatEngine.get_answer, awaiting the network calls; generation holds a slot of the key's limiter"""
+        try:
+            with span("answer", engine="async", stream=False):
+                start = time.perf_counter()
+                vector, hit = await self._cached(question)
+                if hit:
+                    incr("answers", outcome="cache_hit")
+                    return hit
+
+                context, sources = await self._retrieve(question, vector)
+                if not sources:
+                    incr("answers", outcome="no_context")
+                    return {
+                        "answer": NO_CONTEXT_ANSWER,
+                        "sources": []
+                    }
+
+                logger.info("Generating AI response...")
+                async with self.limiter:
+                    with span("answer.generate"):
+                        response = await self._complete(self._build_messages(question, context))
+                logger.info(f"Generated response with {len(sources)} sources")
+
+                result = {
+                    "answer": response.choices[0].message.content.strip(),
+                    "sources": sources
+                }
+                usage = self._finish(question, vector, result, response.usage, context, start)
+                return dict(result, usage=usage)
+
+        except Exception as e:
+            return self._error_result(e)
+
+    async def stream_answer(self, question: str) -> AsyncIterator[Dict]:
+        """ChatEngine.stream_answer, awaiting the network calls; the key's
+        limiter slot is held until the token stream ends"""
+        sources_sent = False
+        try:
+            with span("answer", engine="async", stream=True):
+                start = time.perf_counter()
+                vector, hit = await self._cached(question)
+                if hit:
+                    for event in self._hit_events(hit):
+                        yield event
+                    return
+
+                context, sources = await self._retrieve(question, vector)
+                for event in self._sources_events(sources):
+                    yield event
+                sources_sent = True
+                if not sources:
+                    return
+
+                logger.info("Streaming AI response...")
+                parts: List[str] = []
+                response_usage = None
+                async with self.limiter:
+                    with span("answer.generate"):
+                        stream = await self._complete(self._build_messages(question, context), stream=True)
+                        async for chunk in stream:
+                            if chunk.usage:
+                                response_usage = chunk.usage
+                            if not chunk.choices:
+                                continue
+                            text = chunk.choices[0].delta.content
+                            if text:
+                                yield self._token_event(parts, text, start)
+                logger.info(f"Streamed response with {len(sources)} sources")
+
+                result = {"answer": "".join(parts).strip(), "sources": sources}
+                usage = self._finish(question, vector, result, response_usage, context, start)
+                yield {"type": "usage", "usage": usage}
+
+        except Exception as e:
+            for event in self._error_events(e, sources_sent):
+                yield event
@@ -0,0 +1,156 @@
+# batch_embedder.py
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+import tiktoken
+
+from tracing import incr, span
+
+# OpenAI allows 300k tokens and 2048 inputs per embeddings request; stay well
+# under both so a single slow batch doesn't hold up the pipeline
+MAX_TOKENS_PER_BATCH = 50_000
+MAX_BATCH_SIZE = 512
+
+
+def is_rate_limit(error: Exception) -> bool:
+    return getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError"
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit: halve on a rate limit, grow by one per success"""
+
+    def __init__(self, max_limit: int):
+        self.max_limit = max_limit
+        self.limit = max_limit
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, rate_limited: bool = False):
+        with self._cond:
+            self.in_flight -= 1
+            if rate_limited:
+                self.limit = max(1, self.limit // 2)
+            elif self.limit < self.max_limit:
+                self.limit += 1
+            self._cond.notify_all()
+
+
+class BatchEmbedder:
+    """Token-budgeted, parallel embedding with backoff on rate limits.
+
+    `embed_fn` takes a list of texts and returns one vector per text, e.g.
+    `OpenAIEmbeddings.embed_documents`. Batches run on a bounded worker pool
+    whose effective concurrency shrinks when the API answers 429 and recovers
+    as requests succeed. Finished batches are handed to `on_batch` on a single
+    background thread, so upserts overlap with the next embedding requests.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[List[str]], List[List[float]]],
+        max_tokens_per_batch: int = MAX_TOKENS_PER_BATCH,
+        max_batch_size: int = MAX_BATCH_SIZE,
+        max_workers: int = 4,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        encoding: str = "cl100k_base"
+    ):
+        self.embed_fn = embed_fn
+        self.max_tokens_per_batch = max_tokens_per_batch
+        self.max_batch_size = max_batch_size
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.encoding = tiktoken.get_encoding(encoding)
+
+    def plan_batches(self, texts: Sequence[str]) -> List[List[int]]:
+        """Group text positions into batches under the token and size budgets"""
+        token_counts = [len(t) for t in self.encoding.encode_ordinary_batch(list(texts))]
+        batches, current, current_tokens = [], [], 0
+        for i, n_tokens in enumerate(token_counts):
+            if current and (
+                current_tokens + n_tokens > self.max_tokens_per_batch
+                or len(current) >= self.max_batch_size
+            ):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += n_tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _embed_batch(self, limiter: AdaptiveLimiter, texts: List[str], stats: Dict) -> np.ndarray:
+        for attempt in range(self.max_retries + 1):
+            limiter.acquire()
+            try:
+                with span("embed.batch"):
+                    vectors = self.embed_fn(texts)
+            except Exception as e:
+                limiter.release(rate_limited=is_rate_limit(e))
+                if not is_rate_limit(e) or attempt == self.max_retries:
+                    raise
+                incr("embed_retries")
+                with stats["lock"]:
+                    stats["retries"] += 1
+                # Exponential backoff with jitter so workers don't retry in lockstep
+                time.sleep(self.base_delay * (2 ** attempt) * (0.5 + random.random()))
+                continue
+            limiter.release()
+            incr("embedded_chunks", len(texts))
+            return np.asarray(vectors, dtype=np.float32)
+
+    def embed(
+        self,
+        texts: Sequence[str],
+        on_batch: Callable[[List[int], np.ndarray], None] = None,
+        progress: Callable[[int, int], None] = None
+    ) -> Dict:
+        """Embed every text; returns throughput stats.
+
+        `on_batch(positions, vectors)` receives each finished batch, where
+        `positions` index into `texts`.
+        """
+        start = time.perf_counter()
+        batches = self.plan_batches(texts)
+        limiter = AdaptiveLimiter(self.max_workers)
+        stats = {"lock": threading.Lock(), "retries": 0}
+        done = 0
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as workers, \
+                ThreadPoolExecutor(max_workers=1) as sink:
+            futures = {
+                workers.submit(self._embed_batch, limiter, [texts[i] for i in batch], stats): batch
+                for batch in batches
+            }
+            pending_sinks = []
+            for future in as_completed(futures):
+                batch = futures[future]
+                vectors = future.result()
+                if on_batch:
+                    pending_sinks.append(sink.submit(on_batch, batch, vectors))
+                done += len(batch)
+                if progress:
+                    progress(done, len(texts))
+            for pending in pending_sinks:
+                pending.result()
+
+        seconds = time.perf_counter() - start
+        return {
+            "chunks": len(texts),
+            "batches": len(batches),
+            "retries": stats["retries"],
+            "seconds": seconds,
+            "chunks_per_sec": len(texts) / seconds if seconds > 0 else 0.0
+        }
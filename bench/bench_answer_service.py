@@ -0,0 +1,155 @@
+# bench/bench_answer_service.py
+#
+# Load test of answer_service.py against a local stub OpenAI server (chat
+# and embeddings) and a synthetic snapshot. The service runs as its own
+# process with --workers forked workers; clients are one asyncio loop
+# firing every request of a round at once over POST /answer.
+#
+#   same      every client asks the same question (a new one each round),
+#             like a class asking the trending question together
+#   distinct  every client asks its own question
+#
+# Each row reports 200s and 503s (turned away by admission control),
+# latency of the answered requests, and how many chat completions reached
+# the stub. The semantic answer cache is disabled, so the only sharing
+# between requests is single-flight coalescing.
+#
+#   python bench/bench_answer_service.py --clients 200 --workers 1 2
+
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.pop("QDRANT_URL", None)
+
+import httpx
+
+from bench_async_engine import SERIES, TOPICS, synthetic_corpus
+from index_snapshot import write_snapshot
+from stubs import FakeOpenAIServer
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_service(port: int, workers: int, env: dict) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "answer_service.py"), "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1.0).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("answer service didn't come up")
+
+
+def question(scenario: str, round_: int, client: int) -> str:
+    n = round_ if scenario == "same" else round_ * 100000 + client
+    return f"question {n}: how does {TOPICS[n % len(TOPICS)]} work in {SERIES[n % len(SERIES)]}?"
+
+
+async def run_round(base_url: str, questions: list) -> tuple:
+    """(latencies of 200s, 503 count, other failures) for one burst"""
+    limits = httpx.Limits(max_connections=len(questions), max_keepalive_connections=len(questions))
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120.0) as client:
+
+        async def ask(text: str):
+            start = time.perf_counter()
+            response = await client.post("/answer", json={"question": text}, headers={"Authorization": "Bearer sk-fake"})
+            return response.status_code, time.perf_counter() - start, response
+
+        results = await asyncio.gather(*(ask(q) for q in questions), return_exceptions=True)
+    latencies, busy, failed = [], 0, 0
+    for result in results:
+        if isinstance(result, Exception):
+            failed += 1
+        elif result[0] == 200 and result[2].json()["sources"]:
+            latencies.append(result[1])
+        elif result[0] == 503:
+            busy += 1
+        else:
+            failed += 1
+    return latencies, busy, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=200, help="concurrent requests per round")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--max-inflight", type=int, default=32, help="ANSWER_MAX_INFLIGHT per worker")
+    parser.add_argument("--max-queue", type=int, default=64, help="ANSWER_MAX_QUEUE per worker")
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--chat-latency", type=float, default=0.5)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    vectors, payloads = synthetic_corpus(args.chunks)
+    with tempfile.TemporaryDirectory() as tmp, \
+            FakeOpenAIServer(latency=args.embed_latency, chat_latency=args.chat_latency) as api:
+        snapshot_path = os.path.join(tmp, "snapshot.bin")
+        write_snapshot(snapshot_path, vectors, payloads)
+        env = dict(
+            os.environ,
+            OPENAI_BASE_URL=api.api_base,
+            OPENAI_API_KEY="sk-fake",
+            INDEX_SNAPSHOT=snapshot_path,
+            EMBEDDING_CACHE_DIR=os.path.join(tmp, "cache"),
+            # Off, so repeats can't be answered from the cache instead of coalesced
+            SEMANTIC_CACHE_THRESHOLD="2",
+            ANSWER_MAX_INFLIGHT=str(args.max_inflight),
+            ANSWER_MAX_QUEUE=str(args.max_queue)
+        )
+
+        print(f"{args.clients} concurrent clients x {args.rounds} rounds; per worker {args.max_inflight} in flight + {args.max_queue} queued\n")
+        print(f"{'workers':>7} {'single-flight':>13} {'questions':<9} {'ok':>6} {'503':>5} {'failed':>6} {'p50 ms':>8} {'p95 ms':>8} {'chat calls':>10}")
+        for workers in args.workers:
+            for single_flight in ("1", "0"):
+                port = free_port()
+                service = start_service(port, workers, dict(env, ANSWER_SINGLE_FLIGHT=single_flight))
+                try:
+                    for scenario in ("same", "distinct"):
+                        latencies, busy, failed = [], 0, 0
+                        calls = api.chat_requests
+                        for round_ in range(args.rounds):
+                            questions = [question(scenario, round_, c) for c in range(args.clients)]
+                            # Keep rounds apart from scenario to scenario and run to run
+                            questions = [f"{q} ({workers}/{single_flight})" for q in questions]
+                            ok, b, f = asyncio.run(run_round(f"http://127.0.0.1:{port}", questions))
+                            latencies += ok
+                            busy += b
+                            failed += f
+                        ms = np.asarray(latencies or [0.0]) * 1000
+                        print(
+                            f"{workers:>7} {'on' if single_flight == '1' else 'off':>13} {scenario:<9} "
+                            f"{len(latencies):>6} {busy:>5} {failed:>6} {np.percentile(ms, 50):>8.0f} "
+                            f"{np.percentile(ms, 95):>8.0f} {api.chat_requests - calls:>10}"
+                        )
+                finally:
+                    service.terminate()
+                    service.wait()
+    print("(one worker can't coalesce with another, so `same` costs up to one chat call per worker per round)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# bench/bench_async_engine.py
+#
+# Load test: N concurrent users asking questions through ChatEngine (one
+# thread per user, like Streamlit script threads) vs AsyncChatEngine on one
+# event loop, against local stub OpenAI and Qdrant servers (each in its own
+# process).
+#
+#   python bench/bench_async_engine.py --concurrency 10 100 500
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.pop("QDRANT_URL", None)
+
+from async_chatengine import AsyncChatEngine, close_shared_clients
+from chatengine import ChatEngine
+from index_snapshot import write_snapshot
+from stubs import SERIES, FakeOpenAIServer, FakeQdrantServer, StubProcess, hashed_embedding
+from vector_store import EMBEDDING_SIZE, VectorStore
+
+TOPICS = ["stash", "rebase", "volumes", "joins", "pointers", "flexbox", "migrations", "upstream"]
+
+
+def synthetic_corpus(count: int):
+    payloads = []
+    for i in range(count):
+        series = SERIES[i % len(SERIES)]
+        text = f"{series} {TOPICS[i % len(TOPICS)]} notes {i}: haanji, chai ke saath {TOPICS[(i * 3) % len(TOPICS)]} samjhiye"
+        payloads.append({"page_content": text, "metadata": {"source": f"https://docs.example/{series}/{i}/"}})
+    vectors = np.stack([hashed_embedding(p["page_content"].lower().split(), EMBEDDING_SIZE) for p in payloads])
+    return vectors, payloads
+
+
+def question(user: int, turn: int) -> str:
+    # Unique per ask, so neither the query nor the answer cache short-circuits
+    return f"user {user} turn {turn}: how does {TOPICS[(user + turn) % len(TOPICS)]} work in {SERIES[user % len(SERIES)]}?"
+
+
+def summarize(name: str, concurrency: int, wall: float, latencies, errors: int):
+    ms = np.asarray(latencies) * 1000
+    print(
+        f"{name:<14} {concurrency:>6} {len(ms) / wall:>8.1f} {np.percentile(ms, 50):>8.0f} "
+        f"{np.percentile(ms, 95):>8.0f} {np.percentile(ms, 99):>8.0f} {errors:>6}"
+    )
+
+
+def run_threads(store: VectorStore, concurrency: int, turns: int, keys: int):
+    engines = [ChatEngine(api_key=f"sk-fake-{i}", vector_store=store) for i in range(keys)]
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+
+    def user(u: int):
+        for turn in range(turns):
+            start = time.perf_counter()
+            result = engines[u % keys].get_answer(question(u, turn))
+            with lock:
+                latencies.append(time.perf_counter() - start)
+                errors[0] += not result["sources"]
+
+    threads = [threading.Thread(target=user, args=(u,)) for u in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start, latencies, errors[0]
+
+
+async def run_async(store: VectorStore, concurrency: int, turns: int, keys: int, qdrant_url: str = None):
+    engines = [AsyncChatEngine(api_key=f"sk-fake-{i}", vector_store=store, qdrant_url=qdrant_url) for i in range(keys)]
+    latencies, errors = [], 0
+
+    async def user(u: int):
+        nonlocal errors
+        for turn in range(turns):
+            start = time.perf_counter()
+            result = await engines[u % keys].get_answer(question(u, turn))
+            latencies.append(time.perf_counter() - start)
+            errors += not result["sources"]
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user(u) for u in range(concurrency)))
+    wall = time.perf_counter() - start
+    await close_shared_clients()
+    return wall, latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--turns", type=int, default=2, help="questions asked by each user")
+    parser.add_argument("--keys", type=int, default=50, help="distinct API keys the users are spread over")
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--chat-latency", type=float, default=0.5)
+    parser.add_argument("--qdrant-latency", type=float, default=0.01)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    vectors, payloads = synthetic_corpus(args.chunks)
+    with tempfile.TemporaryDirectory() as tmp, \
+            StubProcess(FakeOpenAIServer, latency=args.embed_latency, chat_latency=args.chat_latency) as api, \
+            StubProcess(FakeQdrantServer, vectors=vectors, payloads=payloads, latency=args.qdrant_latency) as qdrant:
+        os.environ["OPENAI_BASE_URL"] = api.api_base
+        snapshot_path = os.path.join(tmp, "snapshot.bin")
+        write_snapshot(snapshot_path, vectors, payloads)
+        local_store = VectorStore(api_key="sk-fake", cache_dir=tmp, snapshot_path=snapshot_path, backend="local")
+        # Dense search goes to the stub; the in-memory copy only feeds BM25
+        qdrant_store = VectorStore(api_key="sk-fake", cache_dir=tmp, snapshot_path=snapshot_path, backend="qdrant")
+        local_store.lexical_search("warm up", k=1)
+        qdrant_store.lexical_search("warm up", k=1)
+
+        print(f"{'engine':<14} {'users':>6} {'q/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}")
+        for concurrency in args.concurrency:
+            summarize("sync threads", concurrency, *run_threads(local_store, concurrency, args.turns, args.keys))
+            summarize("async local", concurrency, *asyncio.run(
+                run_async(local_store, concurrency, args.turns, args.keys)))
+            summarize("async qdrant", concurrency, *asyncio.run(
+                run_async(qdrant_store, concurrency, args.turns, args.keys, qdrant_url=qdrant.base_url)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# bench/bench_bulk_embed.py
+#
+# Bulk-ingest throughput of VectorStore.add_chunks against a local fake
+# embeddings server that rate-limits past a concurrency cap.
+#
+#   python bench/bench_bulk_embed.py --chunks 2000 --workers 1 4 8
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.pop("QDRANT_URL", None)
+
+from stubs import FakeOpenAIServer
+from vector_store import VectorStore
+
+
+def synthetic_chunks(count: int):
+    return [
+        {
+            "content": f"Chunk {i}: " + " ".join(f"word{(i * 7 + j) % 997}" for j in range(120)),
+            "source": f"https://example.com/doc/{i // 10}/",
+            "chunk_id": i % 10
+        }
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--batch-tokens", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.2, help="per-request latency of the fake API (s)")
+    parser.add_argument("--max-concurrent", type=int, default=4, help="requests beyond this get a 429")
+    args = parser.parse_args()
+
+    chunks = synthetic_chunks(args.chunks)
+    print(f"{'workers':>7} {'wall s':>7} {'chunks/s':>9} {'batches':>8} {'429s':>5} {'retries':>8}")
+    with FakeOpenAIServer(latency=args.latency, max_concurrent=args.max_concurrent) as api:
+        os.environ["OPENAI_BASE_URL"] = api.api_base
+        os.environ["EMBED_BATCH_TOKENS"] = str(args.batch_tokens)
+        for workers in args.workers:
+            os.environ["EMBED_WORKERS"] = str(workers)
+            api.rate_limited = 0
+            api.batch_sizes = []
+            with tempfile.TemporaryDirectory() as tmp:
+                vs = VectorStore(api_key="sk-fake", cache_dir=tmp, warm_start=False)
+                start = time.perf_counter()
+                stats = vs.add_chunks(chunks)
+                wall = time.perf_counter() - start
+            print(
+                f"{workers:>7} {wall:>7.2f} {stats['chunks_per_sec']:>9.1f} "
+                f"{len(api.batch_sizes):>8} {api.rate_limited:>5} {stats['retries']:>8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
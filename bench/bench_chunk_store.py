@@ -0,0 +1,138 @@
+# bench/bench_chunk_store.py
+#
+# Load time and memory of the chunk store against the old pretty-printed
+# chunks.json, with chunks.json replicated to 1x, 10x and 100x (copies get
+# their own source URLs, so point IDs stay unique). Every measurement runs in
+# its own child process; "+RSS" is peak RSS over the child's RSS after imports.
+#
+#   open    json.load the whole file / open the store (index + source table)
+#   lookup  fetch 20 chunks by point ID
+#   sync    what an embeddings run needs: every point ID, then the records
+#           of 1% of chunks (the ones new since the last run)
+#   stream  iterate every chunk once
+#
+#   python bench/bench_chunk_store.py --scales 1 10 100
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np  # noqa: F401  (imported up front so it isn't counted in +RSS)
+
+import ingestion
+from chunk_store import ChunkStore, chunk_point_id, write_chunk_store
+
+TASKS = ("open", "lookup", "sync", "stream")
+FORMATS = ("json", "store", "store-raw")
+LOOKUPS = 20
+CHANGED = 0.01
+
+
+def replicated(chunks: list, copies: int):
+    for n in range(copies):
+        for chunk in chunks:
+            yield dict(chunk, source=f"{chunk['source']}copy-{n}/" if n else chunk["source"])
+
+
+def rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def sample_ids(path: str, count: int, seed: int) -> list:
+    ids = ChunkStore(path).point_ids()
+    return random.Random(seed).sample(ids, min(count, len(ids)))
+
+
+def run_task(fmt: str, task: str, path: str, store_path: str) -> dict:
+    # Which chunks to touch is decided before the clock starts
+    wanted = sample_ids(store_path, LOOKUPS, 0) if task == "lookup" else None
+    changed = None
+    if task == "sync":
+        n = len(ChunkStore(store_path))
+        changed = set(random.Random(1).sample(range(n), max(1, int(n * CHANGED))))
+    baseline = rss_mb()
+
+    start = time.perf_counter()
+    if fmt == "json":
+        with open(path, "r", encoding="utf-8") as f:
+            chunks = json.load(f)
+        if task == "lookup":
+            wanted = set(wanted)
+            found = [c for c in chunks if chunk_point_id(c["source"], c["content"]) in wanted]
+        elif task == "sync":
+            ids = [chunk_point_id(c["source"], c["content"]) for c in chunks]
+            found = [chunks[i] for i in sorted(changed)]
+        elif task == "stream":
+            found = sum(len(c["content"]) for c in chunks)
+    else:
+        store = ChunkStore(path)
+        if task == "lookup":
+            found = [store.get(point_id) for point_id in wanted]
+        elif task == "sync":
+            ids = store.point_ids()
+            found = store.get_many(sorted(changed))
+        elif task == "stream":
+            found = sum(len(c["content"]) for c in store)
+    seconds = time.perf_counter() - start
+    return {"ms": seconds * 1000, "rss_mb": rss_mb() - baseline}
+
+
+def build(tmp: str, chunks: list, scale: int) -> dict:
+    paths = {
+        "json": os.path.join(tmp, f"chunks-{scale}x.json"),
+        "store": os.path.join(tmp, f"chunks-{scale}x.store"),
+        "store-raw": os.path.join(tmp, f"chunks-{scale}x-raw.store")
+    }
+    ingestion.write_chunks(replicated(chunks, scale), paths["json"])
+    write_chunk_store(replicated(chunks, scale), paths["store"])
+    write_chunk_store(replicated(chunks, scale), paths["store-raw"], compress=False)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--chunks", default=os.path.join(ROOT, "chunks.json"))
+    parser.add_argument("--run", nargs=4, metavar=("FORMAT", "TASK", "PATH", "STORE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_task(*args.run)))
+        return
+
+    with open(args.chunks, "r", encoding="utf-8") as f:
+        chunks = json.load(f)
+    header = f"{'scale':>5} {'chunks':>7} {'format':<9} {'MB':>6}" + "".join(f" {t + ' ms':>10} {'+RSS':>6}" for t in TASKS)
+    print(header)
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in args.scales:
+            with contextlib.redirect_stdout(io.StringIO()):
+                paths = build(tmp, chunks, scale)
+            for fmt in FORMATS:
+                path = paths[fmt]
+                size = os.path.getsize(path) if fmt == "json" else ChunkStore(path).nbytes
+                line = f"{scale:>4}x {len(chunks) * scale:>7} {fmt:<9} {size / 1e6:>6.1f}"
+                for task in TASKS:
+                    out = subprocess.run(
+                        [sys.executable, __file__, "--run", fmt, task, path, paths["store"]],
+                        check=True, capture_output=True, text=True
+                    ).stdout
+                    r = json.loads(out.strip().splitlines()[-1])
+                    line += f" {r['ms']:>10.1f} {r['rss_mb']:>6.1f}"
+                print(line)
+    print(f"(store = zlib per record, store-raw = uncompressed; +RSS in MB; lookup = {LOOKUPS} chunks, sync reads {CHANGED:.0%})")
+
+
+if __name__ == "__main__":
+    main()
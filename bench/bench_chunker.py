@@ -0,0 +1,81 @@
+# bench/bench_chunker.py
+#
+# Chunking throughput and peak RSS on a synthetic docs site. Each mode runs
+# in its own child process so peak RSS numbers don't bleed into each other.
+#
+#   streaming:    iter_site_chunks -> write_chunks (what ingestion.main does)
+#   materialized: every chunk held in one list, then json.dump (the old flow)
+#
+#   python bench/bench_chunker.py --pages 2000
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def site_results(pages: int, sections: int):
+    # Generated lazily, like responses arriving from the fetcher
+    from stubs import fixture_page
+    for i in range(pages):
+        url = f"https://docs.example.com/youtube/series-{i % 6}/page-{i}/"
+        yield {"url": url, "text": fixture_page(f"/page-{i}/", sections), "error": None, "not_modified": False}
+
+
+def run_mode(mode: str, pages: int, sections: int) -> dict:
+    import contextlib
+    import io
+    import ingestion
+
+    out_path = os.path.join(tempfile.mkdtemp(), "chunks.json")
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        chunks = ingestion.iter_site_chunks(site_results(pages, sections), {}, {}, {})
+        if mode == "streaming":
+            count = ingestion.write_chunks(chunks, out_path)
+        else:
+            chunks = list(chunks)
+            with open(out_path, "w", encoding="utf-8") as f:
+                json.dump(chunks, f, ensure_ascii=False, indent=2)
+            count = len(chunks)
+    seconds = time.perf_counter() - start
+    return {
+        "mode": mode,
+        "chunks": count,
+        "seconds": seconds,
+        "chunks_per_sec": count / seconds,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--sections", type=int, default=12)
+    parser.add_argument("--mode", choices=["streaming", "materialized"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.pages, args.sections)))
+        return
+
+    print(f"{'mode':<13} {'chunks':>8} {'chunks/s':>9} {'peak RSS MB':>12}")
+    for mode in ("streaming", "materialized"):
+        out = subprocess.run(
+            [sys.executable, __file__, "--mode", mode, "--pages", str(args.pages), "--sections", str(args.sections)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        print(f"{r['mode']:<13} {r['chunks']:>8} {r['chunks_per_sec']:>9.0f} {r['peak_rss_mb']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# bench/bench_extract.py
+#
+# HTML extraction throughput (pages/sec) on saved fixture pages: the docs
+# content from chunks.json wrapped in the site's chrome (head assets,
+# header, a sidebar linking every page, footer), written to --fixtures as
+# .html files and read back from disk.
+#
+#   old       BeautifulSoup + html.parser over the whole document (the
+#             previous iter_page_blocks), in the main process
+#   parse     extractor.extract_pages per parser, on 1, 4 and all cores
+#   pipeline  iter_site_chunks: extraction streamed into chunking
+#
+# Every mode's blocks are checked against the old extraction.
+#
+#   python bench/bench_extract.py --pages 400 --workers 1 4
+
+import argparse
+import contextlib
+import html
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+
+import extractor
+import ingestion
+from extractor import extract_pages
+
+SIDEBAR_LINKS = 3  # the real sidebar repeats series groups; roughly 130 links
+
+
+def old_blocks(page: str):
+    """The previous iter_page_blocks: full html.parser soup, walk every descendant"""
+    soup = BeautifulSoup(page, "html.parser")
+    container = soup.select_one("article") or soup.select_one("main")
+    blocks = []
+    for elem in container.descendants:
+        if getattr(elem, "name", None) in ("h1", "h2", "h3", "p"):
+            text = elem.get_text(strip=True)
+            if text:
+                blocks.append((elem.name, text))
+    return blocks
+
+
+def site_chrome() -> tuple:
+    """(before, after) markup around <main>, shaped like the docs theme"""
+    nav = "".join(
+        f'<li><a href="{url}" aria-current="false"><span>{url.rstrip("/").split("/")[-1].replace("-", " ").title()}</span></a></li>'
+        for url in ingestion.DOC_URLS
+    ) * SIDEBAR_LINKS
+    icon = '<svg viewBox="0 0 24 24" aria-hidden="true"><path d="' + "M1 2L3 4 " * 40 + '"/></svg>'
+    head = (
+        '<head><meta charset="utf-8"><title>Chai Docs</title>'
+        + "".join(f'<link rel="preload" href="/_astro/page.{i}.css" as="style">' for i in range(20))
+        + "<style>" + ".sl-link{color:var(--sl-color-text)}" * 300 + "</style>"
+        + "<script>" + "window.__theme=window.__theme||{};" * 200 + "</script></head>"
+    )
+    before = (
+        f"<!doctype html><html>{head}<body><header>{icon}<a href='/'>Chai Docs</a><input type='search'></header>"
+        f"<nav class='sidebar'><ul>{nav}</ul></nav>"
+    )
+    after = "<footer><a href='#prev'>Previous</a><a href='#next'>Next</a></footer><script>" + "init();" * 100 + "</script></body></html>"
+    return before, after
+
+
+def write_fixtures(chunks_path: str, fixtures_dir: str, count: int) -> list:
+    with open(chunks_path, "r", encoding="utf-8") as f:
+        chunks = json.load(f)
+    lines = defaultdict(dict)
+    for chunk in chunks:
+        for line in chunk["content"].split("\n"):
+            line = line.strip()
+            if line:
+                lines[chunk["source"]].setdefault(line, None)
+
+    before, after = site_chrome()
+    articles = [
+        "".join(
+            f"<h2>{html.escape(line[3:])}</h2>" if line.startswith("## ") else f"<p>{html.escape(line)}</p>"
+            for line in page_lines
+        )
+        for page_lines in lines.values()
+    ]
+    os.makedirs(fixtures_dir, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = os.path.join(fixtures_dir, f"page-{i:05d}.html")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"{before}<main><article><h1>Page {i}</h1>{articles[i % len(articles)]}</article></main>{after}")
+        paths.append(path)
+    return paths
+
+
+def load_pages(paths: list) -> list:
+    pages = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            pages.append(f.read())
+    return pages
+
+
+def best_rate(run, pages: int, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return pages / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=400)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4], help="worker counts (all cores is always added)")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--fixtures", help="directory for the saved HTML (default: a temp dir)")
+    parser.add_argument("--chunks", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "chunks.json"))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = write_fixtures(args.chunks, args.fixtures or tmp, args.pages)
+        pages = load_pages(paths)
+        size_kb = sum(len(p) for p in pages) / len(pages) / 1024
+        cores = os.cpu_count() or 1
+        print(f"{len(pages)} fixture pages, {size_kb:.0f} KB each on average; {cores} cores; default parser {extractor.DEFAULT_PARSER}")
+
+        expected = [old_blocks(p) for p in pages]
+        rate = best_rate(lambda: [old_blocks(p) for p in pages], len(pages), args.repeats)
+        print(f"\n{'mode':<38} {'workers':>7} {'pages/s':>9} {'speedup':>8}  same blocks")
+        print(f"{'old (html.parser, full soup)':<38} {1:>7} {rate:>9.1f} {1.0:>7.1f}x  yes")
+        baseline = rate
+
+        parsers = ["html.parser"] + (["lxml"] if extractor.DEFAULT_PARSER == "lxml" else [])
+        worker_counts = sorted(set(args.workers) | {cores})
+        for name in parsers:
+            for workers in worker_counts:
+                def run():
+                    return [blocks for _, blocks, _, _ in extract_pages(((i, p) for i, p in enumerate(pages)), workers, name)]
+
+                same = run() == expected
+                rate = best_rate(run, len(pages), args.repeats)
+                label = f"extract_pages ({name}{', strainer' if name != 'lxml' else ''})"
+                print(f"{label:<38} {workers:>7} {rate:>9.1f} {rate / baseline:>7.1f}x  {'yes' if same else 'NO'}")
+
+        results = [
+            {"url": f"https://chaidocs.vercel.app/fixture/{i}/", "text": p, "error": None, "not_modified": False}
+            for i, p in enumerate(pages)
+        ]
+        for workers in worker_counts:
+            def run():
+                with contextlib.redirect_stdout(io.StringIO()):
+                    return sum(1 for _ in ingestion.iter_site_chunks(results, {}, {}, {}, workers=workers))
+
+            chunks = run()
+            rate = best_rate(run, len(pages), args.repeats)
+            print(f"{'iter_site_chunks (parse + chunk)':<38} {workers:>7} {rate:>9.1f} {rate / baseline:>7.1f}x  {chunks} chunks")
+        if cores == 1:
+            print("\nOnly one core here: extra workers add IPC without adding CPU, so worker scaling can't show.")
+
+
+if __name__ == "__main__":
+    main()
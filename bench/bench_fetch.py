@@ -0,0 +1,65 @@
+# bench/bench_fetch.py
+#
+# Wall time to fetch the docs site: the old one-at-a-time loop against the
+# async fetcher, cold and then warm (conditional requests -> 304s). Runs
+# against a local stand-in server, no network needed.
+#
+#   python bench/bench_fetch.py --counts 43 500 --latency 0.05
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fetcher import AsyncFetcher, HttpCache
+from stubs import DocsSiteServer, fixture_urls
+
+import asyncio
+
+
+def sequential(urls):
+    # What ingestion.main used to do
+    for url in urls:
+        requests.get(url, timeout=10).raise_for_status()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--counts", type=int, nargs="+", default=[43, 500])
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated per-request RTT (s)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--skip-sequential-above", type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"{'urls':>6} {'mode':<16} {'wall s':>8} {'304s':>6}")
+    with DocsSiteServer(latency=args.latency) as site:
+        for count in args.counts:
+            urls = fixture_urls(site.base_url, count)
+
+            if count <= args.skip_sequential_above:
+                start = time.perf_counter()
+                sequential(urls)
+                print(f"{count:>6} {'sequential':<16} {time.perf_counter() - start:>8.2f} {'-':>6}")
+
+            with tempfile.TemporaryDirectory() as tmp:
+                cache = HttpCache(tmp)
+                fetcher = AsyncFetcher(concurrency=args.concurrency, per_host=args.concurrency, cache=cache)
+                for mode in ("async cold", "async warm"):
+                    start = time.perf_counter()
+                    results = asyncio.run(fetcher.fetch_all(urls))
+                    wall = time.perf_counter() - start
+                    errors = [r for r in results if r["error"]]
+                    if errors:
+                        raise RuntimeError(f"{len(errors)} fetches failed, e.g. {errors[0]['error']}")
+                    hits = sum(r["not_modified"] for r in results)
+                    print(f"{count:>6} {mode:<16} {wall:>8.2f} {hits:>6}")
+
+
+if __name__ == "__main__":
+    main()
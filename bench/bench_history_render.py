@@ -0,0 +1,135 @@
+# bench/bench_history_render.py
+#
+# Streamlit rerun cost against conversation length, rendered with
+# Streamlit's AppTest (no browser). Turns are built from the golden
+# questions with chunks.json text as answers and 5 sources each.
+#
+#   old   every turn re-rendered on each rerun: a markdown element per
+#         message and a source-box element per source (the previous loop)
+#   new   chat_history.render_history: the latest page of turns, each with
+#         its sources pre-rendered into one HTML block, plus "Load older"
+#
+# Reports rerun p50, the number of elements sent and their protobuf size
+# (a stand-in for the websocket payload of one rerun).
+#
+#   python bench/bench_history_render.py --turns 10 100 1000
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from streamlit.testing.v1 import AppTest
+
+from chat_history import ChatHistory
+
+SOURCES_PER_TURN = 5
+
+
+def old_app():
+    """The history loop as it was, over a list of turn dicts"""
+    import streamlit as st
+
+    for chat in st.session_state.chat_history:
+        with st.chat_message("user"):
+            st.write(chat["question"])
+
+        with st.chat_message("assistant"):
+            st.write(chat["answer"])
+
+            if chat.get("sources"):
+                with st.expander(f"📚 Sources ({len(chat['sources'])})"):
+                    for i, src in enumerate(chat["sources"]):
+                        source_url = src.get('source', 'Unknown')
+                        st.markdown(f"""
+                        <div class="source-box">
+                            <strong>[{src.get('number', i+1)}]</strong>
+                            <a href="{source_url}" target="_blank" style="color: #667eea; text-decoration: none; font-weight: 500;">{source_url}</a>
+                            <br><small style="color: #6c757d;">{src.get('preview', 'No preview')}</small>
+                        </div>
+                        """, unsafe_allow_html=True)
+
+
+def new_app():
+    import streamlit as st
+
+    from chat_history import render_history
+
+    render_history(st.session_state.chat_history)
+
+
+def make_turns(chunks: list, golden: list, count: int) -> list:
+    turns = []
+    for n in range(count):
+        picked = [chunks[(n * SOURCES_PER_TURN + i) % len(chunks)] for i in range(SOURCES_PER_TURN)]
+        turns.append({
+            "question": golden[n % len(golden)]["question"],
+            "answer": "\n\n".join(c["content"] for c in picked[:2]),
+            "sources": [
+                {"number": i + 1, "source": c["source"], "preview": c["content"][:100] + "..."}
+                for i, c in enumerate(picked)
+            ],
+            "time": 1.0
+        })
+    return turns
+
+
+def payload(node) -> tuple:
+    """(elements, protobuf bytes) under an AppTest tree node"""
+    proto = getattr(node, "proto", None)
+    elements, size = (1, proto.ByteSize()) if proto is not None else (0, 0)
+    for child in getattr(node, "children", {}).values():
+        e, s = payload(child)
+        elements += e
+        size += s
+    return elements, size
+
+
+def rerun_ms(app: AppTest, reruns: int) -> float:
+    times = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        app.run()
+        times.append((time.perf_counter() - start) * 1000)
+    return sorted(times)[len(times) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--reruns", type=int, default=5)
+    parser.add_argument("--chunks", default=os.path.join(ROOT, "chunks.json"))
+    args = parser.parse_args()
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+    with open(args.chunks, "r", encoding="utf-8") as f:
+        chunks = json.load(f)
+    with open(os.path.join(ROOT, "bench", "golden_questions.json"), "r", encoding="utf-8") as f:
+        golden = json.load(f)
+
+    print(f"{'turns':>6} {'renderer':<9} {'shown':>6} {'rerun ms':>9} {'elements':>9} {'KB':>8}")
+    for count in args.turns:
+        turns = make_turns(chunks, golden, count)
+        # Kept in full so the comparison is like for like; the app's default keeps 200
+        history = ChatHistory(max_turns=count)
+        for turn in turns:
+            history.append(turn["question"], turn["answer"], turn["sources"], turn["time"])
+
+        for name, script, state in (("old", old_app, turns), ("new", new_app, history)):
+            app = AppTest.from_function(script, default_timeout=120)
+            app.session_state["chat_history"] = state
+            app.run()
+            ms = rerun_ms(app, args.reruns)
+            elements, size = payload(app._tree)
+            shown = count if name == "old" else len(history.visible())
+            print(f"{count:>6} {name:<9} {shown:>6} {ms:>9.1f} {elements:>9} {size / 1024:>8.1f}")
+    print(f"(rerun p50 of {args.reruns}; new shows the latest {history.page_size} turns until \"Load older\" is clicked)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# bench/bench_import_time.py
+#
+# Cold start and per-rerun cost of the app, each scenario in a fresh
+# interpreter:
+#
+#   key screen      what streamlit_app.py imports before an API key exists
+#   first question  + building VectorStore/ChatEngine and their OpenAI clients
+#   embeddings.py   a fully cached rebuild (Qdrant, but no LangChain/OpenAI)
+#
+# Prints wall time (best of --repeats), the `-X importtime` total and the
+# heaviest top-level imports, then renders the key screen with Streamlit's
+# AppTest to time the first run and reruns, and lists any heavy library
+# that got imported without being needed.
+#
+#   python bench/bench_import_time.py --top 8
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+APP_MODULES = "import streamlit, vector_store, chatengine, answer_cache, query_cache, reranker, tracing"
+SCENARIOS = {
+    "key screen": APP_MODULES,
+    "first question": APP_MODULES + (
+        "; vs = vector_store.VectorStore('sk-fake', warm_start=False)"
+        "; engine = chatengine.ChatEngine('sk-fake', vs)"
+        "; engine.client; vs.embeddings"
+    ),
+    "embeddings.py": "import embeddings, vector_store; vector_store.VectorStore('sk-fake', warm_start=False).client",
+}
+HEAVY = ("openai", "langchain_openai", "langchain_qdrant", "langchain_core", "qdrant_client")
+
+APPTEST = """
+import json, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file("streamlit_app.py", default_timeout=60)
+app.run()
+first = time.perf_counter() - start
+reruns = []
+for _ in range(%d):
+    start = time.perf_counter()
+    app.run()
+    reruns.append(time.perf_counter() - start)
+print(json.dumps({
+    "first": first,
+    "reruns": sorted(reruns),
+    "heavy": [m for m in %r if m in sys.modules],
+    "errors": [str(e.value) for e in app.exception]
+}))
+"""
+
+
+def run(args, env=None) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable] + args, cwd=ROOT, capture_output=True, text=True, env=env, check=True)
+
+
+def wall_time(stmt: str, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run(["-c", stmt])
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def import_profile(stmt: str):
+    """(total import seconds, Counter of top-level package -> cumulative seconds)"""
+    stderr = run(["-X", "importtime", "-c", stmt]).stderr
+    packages = Counter()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nesting is shown by two spaces per level; only count outermost imports
+        if len(name) - len(name.lstrip()) == 1:
+            packages[name.strip().split(".")[0]] += int(cumulative) / 1e6
+    return sum(packages.values()), packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeats", type=int, default=3, help="interpreter starts per scenario")
+    parser.add_argument("--reruns", type=int, default=10, help="AppTest reruns of the key screen")
+    parser.add_argument("--top", type=int, default=6, help="heaviest imports listed per scenario")
+    args = parser.parse_args()
+
+    print(f"{'scenario':<16} {'wall ms':>8} {'imports ms':>10}  heaviest imports (ms)")
+    for name, stmt in SCENARIOS.items():
+        wall = wall_time(stmt, args.repeats)
+        total, packages = import_profile(stmt)
+        heaviest = ", ".join(f"{pkg} {sec * 1000:.0f}" for pkg, sec in packages.most_common(args.top))
+        print(f"{name:<16} {wall * 1000:>8.0f} {total * 1000:>10.0f}  {heaviest}")
+
+    env = dict(os.environ, OPENAI_API_KEY="")
+    result = json.loads(run(["-c", APPTEST % (args.reruns, HEAVY)], env=env).stdout.strip().splitlines()[-1])
+    reruns = result["reruns"]
+    print(
+        f"\nkey screen via AppTest: first run {result['first'] * 1000:.0f} ms (incl. importing streamlit), "
+        f"rerun p50 {reruns[len(reruns) // 2] * 1000:.0f} ms, max {reruns[-1] * 1000:.0f} ms"
+    )
+    print(f"heavy libraries imported on the key screen: {', '.join(result['heavy']) or 'none'}")
+    if result["errors"]:
+        print(f"script errors: {result['errors']}")
+
+
+if __name__ == "__main__":
+    main()
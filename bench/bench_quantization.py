@@ -0,0 +1,173 @@
+# bench/bench_quantization.py
+#
+# Memory, latency and recall of LocalIndex storage modes against the exact
+# float32 index: Matryoshka-truncated dimensions, int8 scalar and binary
+# quantization, each with and without full-precision rescoring.
+#
+#   corpus  chunks.json queried with bench/golden_questions.json, or
+#           --snapshot for real text-embedding-3-large vectors from
+#           embeddings.py (queried with perturbed rows)
+#   scaled  the corpus grown to --rows noisy copies, for latency at size
+#
+# recall@k is the overlap of each mode's top-k with the float32 top-k.
+# Offline, the stub's hashed bag-of-words vectors are sparse and spread
+# evenly over dimensions, unlike real embeddings, so they are first pushed
+# through a fixed random rotation with a decaying spectrum: dense, with the
+# information front-loaded like a Matryoshka-trained model. --raw skips that.
+#
+#   python bench/bench_quantization.py --rows 20000 --queries 100
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from index_snapshot import load_snapshot
+from local_index import RESCORE_FACTOR, LocalIndex
+from stubs import hashed_embedding
+from vector_store import EMBEDDING_SIZE
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+MODES = [
+    ("float32", 3072), ("float32", 1024), ("float32", 256),
+    ("int8", 3072), ("int8", 1024), ("int8", 256),
+    ("binary", 3072), ("binary", 1024)
+]
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=-1, keepdims=True), 1e-12)
+
+
+def embedding_like(vectors: np.ndarray, queries: np.ndarray, rng):
+    """Same random projection for corpus and queries, variance decaying with dimension"""
+    dim = vectors.shape[1]
+    projection = rng.standard_normal((dim, dim)).astype(np.float32) / np.sqrt(dim)
+    projection *= (1.0 / np.sqrt(np.arange(1, dim + 1, dtype=np.float32)))[None, :]
+    return normalize(vectors @ projection), normalize(queries @ projection)
+
+
+def corpus_vectors(chunks_path: str, snapshot_path: str, raw: bool, rng):
+    """(corpus matrix, query matrix)"""
+    if snapshot_path:
+        # No query embeddings offline: perturbed corpus rows stand in for questions
+        vectors = np.array(load_snapshot(snapshot_path).vectors)
+        picks = vectors[rng.choice(len(vectors), size=min(len(vectors), 64), replace=False)]
+        queries = normalize(picks + rng.normal(0, 0.02, picks.shape).astype(np.float32))
+        return vectors, queries
+    with open(chunks_path, "r", encoding="utf-8") as f:
+        chunks = json.load(f)
+    with open(os.path.join(BENCH_DIR, "golden_questions.json"), "r", encoding="utf-8") as f:
+        questions = [item["question"] for item in json.load(f)]
+    vectors = np.stack([hashed_embedding(c["content"].lower().split(), EMBEDDING_SIZE) for c in chunks])
+    queries = np.stack([hashed_embedding(q.lower().split(), EMBEDDING_SIZE) for q in questions])
+    if raw:
+        return normalize(vectors), normalize(queries)
+    return embedding_like(vectors, queries, rng)
+
+
+def grow(vectors: np.ndarray, rows: int, rng) -> np.ndarray:
+    """Noisy copies of the corpus up to `rows` vectors; the noise follows the
+    corpus' per-dimension spread at half its size"""
+    picks = vectors[rng.integers(0, len(vectors), size=rows)]
+    noise = rng.standard_normal(picks.shape).astype(np.float32) * (0.5 * vectors.std(axis=0))
+    return normalize(picks + noise).astype(np.float32)
+
+
+def top_ids(index: LocalIndex, queries: np.ndarray, k: int):
+    return [[i for i, _ in index.search_ids(q, k)] for q in queries]
+
+
+def recall(results, truth, k: int) -> float:
+    return float(np.mean([len(set(r[:k]) & set(t[:k])) / k for r, t in zip(results, truth)]))
+
+
+def evaluate(vectors: np.ndarray, queries: np.ndarray, k: int, timed: bool):
+    payloads = [{}] * len(vectors)
+    truth = top_ids(LocalIndex(vectors, payloads, normalized=True), queries, k)
+    rows = []
+    for storage, dims in MODES:
+        index = LocalIndex(vectors, payloads, normalized=True, storage=storage, dims=dims)
+        exact = index.full is None
+        rescored = top_ids(index, queries, k)
+        index.rescore_factor = 1
+        plain = rescored if exact else top_ids(index, queries, k)
+        index.rescore_factor = RESCORE_FACTOR
+
+        latency = (0.0, 0.0)
+        if timed:
+            samples = []
+            for q in queries:
+                start = time.perf_counter()
+                index.search_ids(q, k)
+                samples.append((time.perf_counter() - start) * 1000)
+            latency = (np.percentile(samples, 50), np.percentile(samples, 99))
+        rows.append({
+            "mode": f"{storage}/{dims}",
+            "mb_per_100k": index.nbytes / len(vectors) * 100_000 / 1e6,
+            "p50_ms": latency[0],
+            "p99_ms": latency[1],
+            "recall@1": recall(rescored, truth, 1),
+            f"recall@{k}": recall(rescored, truth, k),
+            "plain": recall(plain, truth, k)
+        })
+    return rows
+
+
+def sweep(vectors: np.ndarray, queries: np.ndarray, k: int, factors):
+    """recall@k of binary storage as the rescored shortlist grows"""
+    payloads = [{}] * len(vectors)
+    truth = top_ids(LocalIndex(vectors, payloads, normalized=True), queries, k)
+    index = LocalIndex(vectors, payloads, normalized=True, storage="binary")
+    cells = []
+    for factor in factors:
+        index.rescore_factor = factor
+        cells.append(f"k*{factor} {recall(top_ids(index, queries, k), truth, k):.3f}")
+    print(f"binary/3072 recall@{k} by shortlist: " + ", ".join(cells))
+
+
+def print_rows(title: str, rows, k: int, timed: bool):
+    print(f"\n{title}")
+    header = f"{'mode':<14} {'MB/100k':>8}"
+    if timed:
+        header += f" {'p50 ms':>7} {'p99 ms':>7}"
+    print(header + f" {'recall@1':>9} {f'recall@{k}':>10} {'no rescore':>11}")
+    for row in rows:
+        line = f"{row['mode']:<14} {row['mb_per_100k']:>8.0f}"
+        if timed:
+            line += f" {row['p50_ms']:>7.2f} {row['p99_ms']:>7.2f}"
+        print(line + f" {row['recall@1']:>9.3f} {row[f'recall@{k}']:>10.3f} {row['plain']:>11.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=20000, help="size of the scaled corpus (0 to skip)")
+    parser.add_argument("--queries", type=int, default=100, help="queries against the scaled corpus")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--snapshot", help="index_snapshot.bin with real embeddings instead of hashed chunks.json")
+    parser.add_argument("--raw", action="store_true", help="use the hashed stub vectors as-is")
+    parser.add_argument("--chunks", default=os.path.join(os.path.dirname(BENCH_DIR), "chunks.json"))
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    vectors, queries = corpus_vectors(args.chunks, args.snapshot, args.raw, rng)
+    print(f"rescoring shortlists k * {RESCORE_FACTOR}; full-precision vectors (12 KB/chunk) stay in the snapshot mmap")
+    rows = evaluate(vectors, queries, args.k, timed=False)
+    print_rows(f"corpus: {len(vectors)} chunks, {len(queries)} queries", rows, args.k, timed=False)
+
+    if args.rows:
+        scaled = grow(vectors, args.rows, rng)
+        scaled_queries = grow(queries, args.queries, rng)
+        rows = evaluate(scaled, scaled_queries, args.k, timed=True)
+        print_rows(f"scaled: {len(scaled)} vectors, {len(scaled_queries)} queries", rows, args.k, timed=True)
+        sweep(scaled, scaled_queries, args.k, (4, 8, 16, 32))
+
+
+if __name__ == "__main__":
+    main()
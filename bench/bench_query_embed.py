@@ -0,0 +1,98 @@
+# bench/bench_query_embed.py
+#
+# Question-embedding latency under concurrent sessions against a local fake
+# embeddings API: one request per question (the old path) vs the query cache
+# plus micro-batcher behind VectorStore.embed_query.
+#
+#   python bench/bench_query_embed.py --sessions 32 --questions 20
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.pop("QDRANT_URL", None)
+
+from stubs import FakeOpenAIServer
+from vector_store import VectorStore
+
+TOPICS = [
+    "git rebase", "git stash", "docker volumes", "nginx reverse proxy", "postgres joins",
+    "django models", "html forms", "css flexbox", "c pointers", "ssl certificates",
+    "node streams", "react hooks", "linux permissions", "ssh keys", "redis caching"
+]
+TEMPLATES = ["What is {}?", "how does {} work", "Explain {} with an example", "when should I use {}?"]
+
+
+def question_pool(size: int, seed: int = 0):
+    rng = random.Random(seed)
+    return [rng.choice(TEMPLATES).format(rng.choice(TOPICS)) for _ in range(size)]
+
+
+def run(embed, sessions: int, questions: int, pool):
+    """Every session asks `questions` questions drawn with a skew toward popular ones"""
+    latencies = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(sessions)
+
+    def session(seed: int):
+        rng = random.Random(seed)
+        barrier.wait()
+        for _ in range(questions):
+            question = pool[min(int(rng.expovariate(1 / 8)), len(pool) - 1)]
+            if rng.random() < 0.5:
+                question = question.upper() if rng.random() < 0.2 else question.lower()
+            start = time.perf_counter()
+            embed(question)
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(sessions)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start, np.asarray(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=32, help="concurrent threads asking questions")
+    parser.add_argument("--questions", type=int, default=20, help="questions per session")
+    parser.add_argument("--pool", type=int, default=60, help="distinct questions to draw from")
+    parser.add_argument("--latency", type=float, default=0.15, help="per-request latency of the fake API (s)")
+    parser.add_argument("--wait-ms", type=float, default=5.0, help="micro-batch collection window")
+    args = parser.parse_args()
+
+    pool = question_pool(args.pool)
+    print(f"{'path':<16} {'wall s':>7} {'p50 ms':>7} {'p95 ms':>7} {'API calls':>9} {'hit rate':>8} {'avg batch':>9}")
+    with FakeOpenAIServer(latency=args.latency) as api, tempfile.TemporaryDirectory() as tmp:
+        os.environ["OPENAI_BASE_URL"] = api.api_base
+        os.environ["QUERY_BATCH_WAIT_MS"] = str(args.wait_ms)
+
+        for name in ("direct", "cached+batched"):
+            vs = VectorStore(api_key="sk-fake", cache_dir=tmp, warm_start=False)
+            embed = vs.embeddings.embed_query if name == "direct" else vs.embed_query
+            api.requests = 0
+            wall, ms = run(embed, args.sessions, args.questions, pool)
+            stats = vs.query_stats()
+            hit_rate = stats["cache"]["hit_rate"] if name != "direct" else 0.0
+            avg_batch = stats.get("batcher", {}).get("avg_batch_size", 1.0)
+            print(
+                f"{name:<16} {wall:>7.2f} {np.percentile(ms, 50):>7.1f} {np.percentile(ms, 95):>7.1f} "
+                f"{api.requests:>9} {hit_rate:>8.0%} {avg_batch:>9.1f}"
+            )
+            if name != "direct":
+                print(f"batch sizes: {stats['batcher']['batch_sizes']}")
+
+
+if __name__ == "__main__":
+    main()
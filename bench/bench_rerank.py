@@ -0,0 +1,122 @@
+# bench/bench_rerank.py
+#
+# Cost and effect of the MMR rerank stage. Latency is measured on synthetic
+# 3072-d candidate sets; diversity on chunks.json with hashed bag-of-words
+# vectors standing in for real embeddings (overlapping chunks share words,
+# so near-duplicates look near-duplicate).
+#
+#   python bench/bench_rerank.py --iterations 2000
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.pop("QDRANT_URL", None)
+
+from context_builder import pack_context
+from index_snapshot import write_snapshot
+from reranker import RERANK_FETCH_K, Reranker
+from stubs import hashed_embedding
+from vector_store import EMBEDDING_SIZE, VectorStore
+
+QUERIES = [
+    "git diff --staged", "git stash pop", "nginx reverse proxy setup", "docker volumes",
+    "postgres foreign keys", "django models and migrations", "html forms input types",
+    "c pointers and arrays", "ssl certificate certbot", "git branches merge",
+    "css flexbox", "node process manager pm2"
+]
+
+
+def synthetic_hits(n: int, dim: int, rng) -> list:
+    # A few topics with near-duplicate members, like overlapping chunks of one page
+    centers = rng.standard_normal((max(n // 4, 1), dim)).astype(np.float32)
+    hits = []
+    for i in range(n):
+        vector = centers[i % len(centers)] + 0.1 * rng.standard_normal(dim).astype(np.float32)
+        hits.append({"content": f"chunk {i}", "metadata": {"source": f"s{i % 7}"}, "score": 1.0 / (60 + i), "vector": vector})
+    return hits
+
+
+def mean_pairwise(vectors: np.ndarray) -> float:
+    if len(vectors) < 2:
+        return 0.0
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    sim = vectors @ vectors.T
+    return float(sim[~np.eye(len(sim), dtype=bool)].mean())
+
+
+def bench_latency(iterations: int, k: int):
+    rng = np.random.default_rng(0)
+    reranker = Reranker()
+    print(f"{'candidates':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for n in (RERANK_FETCH_K, 50, 100):
+        hits = synthetic_hits(n, EMBEDDING_SIZE, rng)
+        times = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            reranker.rerank("question", hits, k)
+            times.append((time.perf_counter() - start) * 1000)
+        print(f"{n:>10} {np.percentile(times, 50):>8.3f} {np.percentile(times, 99):>8.3f}")
+
+
+def bench_diversity(chunks_path: str, k: int):
+    with open(chunks_path, "r", encoding="utf-8") as f:
+        chunks = json.load(f)
+    payloads = [
+        {"page_content": c["content"], "metadata": {key: v for key, v in c.items() if key != "content"}}
+        for c in chunks
+    ]
+    vectors = np.stack([hashed_embedding(p["page_content"].lower().split(), EMBEDDING_SIZE) for p in payloads])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot_path = os.path.join(tmp, "snapshot.bin")
+        write_snapshot(snapshot_path, vectors, payloads)
+        store = VectorStore(api_key=None, cache_dir=tmp, snapshot_path=snapshot_path, backend="local")
+        reranker = Reranker()
+
+        rows = {"top-k": [], "mmr": []}
+        stage_ms = []
+        for query in QUERIES:
+            vector = hashed_embedding(query.lower().split(), EMBEDDING_SIZE)
+            plain = store.search(query, k=k, vector=vector, with_vectors=True)
+            fetched = store.search(query, k=RERANK_FETCH_K, vector=vector, with_vectors=True)
+            stage_ms.append(store.last_timings.get("vectors", 0.0))
+            reranked = reranker.rerank(query, fetched, k)
+            stage_ms[-1] += reranker.last_ms
+            for name, hits in (("top-k", plain), ("mmr", reranked)):
+                _, used, tokens = pack_context(hits)
+                rows[name].append((
+                    mean_pairwise(np.stack([h["vector"] for h in hits])),
+                    len({h["metadata"].get("source") for h in hits}),
+                    len(used),
+                    tokens
+                ))
+
+    print(f"\n{len(QUERIES)} queries over {len(chunks)} chunks, k={k} (MMR picks from {RERANK_FETCH_K})")
+    print(f"{'selection':<10} {'pairwise cos':>12} {'sources':>8} {'packed':>7} {'ctx tokens':>10}")
+    for name, values in rows.items():
+        sim, sources, used, tokens = np.mean(values, axis=0)
+        print(f"{name:<10} {sim:>12.3f} {sources:>8.1f} {used:>7.1f} {tokens:>10.0f}")
+    print(f"rerank stage (vector lookup + MMR): p50 {np.percentile(stage_ms, 50):.3f} ms, max {max(stage_ms):.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--k", type=int, default=6, help="chunks handed to context packing")
+    parser.add_argument("--chunks", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "chunks.json"))
+    args = parser.parse_args()
+
+    bench_latency(args.iterations, args.k)
+    bench_diversity(args.chunks, args.k)
+
+
+if __name__ == "__main__":
+    main()
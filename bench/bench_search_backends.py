@@ -0,0 +1,100 @@
+# bench/bench_search_backends.py
+#
+# Search latency of the in-process LocalIndex (exact and IVF) against the
+# Qdrant path on synthetic vectors. Query embedding is excluded on both sides.
+#
+#   python bench/bench_search_backends.py --sizes 1000 100000 1000000 --dim 256
+#
+# Full 3072-dim vectors at 1M rows need ~12 GB of RAM, hence the --dim knob.
+# Qdrant is skipped above --qdrant-max because its in-memory mode takes
+# minutes to ingest that many points; point QDRANT_URL at a server to
+# benchmark a real deployment instead.
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qdrant_client import QdrantClient
+from qdrant_client.models import Distance, VectorParams
+
+from local_index import LocalIndex
+
+
+def percentiles(samples):
+    ms = np.asarray(samples) * 1000
+    return np.percentile(ms, 50), np.percentile(ms, 99)
+
+
+def time_queries(search, queries):
+    samples = []
+    for q in queries:
+        start = time.perf_counter()
+        search(q)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def recall(approx, exact, queries, k):
+    found = 0
+    for q in queries:
+        truth = {i for i, _ in exact.search_ids(q, k)}
+        found += len(truth & {i for i, _ in approx.search_ids(q, k)})
+    return found / (k * len(queries))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--qdrant-max", type=int, default=100_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    print(f"{'n':>9} {'backend':<12} {'p50 ms':>8} {'p99 ms':>8} {'recall':>7}")
+    for n in args.sizes:
+        # Clustered data: real embeddings group by topic, pure noise doesn't
+        topics = rng.standard_normal((max(n // 100, 10), args.dim), dtype=np.float32)
+        vectors = topics[rng.integers(0, len(topics), size=n)]
+        vectors += 0.5 * rng.standard_normal((n, args.dim), dtype=np.float32)
+        payloads = [{"page_content": f"chunk {i}", "metadata": {"chunk_id": i}} for i in range(n)]
+        # Queries are perturbed corpus rows so they have real neighbours
+        picks = rng.integers(0, n, size=args.queries)
+        queries = vectors[picks] + 0.3 * rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+
+        exact = LocalIndex(vectors, payloads, ivf_threshold=n + 1)
+        p50, p99 = percentiles(time_queries(lambda q: exact.search(q, args.k), queries))
+        print(f"{n:>9} {'local-exact':<12} {p50:>8.3f} {p99:>8.3f} {1.0:>7.3f}")
+
+        ivf = LocalIndex(vectors, payloads, ivf_threshold=0)
+        p50, p99 = percentiles(time_queries(lambda q: ivf.search(q, args.k), queries))
+        r = recall(ivf, exact, queries, args.k)
+        print(f"{n:>9} {'local-ivf':<12} {p50:>8.3f} {p99:>8.3f} {r:>7.3f}")
+
+        if n > args.qdrant_max:
+            print(f"{n:>9} {'qdrant':<12} {'skipped':>8}")
+            continue
+        qdrant_url = os.getenv("QDRANT_URL")
+        client = QdrantClient(url=qdrant_url, prefer_grpc=True) if qdrant_url else QdrantClient(":memory:")
+        collection = f"bench_{n}_{args.dim}"
+        if client.collection_exists(collection):
+            client.delete_collection(collection)
+        client.create_collection(collection, vectors_config=VectorParams(size=args.dim, distance=Distance.COSINE))
+        client.upload_collection(collection, vectors=vectors, payload=payloads, ids=list(range(n)))
+
+        def qdrant_search(q):
+            return client.query_points(collection, query=q.tolist(), limit=args.k, with_payload=True).points
+
+        p50, p99 = percentiles(time_queries(qdrant_search, queries))
+        print(f"{n:>9} {'qdrant':<12} {p50:>8.3f} {p99:>8.3f} {'-':>7}")
+        client.delete_collection(collection)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# bench/bench_sessions.py
+#
+# What logging in and serving many API keys costs, before and after the
+# shared-index change, against the stub OpenAI server:
+#
+#   login   per-login key check: a 5-token gpt-3.5-turbo completion on a new
+#           client (old) vs a cached, zero-token `models.list` (new)
+#   memory  traced Python/NumPy memory with N keys that have each asked a
+#           question: a VectorStore + ChatEngine per key (old) vs one shared
+#           store and a ChatEngine per key (new)
+#
+#   python bench/bench_sessions.py --keys 1,5,10,25 --copies 5
+
+import argparse
+import gc
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.pop("QDRANT_URL", None)
+
+from chatengine import ChatEngine
+from credentials import KeyValidator
+from index_snapshot import write_snapshot
+from query_cache import QueryEmbeddingCache
+from stubs import FakeOpenAIServer, hashed_embedding
+from vector_store import EMBEDDING_SIZE, VectorStore
+
+QUESTIONS = ["git stash pop", "nginx reverse proxy setup", "docker volumes", "postgres foreign keys", "css flexbox"]
+
+
+def old_check(api_key: str) -> bool:
+    """The previous validate_api_key: a fresh client and a real completion"""
+    from openai import OpenAI
+    try:
+        client = OpenAI(api_key=api_key)
+        client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=[{"role": "user", "content": "Hi"}],
+            max_tokens=5
+        )
+        return True
+    except Exception:
+        return False
+
+
+def bench_login(api, logins: int, keys: int):
+    """Each of `keys` users logs in `logins / keys` times (reloads, new tabs)"""
+    validator = KeyValidator()
+    print(f"{'key check':<22} {'ms/login':>9} {'p99 ms':>8} {'API calls':>10} {'tokens billed':>14}")
+    for name, check in (("completion (old)", old_check), ("models.list + cache", validator.validate)):
+        before_requests, before_chat = api.requests, api.chat_requests
+        times = []
+        for i in range(logins):
+            start = time.perf_counter()
+            assert check(f"sk-user-{i % keys}")
+            times.append((time.perf_counter() - start) * 1000)
+        chat_calls = api.chat_requests - before_chat
+        # "Hi" prompt (8 tokens with chat framing) + max_tokens=5
+        tokens = chat_calls * (8 + 5)
+        print(
+            f"{name:<22} {np.mean(times):>9.1f} {np.percentile(times, 99):>8.1f} "
+            f"{api.requests - before_requests:>10} {tokens:>14}"
+        )
+    api.invalid_keys.add("sk-revoked")
+    rejected = [validator.validate("sk-revoked") for _ in range(3)]
+    print(f"revoked key: {rejected} with {validator.stats()['checks']} checks for {validator.stats()['keys']} keys")
+
+
+def write_index(tmp: str, chunks_path: str, copies: int) -> str:
+    with open(chunks_path, "r", encoding="utf-8") as f:
+        chunks = json.load(f)
+    payloads = [
+        {"page_content": c["content"], "metadata": dict({key: v for key, v in c.items() if key != "content"}, copy=n)}
+        for n in range(copies)
+        for c in chunks
+    ]
+    vectors = np.stack([hashed_embedding(p["page_content"].lower().split(), EMBEDDING_SIZE) for p in payloads])
+    path = os.path.join(tmp, "snapshot.bin")
+    write_snapshot(path, vectors, payloads)
+    return path
+
+
+def serve_keys(keys: int, shared: bool, tmp: str, snapshot_path: str):
+    """Engines for `keys` users, each having asked one question"""
+
+    def new_store(api_key):
+        return VectorStore(
+            api_key=api_key, cache_dir=tmp, snapshot_path=snapshot_path, backend="local", query_cache=query_cache
+        )
+
+    query_cache = QueryEmbeddingCache()
+    store = new_store(None) if shared else None
+    engines = []
+    for i in range(keys):
+        api_key = f"sk-user-{i}"
+        engine = ChatEngine(api_key=api_key, vector_store=store or new_store(api_key))
+        engine.get_answer(QUESTIONS[i % len(QUESTIONS)])
+        engines.append(engine)
+    return engines
+
+
+def bench_memory(key_counts, tmp: str, snapshot_path: str):
+    # Imports and module-level caches would otherwise land in the first row
+    serve_keys(2, False, tmp, snapshot_path)
+    print(f"\n{'keys':>5} {'per-key stores MB':>18} {'shared store MB':>16} {'ratio':>6}")
+    rows = {}
+    for keys in key_counts:
+        row = []
+        for shared in (False, True):
+            gc.collect()
+            tracemalloc.start()
+            engines = serve_keys(keys, shared, tmp, snapshot_path)
+            gc.collect()
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            del engines
+            row.append(current / 1e6)
+        rows[keys] = row
+        print(f"{keys:>5} {row[0]:>18.1f} {row[1]:>16.1f} {row[0] / row[1]:>5.1f}x")
+    if len(rows) > 1:
+        low, high = min(rows), max(rows)
+        growth = [(rows[high][i] - rows[low][i]) / (high - low) * 1000 for i in (0, 1)]
+        print(f"each extra key: {growth[0]:.0f} KB with per-key stores, {growth[1]:.0f} KB with the shared store")
+    print("(vectors are memory-mapped from the snapshot, so these are heap bytes on top of the page cache)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--login-keys", type=int, default=10, help="distinct users behind --logins")
+    parser.add_argument("--chat-latency", type=float, default=0.3, help="stub completion latency (s)")
+    parser.add_argument("--models-latency", type=float, default=0.05, help="stub models.list latency (s)")
+    parser.add_argument("--keys", default="1,5,10,25", help="comma-separated key counts for the memory table")
+    parser.add_argument("--copies", type=int, default=5, help="replicate chunks.json to grow the index")
+    parser.add_argument("--chunks", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "chunks.json"))
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with FakeOpenAIServer(latency=args.models_latency, chat_latency=args.chat_latency) as api:
+        os.environ["OPENAI_BASE_URL"] = api.api_base
+        bench_login(api, args.logins, args.login_keys)
+        # Embedding latency doesn't matter for the memory table
+        api.latency = 0.0
+        with tempfile.TemporaryDirectory() as tmp:
+            snapshot_path = write_index(tmp, args.chunks, args.copies)
+            bench_memory([int(n) for n in args.keys.split(",")], tmp, snapshot_path)
+
+
+if __name__ == "__main__":
+    main()
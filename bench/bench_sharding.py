@@ -0,0 +1,207 @@
+# bench/bench_sharding.py
+#
+# Per-series shard routing, offline (stub hashed embeddings, local backend):
+#
+#   routing  the golden questions against chunks.json: how often the router
+#            narrows the search, whether the expected series is among the
+#            shards it picked, and recall@k of routed vs full search; with
+#            keywords only (no embedding at hand) and keywords + centroids
+#   scale    hybrid search latency over all shards vs the shards the
+#            router picks, as the docs grow to --courses x the 6 series.
+#            Each copy is a new series with its own pages and topic words
+#            (words found in under half the series get the copy number as a
+#            suffix; everyday words stay shared), standing in for distinct
+#            courses; each question is asked of one copy
+#
+#   python bench/bench_sharding.py --courses 1 10 50 --grow 4
+
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.pop("QDRANT_URL", None)
+
+from index_snapshot import write_snapshot
+from shard_router import MIN_ROUTED_CHUNKS, series_of
+from stubs import hashed_embedding
+from vector_store import EMBEDDING_SIZE, VectorStore
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def embed(text: str) -> np.ndarray:
+    return hashed_embedding(text.lower().split(), EMBEDDING_SIZE)
+
+
+WORD_RE = re.compile(r"[A-Za-z0-9]+")
+
+
+def topic_words(chunks: list) -> set:
+    """Lowercased words that appear in fewer than half the series"""
+    series = {}
+    for chunk in chunks:
+        for word in WORD_RE.findall(chunk["content"].lower()):
+            series.setdefault(word, set()).add(series_of(chunk["source"]))
+    n_series = len({series_of(c["source"]) for c in chunks})
+    return {word for word, found in series.items() if len(found) < n_series / 2}
+
+
+def variant(text: str, n: int, topic: set) -> str:
+    """Copy n of a text: topic words suffixed so each copy has its own"""
+    if not n:
+        return text
+    return WORD_RE.sub(lambda m: f"{m.group(0)}q{n}" if m.group(0).lower() in topic else m.group(0), text)
+
+
+def variant_source(source: str, n: int) -> str:
+    series = series_of(source)
+    return source if not n else source.replace(f"/{series}/", f"/{series}-{n}/")
+
+
+def questions_for(golden: list, courses: int, topic: set) -> list:
+    """Each golden question asked of one copy, round-robin"""
+    return [
+        {
+            "question": variant(item["question"], i % courses, topic),
+            "sources": [variant_source(s, i % courses) for s in item["sources"]]
+        }
+        for i, item in enumerate(golden)
+    ]
+
+
+def build_store(tmp: str, chunks: list, courses: int, grow: int, rng, topic: set = frozenset()) -> VectorStore:
+    """Snapshot with `courses` copies of every series, each chunk `grow` times"""
+    payloads, vectors = [], []
+    for n in range(courses):
+        for chunk in chunks:
+            content = variant(chunk["content"], n, topic)
+            vector = embed(content)
+            metadata = {k: v for k, v in chunk.items() if k != "content"}
+            for g in range(grow):
+                payloads.append({
+                    "page_content": content,
+                    "metadata": dict(metadata, source=variant_source(chunk["source"], n), copy=g)
+                })
+                vectors.append(vector + rng.normal(0, 0.01, vector.shape).astype(np.float32) if g else vector)
+    path = os.path.join(tmp, f"snapshot-{courses}-{grow}.bin")
+    write_snapshot(path, np.stack(vectors), payloads)
+    store = VectorStore(api_key=None, cache_dir=tmp, snapshot_path=path, backend="local")
+    store.lexical_search("warm up", k=1)
+    store._router()
+    return store
+
+
+def hit_at_k(hits: list, sources: list, k: int) -> float:
+    return float(any(h["metadata"].get("source") in sources for h in hits[:k]))
+
+
+def bench_routing(store: VectorStore, golden: list, k: int):
+    print(f"{'router':<20} {'routed':>7} {'correct':>8} {'shards':>7} {'route ms':>9} {f'hit@{k} full':>11} {'routed':>7}")
+    for name, with_vector in (("keywords", False), ("keywords+centroids", True)):
+        routed = correct = shards_searched = 0
+        full_hits, routed_hits, route_ms = [], [], []
+        for item in golden:
+            vector = embed(item["question"])
+            start = time.perf_counter()
+            shards = store.route(item["question"], vector if with_vector else None)
+            route_ms.append((time.perf_counter() - start) * 1000)
+            expected = {series_of(s) for s in item["sources"]}
+            if shards is not None:
+                routed += 1
+                correct += expected <= set(shards)
+            shards_searched += len(shards) if shards else len(store.local_shards)
+            store.routing = False
+            full = store.search(item["question"], k=k, vector=vector)
+            narrowed = store.search(item["question"], k=k, vector=vector, shards=shards)
+            store.routing = True
+            full_hits.append(hit_at_k(full, item["sources"], k))
+            routed_hits.append(hit_at_k(narrowed, item["sources"], k))
+        print(
+            f"{name:<20} {routed / len(golden):>6.0%} {correct / max(routed, 1):>7.0%} "
+            f"{shards_searched / len(golden):>7.1f} {np.mean(route_ms):>9.3f} "
+            f"{np.mean(full_hits):>11.3f} {np.mean(routed_hits):>7.3f}"
+        )
+    print(f"(routed = questions narrowed to <= 2 shards; correct = expected series among them; routing is off below {MIN_ROUTED_CHUNKS} chunks, forced on here)")
+
+
+def bench_scale(store: VectorStore, questions: list, k: int, repeats: int) -> tuple:
+    """p50 ms of a hybrid search over every shard vs over the routed ones, plus routing accuracy"""
+    full_ms, routed_ms, route_ms = [], [], []
+    routed = correct = 0
+    for item in questions:
+        shards = store.route(item["question"], embed(item["question"]))
+        if shards is not None:
+            routed += 1
+            correct += {series_of(s) for s in item["sources"]} <= set(shards)
+    for _ in range(repeats):
+        for item in questions:
+            vector = embed(item["question"])
+            store.routing = False
+            start = time.perf_counter()
+            store.search(item["question"], k=k, vector=vector)
+            full_ms.append((time.perf_counter() - start) * 1000)
+            store.routing = True
+            start = time.perf_counter()
+            store.search(item["question"], k=k, vector=vector)
+            routed_ms.append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            store.route(item["question"], vector)
+            route_ms.append((time.perf_counter() - start) * 1000)
+    return (
+        np.percentile(full_ms, 50), np.percentile(routed_ms, 50), np.percentile(route_ms, 50),
+        routed / len(questions), correct / max(routed, 1)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--courses", type=int, nargs="+", default=[1, 10, 50], help="copies of the 6 series")
+    parser.add_argument("--grow", type=int, default=4, help="copies of every chunk within a series, for size")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--chunks", default=os.path.join(os.path.dirname(BENCH_DIR), "chunks.json"))
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    rng = np.random.default_rng(0)
+
+    with open(args.chunks, "r", encoding="utf-8") as f:
+        chunks = json.load(f)
+    with open(os.path.join(BENCH_DIR, "golden_questions.json"), "r", encoding="utf-8") as f:
+        golden = json.load(f)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = build_store(tmp, chunks, 1, 1, rng)
+        # The live corpus is below MIN_ROUTED_CHUNKS; route anyway to score the router
+        store._router().min_chunks = 0
+        print(f"routing: {len(golden)} golden questions, {len(chunks)} chunks in {len(store.local_shards)} series shards\n")
+        bench_routing(store, golden, args.k)
+
+        print(
+            f"\n{'series':>7} {'chunks':>8} {'chunks/shard':>13} {'all shards ms':>14} {'routed ms':>10} "
+            f"{'speedup':>8} {'route ms':>9} {'routed':>7} {'correct':>8}"
+        )
+        topic = topic_words(chunks)
+        for courses in args.courses:
+            store = build_store(tmp, chunks, courses, args.grow, rng, topic)
+            questions = questions_for(golden, courses, topic)
+            full, routed, route, share, correct = bench_scale(store, questions, args.k, args.repeats)
+            shards = len(store.local_shards)
+            print(
+                f"{shards:>7} {len(store.local_index):>8} {len(store.local_index) / shards:>13.0f} "
+                f"{full:>14.2f} {routed:>10.2f} {full / routed:>7.1f}x {route:>9.3f} {share:>6.0%} {correct:>7.0%}"
+            )
+            store.snapshot.close()
+    print("(hybrid search, p50; routed includes routing, and falls back to all shards when the router isn't sure)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# bench/bench_snapshot_load.py
+#
+# Startup timing: how long does a fresh VectorStore take to become searchable
+# from a prebuilt snapshot, as the chunk count grows?
+#
+#   python bench/bench_snapshot_load.py --counts 144 1000 5000
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.pop("QDRANT_URL", None)  # always benchmark the in-memory boot path
+
+from index_snapshot import load_snapshot, write_snapshot
+from vector_store import EMBEDDING_SIZE, VectorStore
+
+
+def synthetic_snapshot(path: str, count: int, dim: int):
+    rng = np.random.default_rng(count)
+    vectors = rng.standard_normal((count, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    payloads = [
+        {
+            "page_content": f"synthetic chunk {i} " * 40,
+            "metadata": {"source": f"https://example.com/doc/{i // 5}/", "chunk_id": i % 5}
+        }
+        for i in range(count)
+    ]
+    return write_snapshot(path, vectors, payloads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--counts", type=int, nargs="+", default=[144, 1000, 5000])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'chunks':>8} {'file MB':>8} {'mmap ms':>9} {'boot ms':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in args.counts:
+            path = os.path.join(tmp, f"snap-{count}.bin")
+            size = synthetic_snapshot(path, count, EMBEDDING_SIZE)
+
+            mmap_times, boot_times = [], []
+            for _ in range(args.repeats):
+                # Raw snapshot open: header + payload JSON, vectors stay paged out
+                start = time.perf_counter()
+                snap = load_snapshot(path)
+                mmap_times.append(time.perf_counter() - start)
+                snap.close()
+
+                # Full VectorStore boot: new in-memory Qdrant populated from the file
+                start = time.perf_counter()
+                VectorStore(api_key=None, cache_dir=tmp, snapshot_path=path)
+                boot_times.append(time.perf_counter() - start)
+
+            print(
+                f"{count:>8} {size / 1e6:>8.1f} "
+                f"{min(mmap_times) * 1000:>9.2f} {min(boot_times) * 1000:>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
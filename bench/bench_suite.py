@@ -0,0 +1,381 @@
+# bench/bench_suite.py
+#
+# Offline end-to-end benchmark of the whole RAG pipeline, for comparing runs.
+#
+# The pages in chunks.json are rebuilt as HTML and served locally, then:
+#   ingestion  fetch -> parse -> chunk -> write (what ingestion.main does)
+#   index      embed + upsert every chunk, build the local/BM25 indexes,
+#              write and reload the snapshot
+#   search     hybrid search latency over the golden questions, cold
+#              (query embedded over HTTP) and warm (query cache hit)
+#   recall     recall@k / MRR of lexical, dense and hybrid retrieval, and
+#              of the sources actually packed into the prompt, against
+#              bench/golden_questions.json (question -> DOC_URLS pages)
+#   answer     ChatEngine.get_answer latency and token counts
+#   memory     RSS after each stage and peak RSS
+#
+# Embeddings (hashed bag-of-words) and answers come from the stub OpenAI
+# server, so everything but the timings is deterministic. Results go to a
+# JSON file; --compare checks them against an earlier run and exits 1 on a
+# regression.
+#
+#   python bench/bench_suite.py --output bench_results.json
+#   python bench/bench_suite.py --output new.json --compare bench_results.json
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.pop("QDRANT_URL", None)
+
+import ingestion
+from chatengine import ChatEngine
+from fetcher import HttpCache, fetch_all
+from stubs import DocsSiteServer, FakeOpenAIServer
+from vector_store import VectorStore
+
+DOCS_ORIGIN = "https://chaidocs.vercel.app"
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden_questions.json")
+RECALL_KS = (1, 3, 5, 10)
+# Metrics where higher is better; everything else numeric is lower-is-better
+HIGHER_IS_BETTER = ("per_sec", "recall", "mrr")
+# Counts and sizes that describe the run rather than its speed
+NOT_COMPARED = ("count", "chunks", "pages", "questions", "tokens", "bytes")
+# Changes smaller than this are timer/allocator noise whatever the percentage
+NOISE_FLOOR = {"_seconds": 0.005, "_ms": 0.2, "_mb": 10.0}
+# Tail percentiles of a few hundred samples move run to run; shown, not gated
+INFORMATIONAL = ("p95_ms", "p99_ms")
+
+
+def rss_mb() -> float:
+    """Current resident set size (Linux), falling back to the peak"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+
+def best_of(repeats: int, fn) -> float:
+    """Fastest of `repeats` timed calls, in seconds"""
+    times = []
+    for _ in range(repeats):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def percentiles(ms) -> dict:
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {"p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99), "mean_ms": float(np.mean(ms))}
+
+
+def site_pages(chunks_path: str) -> dict:
+    """HTML per URL path, rebuilt from chunks.json (overlapping lines dropped)"""
+    with open(chunks_path, "r", encoding="utf-8") as f:
+        chunks = json.load(f)
+    lines = defaultdict(dict)
+    for chunk in chunks:
+        for line in chunk["content"].split("\n"):
+            line = line.strip()
+            if line:
+                lines[chunk["source"]].setdefault(line, None)
+
+    pages = {}
+    for source, page_lines in lines.items():
+        body = []
+        for line in page_lines:
+            if line.startswith("## "):
+                body.append(f"<h2>{line[3:]}</h2>")
+            else:
+                body.append(f"<p>{line}</p>")
+        pages[source[len(DOCS_ORIGIN):]] = (
+            "<!doctype html><html><body><main><article>" + "".join(body) + "</article></main></body></html>"
+        )
+    return pages
+
+
+def bench_ingestion(pages: dict, tmp: str) -> tuple:
+    with DocsSiteServer(pages=pages) as site:
+        urls = [site.base_url + path for path in pages]
+        start = time.perf_counter()
+        results = fetch_all(urls, cache=HttpCache(cache_dir=os.path.join(tmp, "http_cache")))
+        fetch_seconds = time.perf_counter() - start
+
+    out_path = os.path.join(tmp, "chunks.json")
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        count = ingestion.write_chunks(ingestion.iter_site_chunks(results, {}, {}, {}), out_path)
+    chunk_seconds = time.perf_counter() - start
+
+    with open(out_path, "r", encoding="utf-8") as f:
+        chunks = json.load(f)
+    for chunk in chunks:
+        chunk["source"] = chunk["source"].replace(site.base_url, DOCS_ORIGIN, 1)
+    total = fetch_seconds + chunk_seconds
+    return chunks, {
+        "pages": len(pages),
+        "chunks": count,
+        "fetch_seconds": fetch_seconds,
+        "chunk_seconds": chunk_seconds,
+        "pages_per_sec": len(pages) / total,
+        "chunks_per_sec": count / total
+    }
+
+
+def bench_index(chunks: list, tmp: str, repeats: int) -> tuple:
+    snapshot_path = os.path.join(tmp, "index_snapshot.bin")
+    store = VectorStore(
+        api_key="sk-fake",
+        cache_dir=os.path.join(tmp, "embedding_cache"),
+        snapshot_path=snapshot_path,
+        backend="local",
+        warm_start=False
+    )
+    # Libraries are imported on first use; keep that out of the throughput number
+    store.client, store.embeddings
+    start = time.perf_counter()
+    store.add_chunks(chunks)
+    embed_seconds = time.perf_counter() - start
+
+    def build_local():
+        store._invalidate()
+        store._local()
+
+    def build_lexical():
+        store.lexical_index = None
+        store._lexical()
+
+    def load_snapshot():
+        VectorStore(
+            api_key="sk-fake",
+            cache_dir=os.path.join(tmp, "embedding_cache"),
+            snapshot_path=snapshot_path,
+            backend="local"
+        )._local()
+
+    local_seconds = best_of(repeats, build_local)
+    lexical_seconds = best_of(repeats, build_lexical)
+    save_seconds = best_of(repeats, store.save_snapshot)
+    load_seconds = best_of(repeats, load_snapshot)
+
+    return store, {
+        "chunks": len(chunks),
+        "embed_upsert_seconds": embed_seconds,
+        "embed_chunks_per_sec": len(chunks) / embed_seconds,
+        "local_index_seconds": local_seconds,
+        "bm25_seconds": lexical_seconds,
+        "snapshot_save_seconds": save_seconds,
+        "snapshot_load_seconds": load_seconds,
+        "snapshot_bytes": os.path.getsize(snapshot_path)
+    }
+
+
+def bench_search(store: VectorStore, golden: list, rounds: int) -> dict:
+    cold = []
+    for item in golden:
+        start = time.perf_counter()
+        store.search(item["question"], k=max(RECALL_KS))
+        cold.append((time.perf_counter() - start) * 1000)
+    warm = []
+    for _ in range(rounds):
+        for item in golden:
+            start = time.perf_counter()
+            store.search(item["question"], k=max(RECALL_KS))
+            warm.append((time.perf_counter() - start) * 1000)
+    return {"cold": percentiles(cold), "warm": percentiles(warm), "count": len(warm)}
+
+
+def rank_of(sources: list, expected: set) -> int:
+    """1-based rank of the first expected source, 0 if none"""
+    for rank, source in enumerate(sources, 1):
+        if source in expected:
+            return rank
+    return 0
+
+
+def bench_recall(store: VectorStore, engine: ChatEngine, golden: list) -> dict:
+    recall = {}
+    for mode in ("lexical", "dense", "hybrid"):
+        ranks = []
+        for item in golden:
+            hits = store.search(item["question"], k=max(RECALL_KS), mode=mode)
+            ranks.append(rank_of([hit["metadata"].get("source") for hit in hits], set(item["sources"])))
+        ranks = np.asarray(ranks)
+        recall[mode] = {f"recall@{k}": float(np.mean((ranks > 0) & (ranks <= k))) for k in RECALL_KS}
+        recall[mode]["mrr"] = float(np.mean(np.where(ranks > 0, 1.0 / np.maximum(ranks, 1), 0.0)))
+
+    # What reaches the prompt: rerank + token-budgeted packing
+    found, misses = 0, []
+    for item in golden:
+        _, sources = engine._retrieve(item["question"], store.embed_query(item["question"]))
+        if rank_of([s["source"] for s in sources], set(item["sources"])):
+            found += 1
+        else:
+            misses.append(item["question"])
+    recall["context"] = {"recall": found / len(golden)}
+    return recall, misses
+
+
+def bench_answers(engine: ChatEngine, golden: list) -> dict:
+    latencies, prompt_tokens, context_tokens = [], [], []
+    for item in golden:
+        start = time.perf_counter()
+        result = engine.get_answer(item["question"])
+        latencies.append((time.perf_counter() - start) * 1000)
+        usage = result.get("usage", {})
+        prompt_tokens.append(usage.get("prompt_tokens", 0))
+        context_tokens.append(usage.get("context_tokens", 0))
+    return dict(
+        percentiles(latencies),
+        count=len(latencies),
+        mean_prompt_tokens=float(np.mean(prompt_tokens)),
+        mean_context_tokens=float(np.mean(context_tokens))
+    )
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Print metric changes against a baseline; returns the regressed metric names"""
+    current = flatten({k: v for k, v in results.items() if k != "meta"})
+    previous = flatten({k: v for k, v in baseline.items() if k != "meta"})
+    regressions = []
+    print(f"\nvs {baseline.get('meta', {}).get('git', '?')} (tolerance {tolerance:.0%}):")
+    print(f"{'metric':<40} {'before':>10} {'after':>10} {'change':>8}")
+    for name in sorted(current.keys() & previous.keys()):
+        before, after = previous[name], current[name]
+        if any(part in name.rsplit(".", 1)[-1] for part in NOT_COMPARED) or before == after:
+            continue
+        floor = next((value for suffix, value in NOISE_FLOOR.items() if name.endswith(suffix)), 0.0)
+        change = (after - before) / before if before else float("inf")
+        if any(part in name for part in HIGHER_IS_BETTER):
+            # Recall is deterministic: any drop is a regression
+            worse = after < before - 1e-9 if "recall" in name or "mrr" in name else change < -tolerance
+        else:
+            worse = change > tolerance and after - before > floor
+        worse = worse and not name.endswith(INFORMATIONAL)
+        if worse:
+            regressions.append(name)
+        print(f"{name:<40} {before:>10.3f} {after:>10.3f} {change:>+7.0%}{'  REGRESSION' if worse else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", default=os.path.join(ROOT, "chunks.json"), help="corpus the site is rebuilt from")
+    parser.add_argument("--golden", default=GOLDEN_PATH)
+    parser.add_argument("--rounds", type=int, default=5, help="warm search passes over the golden questions")
+    parser.add_argument("--repeats", type=int, default=5, help="index builds timed (fastest is reported)")
+    parser.add_argument("--chat-latency", type=float, default=0.0, help="stub generation time per answer (s)")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="earlier results JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed slowdown before flagging (tighten on a quiet box)")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with open(args.golden, "r", encoding="utf-8") as f:
+        golden = json.load(f)
+    unknown = {s for item in golden for s in item["sources"]} - set(ingestion.DOC_URLS)
+    if unknown:
+        raise SystemExit(f"Golden sources not in DOC_URLS: {sorted(unknown)}")
+
+    results = {"meta": {
+        "git": git_revision(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "questions": len(golden),
+        "args": vars(args)
+    }}
+    memory = {"start_rss_mb": rss_mb()}
+
+    with tempfile.TemporaryDirectory() as tmp, FakeOpenAIServer(chat_latency=args.chat_latency) as api:
+        os.environ["OPENAI_BASE_URL"] = api.api_base
+
+        chunks, results["ingestion"] = bench_ingestion(site_pages(args.chunks), tmp)
+        memory["ingestion_rss_mb"] = rss_mb()
+        store, results["index"] = bench_index(chunks, tmp, args.repeats)
+        memory["index_rss_mb"] = rss_mb()
+        results["search"] = bench_search(store, golden, args.rounds)
+        memory["search_rss_mb"] = rss_mb()
+        engine = ChatEngine(api_key="sk-fake", vector_store=store)
+        results["recall"], misses = bench_recall(store, engine, golden)
+        results["answer"] = bench_answers(engine, golden)
+        memory["answer_rss_mb"] = rss_mb()
+    memory["peak_rss_mb"] = peak_rss_mb()
+    results["memory"] = memory
+
+    ing, idx, search, answer = results["ingestion"], results["index"], results["search"], results["answer"]
+    print(f"ingestion  {ing['pages']} pages -> {ing['chunks']} chunks, {ing['pages_per_sec']:.0f} pages/s "
+          f"(fetch {ing['fetch_seconds'] * 1000:.0f} ms, chunk {ing['chunk_seconds'] * 1000:.0f} ms)")
+    print(f"index      embed+upsert {idx['embed_chunks_per_sec']:.0f} chunks/s, local {idx['local_index_seconds'] * 1000:.1f} ms, "
+          f"BM25 {idx['bm25_seconds'] * 1000:.1f} ms, snapshot save/load "
+          f"{idx['snapshot_save_seconds'] * 1000:.1f}/{idx['snapshot_load_seconds'] * 1000:.1f} ms")
+    print(f"search     cold p50 {search['cold']['p50_ms']:.2f} ms p99 {search['cold']['p99_ms']:.2f} ms, "
+          f"warm p50 {search['warm']['p50_ms']:.2f} ms p99 {search['warm']['p99_ms']:.2f} ms")
+    print(f"answer     p50 {answer['p50_ms']:.1f} ms p99 {answer['p99_ms']:.1f} ms, "
+          f"{answer['mean_prompt_tokens']:.0f} prompt / {answer['mean_context_tokens']:.0f} context tokens")
+    print(f"memory     peak {memory['peak_rss_mb']:.0f} MB (index {memory['index_rss_mb'] - memory['ingestion_rss_mb']:+.0f} MB)")
+    print(f"\n{'recall':<10} " + " ".join(f"{f'@{k}':>6}" for k in RECALL_KS) + f" {'mrr':>6}")
+    for mode in ("lexical", "dense", "hybrid"):
+        row = results["recall"][mode]
+        print(f"{mode:<10} " + " ".join(f"{row[f'recall@{k}']:>6.2f}" for k in RECALL_KS) + f" {row['mrr']:>6.2f}")
+    print(f"{'context':<10} {results['recall']['context']['recall']:>6.2f}  ({len(misses)} questions without a golden source in the prompt)")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nWrote {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# bench/bench_tracing.py
+#
+# Tracing overhead: cost of one span with tracing off and on, and hybrid
+# search latency over chunks.json with the tracer disabled vs enabled. Ends
+# with a traced ChatEngine run against the stub OpenAI server, printing the
+# stage table and a slice of the Prometheus output.
+#
+#   python bench/bench_tracing.py --iterations 200000
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.pop("QDRANT_URL", None)
+
+from chatengine import ChatEngine
+from index_snapshot import write_snapshot
+from stubs import FakeOpenAIServer, hashed_embedding
+from tracing import Tracer, tracer
+from vector_store import EMBEDDING_SIZE, VectorStore
+
+QUERIES = [
+    "git diff --staged", "git stash pop", "nginx reverse proxy setup", "docker volumes",
+    "postgres foreign keys", "django models and migrations", "html forms input types",
+    "c pointers and arrays", "ssl certificate certbot", "css flexbox"
+]
+
+
+def bench_span(iterations: int):
+    print(f"{'tracer':<10} {'ns/span':>8} {'ns/nested span':>15}")
+    for enabled in (False, True):
+        t = Tracer(enabled=enabled)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            with t.span("stage"):
+                pass
+        flat = (time.perf_counter() - start) / iterations * 1e9
+
+        start = time.perf_counter()
+        with t.span("root"):
+            for _ in range(iterations):
+                with t.span("child"):
+                    pass
+        nested = (time.perf_counter() - start) / iterations * 1e9
+        print(f"{'on' if enabled else 'off':<10} {flat:>8.0f} {nested:>15.0f}")
+
+
+def load_store(tmp: str, chunks_path: str) -> VectorStore:
+    with open(chunks_path, "r", encoding="utf-8") as f:
+        chunks = json.load(f)
+    payloads = [
+        {"page_content": c["content"], "metadata": {key: v for key, v in c.items() if key != "content"}}
+        for c in chunks
+    ]
+    vectors = np.stack([hashed_embedding(p["page_content"].lower().split(), EMBEDDING_SIZE) for p in payloads])
+    snapshot_path = os.path.join(tmp, "snapshot.bin")
+    write_snapshot(snapshot_path, vectors, payloads)
+    return VectorStore(api_key="sk-fake", cache_dir=tmp, snapshot_path=snapshot_path, backend="local")
+
+
+def bench_search(store: VectorStore, rounds: int):
+    vectors = [hashed_embedding(q.lower().split(), EMBEDDING_SIZE) for q in QUERIES]
+    store.search(QUERIES[0], k=20, vector=vectors[0], with_vectors=True)
+
+    print(f"\n{'tracer':<10} {'search p50 ms':>14} {'p99 ms':>8}")
+    results = {}
+    # Interleave on/off rounds so drift on the box hits both equally
+    for _ in range(rounds):
+        for enabled in (False, True):
+            tracer.enabled = enabled
+            for query, vector in zip(QUERIES, vectors):
+                start = time.perf_counter()
+                store.search(query, k=20, vector=vector, with_vectors=True)
+                results.setdefault(enabled, []).append((time.perf_counter() - start) * 1000)
+    for enabled, times in results.items():
+        print(f"{'on' if enabled else 'off':<10} {np.percentile(times, 50):>14.3f} {np.percentile(times, 99):>8.3f}")
+    tracer.enabled = True
+
+
+def traced_answers(store: VectorStore, questions: int):
+    tracer.reset()
+    with FakeOpenAIServer(chat_latency=0.05) as api:
+        os.environ["OPENAI_BASE_URL"] = api.api_base
+        engine = ChatEngine(api_key="sk-fake", vector_store=store)
+        for i in range(questions):
+            question = f"{QUERIES[i % len(QUERIES)]} kaise kaam karta hai? ({i})"
+            if i % 2:
+                list(engine.stream_answer(question))
+            else:
+                engine.get_answer(question)
+
+    print(f"\n{questions} traced answers (stub OpenAI, 50 ms generation):")
+    print(tracer.format_summary())
+    slowest = max(tracer.snapshot()["recent"], key=lambda trace: trace["ms"])
+    print("\nslowest trace:")
+    for depth, name, ms in slowest["stages"]:
+        print(f"  {'  ' * depth}{name:<{28 - 2 * depth}} {ms:>8.1f} ms")
+    metrics = tracer.render_prometheus().splitlines()
+    print(f"\nPrometheus output: {len(metrics)} lines, e.g.")
+    for line in metrics:
+        if line.startswith("chaibot_tokens_total") or 'stage="answer",le="0.1"' in line:
+            print("  " + line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--rounds", type=int, default=30, help="passes over the queries per tracer setting")
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--chunks", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "chunks.json"))
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    bench_span(args.iterations)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = load_store(tmp, args.chunks)
+        bench_search(store, args.rounds)
+        traced_answers(store, args.questions)
+
+
+if __name__ == "__main__":
+    main()
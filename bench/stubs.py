@@ -0,0 +1,443 @@
+# bench/stubs.py
+#
+# Local stand-in servers so benchmarks run offline.
+
+import base64
+import hashlib
+import json
+import multiprocessing
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import tiktoken
+
+SERIES = ["chai-aur-html", "chai-aur-git", "chai-aur-c", "chai-aur-django", "chai-aur-sql", "chai-aur-devops"]
+
+
+def fixture_page(path: str, sections: int = 6) -> str:
+    """Deterministic docs-like HTML page for a URL path"""
+    title = path.strip("/").replace("/", " ").replace("-", " ").title() or "Home"
+    body = [f"<h1>{title}</h1>"]
+    for s in range(sections):
+        body.append(f"<h2>{title} part {s + 1}</h2>")
+        for p in range(4):
+            body.append(
+                f"<p>Paragraph {p + 1} of section {s + 1} on {title}. "
+                "Haanji, chai ke saath concepts samajhte hain: commands, flags, "
+                "examples and a few gotchas that college mein koi nahi batata.</p>"
+            )
+    return (
+        "<!doctype html><html><head><title>" + title + "</title></head><body>"
+        "<nav><a href='/'>Home</a></nav><main><article>" + "".join(body) +
+        "</article></main><footer>Last updated</footer></body></html>"
+    )
+
+
+def fixture_urls(base_url: str, count: int):
+    return [
+        f"{base_url}/youtube/{SERIES[i % len(SERIES)]}/page-{i}/"
+        for i in range(count)
+    ]
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    # The default backlog of 5 drops connection bursts, which shows up as
+    # 1 s SYN retransmits in the numbers
+    request_queue_size = 1024
+
+
+class _ServerThread:
+    def __init__(self, handler_cls):
+        self.server = _HTTPServer(("127.0.0.1", 0), handler_cls)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _serve_forever(server_cls, kwargs, ready):
+    with server_cls(**kwargs) as server:
+        ready.put(server.base_url)
+        threading.Event().wait()
+
+
+class StubProcess:
+    """Runs a stub server in a child process.
+
+    Load tests with hundreds of concurrent clients otherwise measure the
+    stub's request handling fighting the client for the GIL. Counters on
+    the server object are not visible from the parent.
+    """
+
+    def __init__(self, server_cls, **kwargs):
+        context = multiprocessing.get_context("spawn")
+        self._ready = context.Queue()
+        self.process = context.Process(target=_serve_forever, args=(server_cls, kwargs, self._ready), daemon=True)
+        self.base_url = None
+
+    @property
+    def api_base(self) -> str:
+        return self.base_url + "/v1"
+
+    def __enter__(self):
+        self.process.start()
+        self.base_url = self._ready.get(timeout=60)
+        return self
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.join()
+
+
+class DocsSiteServer(_ServerThread):
+    """Serves fixture pages with ETag/Last-Modified and answers 304s.
+
+    `latency` seconds are slept per request to stand in for a real round-trip.
+    `version` can be bumped to make every page change. With `pages` (URL
+    path -> HTML) only those pages exist and anything else is a 404.
+    """
+
+    def __init__(self, latency: float = 0.0, pages: dict = None):
+        server = self
+        self.latency = latency
+        self.pages = pages
+        self.version = 0
+        self.requests = 0
+        self.not_modified = 0
+        self.last_modified = formatdate(time.time(), usegmt=True)
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                if server.pages is not None and self.path not in server.pages:
+                    self.send_error(404)
+                    return
+                page = server.pages[self.path] if server.pages is not None else fixture_page(self.path)
+                html = page + f"<!-- v{server.version} -->"
+                body = html.encode("utf-8")
+                etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+
+                if self.headers.get("If-None-Match") == etag:
+                    server.not_modified += 1
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", server.last_modified)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        super().__init__(Handler)
+
+
+def hashed_embedding(tokens, dim: int) -> np.ndarray:
+    """Deterministic bag-of-words vector: texts sharing words land close together"""
+    vector = np.zeros(dim, dtype=np.float32)
+    for token in tokens:
+        h = int.from_bytes(hashlib.blake2b(str(token).encode("utf-8"), digest_size=8).digest(), "little")
+        vector[h % dim] += 1.0 if (h >> 63) else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class FakeOpenAIServer(_ServerThread):
+    """Speaks enough of the OpenAI REST API for offline benchmarks.
+
+    POST /v1/embeddings returns hashed bag-of-words vectors (token-id input,
+    as sent by LangChain, is decoded with tiktoken first). Each request
+    sleeps `latency` seconds; more than `max_concurrent` requests in flight
+    get a 429 like a real rate limit.
+
+    POST /v1/chat/completions answers with `answer_tokens` words after
+    `chat_latency` seconds, streamed as server-sent events `token_delay`
+    apart when the request asks for a stream.
+
+    GET /v1/models lists a couple of models after `latency` seconds. Any
+    request made with a key in `invalid_keys` gets a 401.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        max_concurrent: int = None,
+        dim: int = 3072,
+        chat_latency: float = 0.0,
+        token_delay: float = 0.0,
+        answer_tokens: int = 40,
+        invalid_keys=()
+    ):
+        server = self
+        self.latency = latency
+        self.max_concurrent = max_concurrent
+        self.dim = dim
+        self.chat_latency = chat_latency
+        self.token_delay = token_delay
+        self.answer_tokens = answer_tokens
+        self.invalid_keys = set(invalid_keys)
+        self.chat_requests = 0
+        self.model_requests = 0
+        self.requests = 0
+        self.rate_limited = 0
+        self.batch_sizes = []
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._encoding = tiktoken.get_encoding("cl100k_base")
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status: int, payload):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_stream(self, request):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for event in server.chat_stream_events(request):
+                    data = f"data: {event}\n\n".encode("utf-8")
+                    self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                    self.wfile.flush()
+                    if server.token_delay:
+                        time.sleep(server.token_delay)
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _rejected(self) -> bool:
+                key = self.headers.get("Authorization", "").removeprefix("Bearer ")
+                if key not in server.invalid_keys:
+                    return False
+                self._send_json(401, {"error": {"message": "Incorrect API key provided", "type": "invalid_request_error", "code": "invalid_api_key"}})
+                return True
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                    server.model_requests += 1
+                if self._rejected():
+                    return
+                if not self.path.rstrip("/").endswith("/models"):
+                    self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+                    return
+                if server.latency:
+                    time.sleep(server.latency)
+                self._send_json(200, {
+                    "object": "list",
+                    "data": [
+                        {"id": model, "object": "model", "created": 0, "owned_by": "system"}
+                        for model in ("gpt-4o-mini", "text-embedding-3-large")
+                    ]
+                })
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if self._rejected():
+                    return
+                with server._lock:
+                    server.requests += 1
+                    server._in_flight += 1
+                    limited = server.max_concurrent is not None and server._in_flight > server.max_concurrent
+                    if limited:
+                        server.rate_limited += 1
+                try:
+                    if limited:
+                        self._send_json(429, {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}})
+                        return
+                    if self.path.rstrip("/").endswith("/embeddings"):
+                        if server.latency:
+                            time.sleep(server.latency)
+                        self._send_json(200, server.embeddings_response(request))
+                    elif self.path.rstrip("/").endswith("/chat/completions"):
+                        with server._lock:
+                            server.chat_requests += 1
+                        if server.chat_latency:
+                            time.sleep(server.chat_latency)
+                        if request.get("stream"):
+                            self._send_stream(request)
+                        else:
+                            self._send_json(200, server.chat_response(request))
+                    else:
+                        self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+                finally:
+                    with server._lock:
+                        server._in_flight -= 1
+
+        super().__init__(Handler)
+
+    @property
+    def api_base(self) -> str:
+        return self.base_url + "/v1"
+
+    def tokens(self, item):
+        if isinstance(item, list):
+            item = self._encoding.decode(item)
+        return item.lower().split()
+
+    def embeddings_response(self, request):
+        inputs = request["input"]
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        dim = request.get("dimensions") or self.dim
+        with self._lock:
+            self.batch_sizes.append(len(inputs))
+
+        data = []
+        n_tokens = 0
+        for i, item in enumerate(inputs):
+            tokens = self.tokens(item)
+            n_tokens += len(tokens)
+            vector = hashed_embedding(tokens, dim)
+            if request.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vector.astype("<f4").tobytes()).decode("ascii")
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+        return {
+            "object": "list",
+            "data": data,
+            "model": request.get("model", "text-embedding-3-large"),
+            "usage": {"prompt_tokens": n_tokens, "total_tokens": n_tokens}
+        }
+
+    def _answer_words(self, request):
+        question = request["messages"][-1]["content"] if request.get("messages") else ""
+        words = (question.split() or ["haan", "ji"]) + ["chai", "ke", "saath", "samjhiye"]
+        return [words[i % len(words)] for i in range(self.answer_tokens)]
+
+    def _usage(self, request, completion_tokens: int):
+        prompt_tokens = sum(len(self._encoding.encode_ordinary(m.get("content") or "")) for m in request.get("messages", []))
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+
+    def chat_response(self, request):
+        words = self._answer_words(request)
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "gpt-4o-mini"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": " ".join(words)},
+                "finish_reason": "stop"
+            }],
+            "usage": self._usage(request, len(words))
+        }
+
+    def chat_stream_events(self, request):
+        """JSON strings for each SSE `data:` line, ending with [DONE]"""
+        words = self._answer_words(request)
+        base = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": request.get("model", "gpt-4o-mini")}
+        for i, word in enumerate(words):
+            text = word if i == 0 else " " + word
+            yield json.dumps(dict(base, choices=[{"index": 0, "delta": {"content": text}, "finish_reason": None}]))
+        yield json.dumps(dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+        if (request.get("stream_options") or {}).get("include_usage"):
+            yield json.dumps(dict(base, choices=[], usage=self._usage(request, len(words))))
+        yield "[DONE]"
+
+
+class FakeQdrantServer(_ServerThread):
+    """Answers Qdrant's REST `points/query` over a fixed set of points.
+
+    `vectors` (n x dim) and `payloads` stand in for the collection; every
+    query is exact cosine over them after sleeping `latency` seconds.
+    """
+
+    def __init__(self, vectors, payloads, latency: float = 0.0):
+        server = self
+        matrix = np.asarray(vectors, dtype=np.float32)
+        self.matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        self.payloads = payloads
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status: int, result):
+                body = json.dumps({"result": result, "status": "ok", "time": 0.0}).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                # Version probe made by the client's compatibility check
+                body = json.dumps({"title": "qdrant - stub", "version": "1.19.0"}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if not body:
+                    return  # client gave up (e.g. a cancelled dense search)
+                request = json.loads(body)
+                with server._lock:
+                    server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                if self.path.split("?")[0].rstrip("/").endswith("/points/query"):
+                    self._send_json(200, {"points": server.query(request)})
+                else:
+                    self._send_json(404, None)
+
+        super().__init__(Handler)
+
+    def query(self, request):
+        query = request["query"]
+        if isinstance(query, dict):  # {"nearest": [...]}
+            query = query.get("nearest")
+        query = np.asarray(query, dtype=np.float32)
+        scores = self.matrix @ (query / max(float(np.linalg.norm(query)), 1e-12))
+        top = np.argsort(-scores)[:request.get("limit", 10)]
+        return [
+            {"id": int(i), "version": 0, "score": float(scores[i]), "payload": self.payloads[i], "vector": None}
+            for i in top
+        ]
@@ -0,0 +1,104 @@
+# chat_history.py
+
+import html
+import os
+from collections import deque
+from typing import Dict, List
+
+import streamlit as st
+
+# Turns kept per session; older ones are dropped for good
+MAX_HISTORY_TURNS = 200
+# Turns shown per page; "Load older" reveals one more page
+HISTORY_PAGE_SIZE = 10
+
+
+def sources_html(sources: List[Dict]) -> str:
+    """All of an answer's sources as one HTML block (one element, not one per source)"""
+    boxes = []
+    for i, src in enumerate(sources):
+        source_url = html.escape(src.get('source', 'Unknown'))
+        boxes.append(f"""
+            <div class="source-box">
+                <strong>[{src.get('number', i+1)}]</strong>
+                <a href="{source_url}" target="_blank" style="color: #667eea; text-decoration: none; font-weight: 500;">{source_url}</a>
+                <br><small style="color: #6c757d;">{html.escape(src.get('preview', 'No preview'))}</small>
+            </div>""")
+    return "".join(boxes)
+
+
+class Turn:
+    """One question/answer pair, with its sources rendered to HTML up front"""
+
+    __slots__ = ("question", "answer", "sources_html", "source_count", "time")
+
+    def __init__(self, question: str, answer: str, sources: List[Dict] = None, time: float = 0.0):
+        self.question = question
+        self.answer = answer
+        self.sources_html = sources_html(sources) if sources else ""
+        self.source_count = len(sources or [])
+        self.time = time
+
+
+class ChatHistory:
+    """Bounded per-session chat history.
+
+    Holds at most `max_turns` turns (oldest dropped first), each rendered to
+    markdown/HTML once when it's added, so a rerun only re-sends strings.
+    `pages` is how many HISTORY_PAGE_SIZE pages of recent turns are shown.
+    """
+
+    def __init__(self, max_turns: int = None, page_size: int = None):
+        self.max_turns = max_turns or int(os.getenv("CHAT_HISTORY_MAX_TURNS", MAX_HISTORY_TURNS))
+        self.page_size = page_size or int(os.getenv("CHAT_HISTORY_PAGE_SIZE", HISTORY_PAGE_SIZE))
+        self.turns = deque(maxlen=self.max_turns)
+        self.pages = 1
+
+    def __len__(self) -> int:
+        return len(self.turns)
+
+    def append(self, question: str, answer: str, sources: List[Dict] = None, time: float = 0.0) -> Turn:
+        turn = Turn(question, answer, sources, time)
+        self.turns.append(turn)
+        return turn
+
+    def clear(self):
+        self.turns.clear()
+        self.pages = 1
+
+    def visible(self) -> List[Turn]:
+        """The most recent `pages` pages of turns, oldest first"""
+        shown = min(len(self.turns), self.pages * self.page_size)
+        return [self.turns[i] for i in range(len(self.turns) - shown, len(self.turns))]
+
+    def hidden(self) -> int:
+        """Turns kept but not shown"""
+        return max(0, len(self.turns) - self.pages * self.page_size)
+
+    def load_older(self):
+        self.pages += 1
+
+
+def render_turn(turn: Turn):
+    with st.chat_message("user"):
+        st.markdown(turn.question)
+
+    with st.chat_message("assistant"):
+        st.markdown(turn.answer)
+        if turn.source_count:
+            with st.expander(f"📚 Sources ({turn.source_count})"):
+                st.markdown(turn.sources_html, unsafe_allow_html=True)
+
+
+def render_history(history: ChatHistory):
+    """Recent turns, with a "Load older" button while older ones are hidden"""
+    hidden = history.hidden()
+    if hidden:
+        st.button(
+            f"⬆️ Load older ({hidden} more)",
+            key="load_older_turns",
+            on_click=history.load_older,
+            use_container_width=True
+        )
+    for turn in history.visible():
+        render_turn(turn)
@@ -1,54 +1,28 @@
 # chatengine.py
 
-from typing import List, Dict
-from openai import OpenAI
+from typing import Iterator, List, Dict, Optional
 from vector_store import VectorStore
+from answer_cache import SemanticAnswerCache
+from credentials import openai_client
+from context_builder import CHAT_MODEL, CONTEXT_CANDIDATES, CONTEXT_TOKEN_BUDGET, count_tokens, pack_context
+from reranker import RERANK_FETCH_K, Reranker
+from tracing import incr, observe, span
 import logging
+import os
+import time
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class ChatEngine:
-    def __init__(self, api_key: str, vector_store: VectorStore):
-        """Initialize ChatEngine with OpenAI client and vector store"""
-        self.client = OpenAI(api_key=api_key)
-        self.vector_store = vector_store
-    
-    def get_answer(self, question: str) -> Dict:
-        """Get answer for a question using RAG approach with full Hitesh personality"""
-        try:
-            # 1. Retrieve top-3 relevant chunks
-            logger.info(f"Searching for relevant chunks for question: {question[:50]}...")
-            relevant_chunks = self.vector_store.search(question, k=3)
-            
-            if not relevant_chunks:
-                return {
-                    "answer": "Sorry yaar, is question ke liye mere paas relevant information nahi hai. Kuch aur specific pooch sakte ho?",
-                    "sources": []
-                }
-            
-            # 2. Build a combined context + source list
-            context = ""
-            sources = []
-            for i, chunk in enumerate(relevant_chunks):
-                context += f"Source {i+1}: {chunk['content']}\n\n"
-                meta = chunk["metadata"]
-                src = {
-                    "number": i+1,
-                    "source": meta.get("source", "Unknown"),
-                    "preview": chunk["content"][:100] + "..."
-                }
-                sources.append(src)
-            
-            # 3. Full system prompt with Hitesh's personality (keeping original)
-            system_prompt = f"""
-You are an AI persona of Hitesh Choudhary — warm, grounded, and mentor-like.
+NO_CONTEXT_ANSWER = "Sorry yaar, is question ke liye mere paas relevant information nahi hai. Kuch aur specific pooch sakte ho?"
 
-Use ONLY the context below to answer the user. Cite every claim as [Source X].
+# Full system prompt with Hitesh's personality (keeping original). It never
+# changes between requests, so it goes first and providers can cache it.
+PERSONA_PROMPT = """
+You are an AI persona of Hitesh Choudhary — warm, grounded, and mentor-like.
 
-Context:
-{context}
+Use ONLY the context in the next message to answer the user. Cite every claim as [Source X].
 
 🔄 Hindi to Hinglish conversion rules (strict):
 Convert all Hindi (Devanagari) to Hinglish using English alphabets.
@@ -101,33 +75,263 @@ Add reflective questions:
 
 Keep responses focused and helpful. Always respond as if you are casually talking to a student sitting in front of you with chai in hand.
 """
-            
-            # 4. Generate response with optimized parameters
-            logger.info("Generating AI response...")
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",  # Faster and cheaper than gpt-4
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": question}
-                ],
-                max_tokens=600,  # Reasonable limit for faster responses
-                temperature=0.7,  # Balanced creativity
-                top_p=0.9
+
+def error_answer(e: Exception) -> str:
+    return f"Sorry yaar, kuch technical problem aa gayi hai. Please try again! Error: {str(e)[:50]}..."
+
+def usage_stats(usage, context: str) -> Dict:
+    """Per-request token counts: what the provider billed (and cached) plus our context size"""
+    details = getattr(usage, "prompt_tokens_details", None) if usage else None
+    stats = {
+        "prompt_tokens": usage.prompt_tokens if usage else 0,
+        "completion_tokens": usage.completion_tokens if usage else 0,
+        "cached_tokens": (getattr(details, "cached_tokens", 0) or 0) if details else 0,
+        "context_tokens": count_tokens(context)
+    }
+    for kind in ("prompt", "completion", "cached", "context"):
+        incr("tokens", stats[f"{kind}_tokens"], kind=kind)
+    logger.info(
+        f"Tokens: prompt={stats['prompt_tokens']} (cached {stats['cached_tokens']}, "
+        f"context {stats['context_tokens']}), completion={stats['completion_tokens']}"
+    )
+    return stats
+
+class ChatEngine:
+    def __init__(
+        self,
+        api_key: str,
+        vector_store: VectorStore,
+        answer_cache: Optional[SemanticAnswerCache] = None,
+        reranker: Optional[Reranker] = None
+    ):
+        """Initialize ChatEngine with vector store (the OpenAI client is created on first use)"""
+        self.api_key = api_key
+        self._client = None
+        self.vector_store = vector_store
+        self.answer_cache = answer_cache
+        self.reranker = reranker or Reranker()
+        self.rerank_fetch_k = int(os.getenv("RERANK_FETCH_K", RERANK_FETCH_K))
+        self.context_budget = int(os.getenv("CONTEXT_TOKEN_BUDGET", CONTEXT_TOKEN_BUDGET))
+        self.context_candidates = int(os.getenv("CONTEXT_CANDIDATES", CONTEXT_CANDIDATES))
+
+    @property
+    def client(self):
+        # openai takes ~0.5s to import; only pay for it when a question comes in
+        if self._client is None:
+            # Per-key client on the process-wide connection pool
+            self._client = openai_client(self.api_key)
+        return self._client
+
+    def _cached(self, question: str):
+        """Embed the question and check the semantic cache; returns (vector, hit).
+
+        The embedding gets the same `dense_timeout` as in search; if it misses
+        it the vector is None and the answer comes from BM25 alone.
+        """
+        if self.answer_cache is None:
+            return None, None
+        with span("answer.cache"):
+            vector = self.vector_store.embed_query_within(question, api_key=self.api_key)
+            hit = self.answer_cache.lookup(vector) if vector is not None else None
+        if hit:
+            logger.info(f"Semantic cache hit ({hit['similarity']:.3f}) for: {question[:50]}...")
+        return vector, hit
+
+    def _search_mode(self, vector) -> str:
+        # With the answer cache on, a missing vector means the embedding
+        # already timed out or failed: don't wait on it again
+        return "lexical" if vector is None and self.answer_cache is not None else "hybrid"
+
+    def _retrieve(self, question: str, vector: List[float] = None):
+        """Retrieve candidate chunks and build the combined context + source list"""
+        logger.info(f"Searching for relevant chunks for question: {question[:50]}...")
+        with span("answer.retrieve"):
+            hits = self.vector_store.search(
+                question, k=self.rerank_fetch_k, vector=vector, mode=self._search_mode(vector),
+                with_vectors=True, api_key=self.api_key
             )
-            
-            answer = response.choices[0].message.content.strip()
-            
-            # 5. Log successful completion
-            logger.info(f"Generated response with {len(sources)} sources")
-            
-            return {
-                "answer": answer,
-                "sources": sources
+            return self._format_context(self._rerank(question, hits))
+
+    def _rerank(self, question: str, hits: List[Dict]) -> List[Dict]:
+        """Over-fetched hits -> a diverse top `context_candidates` for packing"""
+        with span("answer.rerank"):
+            hits = self.reranker.rerank(question, hits, k=self.context_candidates)
+        logger.info(f"Reranked to {len(hits)} chunks in {self.reranker.last_ms:.2f} ms")
+        return hits
+
+    def _format_context(self, relevant_chunks: List[Dict]):
+        """Token-budgeted "Source N:" context + source list for the UI"""
+        with span("answer.pack"):
+            context, used, _ = pack_context(relevant_chunks, budget=self.context_budget)
+        sources = []
+        for i, chunk in enumerate(used):
+            meta = chunk["metadata"]
+            src = {
+                "number": i+1,
+                "source": meta.get("source", "Unknown"),
+                "preview": chunk["content"][:100] + "..."
             }
-            
+            sources.append(src)
+        return context, sources
+
+    def _build_messages(self, question: str, context: str) -> List[Dict]:
+        """Static persona first (a stable, cacheable prefix), then this question's context"""
+        return [
+            {"role": "system", "content": PERSONA_PROMPT},
+            {"role": "system", "content": f"Context:\n{context}"},
+            {"role": "user", "content": question}
+        ]
+
+    def _complete(self, messages: List[Dict], stream: bool = False):
+        # Generate response with optimized parameters
+        extra = {"stream_options": {"include_usage": True}} if stream else {}
+        return self.client.chat.completions.create(
+            model=CHAT_MODEL,  # Faster and cheaper than gpt-4
+            messages=messages,
+            max_tokens=600,  # Reasonable limit for faster responses
+            temperature=0.7,  # Balanced creativity
+            top_p=0.9,
+            stream=stream,
+            **extra
+        )
+
+    def _hit_events(self, hit: Dict) -> List[Dict]:
+        """A semantic cache hit as stream events: its sources, then the answer as one delta"""
+        incr("answers", outcome="cache_hit")
+        return [
+            {"type": "sources", "sources": hit["sources"]},
+            {"type": "delta", "text": hit["answer"]}
+        ]
+
+    def _sources_events(self, sources: List[Dict]) -> List[Dict]:
+        """The sources event, plus the whole answer when nothing relevant was found"""
+        events = [{"type": "sources", "sources": sources}]
+        if not sources:
+            incr("answers", outcome="no_context")
+            events.append({"type": "delta", "text": NO_CONTEXT_ANSWER})
+        return events
+
+    def _token_event(self, parts: List[str], text: str, start: float) -> Dict:
+        """Record one streamed piece of the answer and wrap it as a delta event"""
+        if not parts:
+            observe("answer.first_token", time.perf_counter() - start)
+        parts.append(text)
+        return {"type": "delta", "text": text}
+
+    def _finish(self, question: str, vector, result: Dict, response_usage, context: str, start: float) -> Dict:
+        """Log token counts and cache a generated answer; returns its usage stats"""
+        usage = usage_stats(response_usage, context)
+        if self.answer_cache is not None and vector is not None:
+            tokens = usage["prompt_tokens"] + usage["completion_tokens"]
+            self.answer_cache.store(question, vector, result, time.perf_counter() - start, tokens)
+        incr("answers", outcome="ok")
+        return usage
+
+    def _error_result(self, e: Exception) -> Dict:
+        logger.error(f"Error in get_answer: {str(e)}")
+        incr("answers", outcome="error")
+        return {
+            "answer": error_answer(e),
+            "sources": []
+        }
+
+    def _error_events(self, e: Exception, sources_sent: bool) -> List[Dict]:
+        logger.error(f"Error in stream_answer: {str(e)}")
+        incr("answers", outcome="error")
+        # Marks the answer as failed before the error text, for callers
+        # that relay one answer to several askers (answer_service.py)
+        events = [{"type": "error", "error": type(e).__name__}]
+        if not sources_sent:
+            events.append({"type": "sources", "sources": []})
+        events.append({
+            "type": "delta",
+            "text": error_answer(e)
+        })
+        return events
+
+    def get_answer(self, question: str) -> Dict:
+        """Get answer for a question using RAG approach with full Hitesh personality"""
+        try:
+            with span("answer", engine="sync", stream=False):
+                # 0. A semantically equivalent question may already be answered
+                start = time.perf_counter()
+                vector, hit = self._cached(question)
+                if hit:
+                    incr("answers", outcome="cache_hit")
+                    return hit
+
+                # 1. Retrieve relevant chunks, packed into the context budget
+                context, sources = self._retrieve(question, vector)
+
+                if not sources:
+                    incr("answers", outcome="no_context")
+                    return {
+                        "answer": NO_CONTEXT_ANSWER,
+                        "sources": []
+                    }
+
+                # 2. Generate response
+                logger.info("Generating AI response...")
+                with span("answer.generate"):
+                    response = self._complete(self._build_messages(question, context))
+
+                answer = response.choices[0].message.content.strip()
+
+                # 3. Log successful completion, cache the answer
+                logger.info(f"Generated response with {len(sources)} sources")
+
+                result = {
+                    "answer": answer,
+                    "sources": sources
+                }
+                usage = self._finish(question, vector, result, response.usage, context, start)
+                return dict(result, usage=usage)
+
         except Exception as e:
-            logger.error(f"Error in get_answer: {str(e)}")
-            return {
-                "answer": f"Sorry yaar, kuch technical problem aa gayi hai. Please try again! Error: {str(e)[:50]}...",
-                "sources": []
-            }
+            return self._error_result(e)
+
+    def stream_answer(self, question: str) -> Iterator[Dict]:
+        """Stream an answer: {"type": "sources"}, {"type": "delta"} text pieces, then {"type": "usage"}
+
+        On failure an {"type": "error"} event comes first, then the error text as a delta.
+        """
+        sources_sent = False
+        try:
+            with span("answer", engine="sync", stream=True):
+                # 0. Cache hits come back as one delta
+                start = time.perf_counter()
+                vector, hit = self._cached(question)
+                if hit:
+                    yield from self._hit_events(hit)
+                    return
+
+                # 1. Retrieval finishes before generation, so sources go out first
+                context, sources = self._retrieve(question, vector)
+                yield from self._sources_events(sources)
+                sources_sent = True
+                if not sources:
+                    return
+
+                # 2. Forward tokens as they arrive
+                logger.info("Streaming AI response...")
+                parts = []
+                response_usage = None
+                with span("answer.generate"):
+                    stream = self._complete(self._build_messages(question, context), stream=True)
+                    for chunk in stream:
+                        if chunk.usage:
+                            response_usage = chunk.usage
+                        if not chunk.choices:
+                            continue
+                        text = chunk.choices[0].delta.content
+                        if text:
+                            yield self._token_event(parts, text, start)
+
+                # 3. Usage last, once the answer is cached
+                logger.info(f"Streamed response with {len(sources)} sources")
+                result = {"answer": "".join(parts).strip(), "sources": sources}
+                usage = self._finish(question, vector, result, response_usage, context, start)
+                yield {"type": "usage", "usage": usage}
+
+        except Exception as e:
+            yield from self._error_events(e, sources_sent)
@@ -0,0 +1,362 @@
+# chunk_store.py
+
+import hashlib
+import json
+import os
+import shutil
+import uuid
+import zlib
+from collections import defaultdict
+from collections.abc import Mapping
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+DEFAULT_CHUNK_STORE = "chunks.store"
+
+# One fixed-size index entry per chunk: where its record sits in records.bin,
+# its row in the source table, and its point ID (so syncing with Qdrant can
+# diff without reading any content)
+INDEX_DTYPE = np.dtype([
+    ("offset", "<u8"),
+    ("length", "<u4"),
+    ("source", "<u4"),
+    ("flags", "<u4"),
+    ("point", "V16")
+])
+FLAG_ZLIB = 1
+# Per-row metadata hash, in its own file beside the index (8 bytes a row)
+META_DTYPE = np.dtype("V8")
+
+
+def chunk_point_id(source: str, content: str) -> str:
+    """Deterministic point ID from source URL + chunk hash, so re-runs upsert in place"""
+    digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{source}#{digest}"))
+
+
+def chunk_metadata_hash(chunk: Dict) -> str:
+    """Hash of a chunk's metadata beyond source and content (chunk_id, headings, ...).
+
+    Kept out of the point ID, so a chunk whose position or headings moved
+    keeps its point and only has its payload updated.
+    """
+    extra = {k: v for k, v in chunk.items() if k not in ("source", "content")}
+    packed = json.dumps(extra, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(packed.encode("utf-8")).hexdigest()[:16]
+
+
+class ChunkStore:
+    """Chunks on disk with an offset index, for random access and streaming.
+
+    A store is a directory of four append-only files:
+
+        records.bin  each chunk as JSON minus its source URL, zlib-compressed
+                     when `compress` is on
+        index.bin    one INDEX_DTYPE entry per chunk
+        meta.bin     each chunk's chunk_metadata_hash (8 bytes)
+        sources.txt  the deduplicated source URLs, one per line
+
+    Opening a store reads only the index and source table; records are read
+    when asked for. Rows are numbered in append order.
+    """
+
+    def __init__(self, path: str = DEFAULT_CHUNK_STORE, compress: bool = True):
+        self.path = path
+        self.compress = compress
+        self.records_path = os.path.join(path, "records.bin")
+        self.index_path = os.path.join(path, "index.bin")
+        self.meta_path = os.path.join(path, "meta.bin")
+        self.sources_path = os.path.join(path, "sources.txt")
+        os.makedirs(path, exist_ok=True)
+        self._records = None
+        self._rows = None
+        self._load()
+
+    def _load(self):
+        # A torn last line (no newline yet) isn't a source; the next append truncates it
+        raw = b""
+        if os.path.exists(self.sources_path):
+            with open(self.sources_path, "rb") as f:
+                raw = f.read()
+        sources_end = raw.rfind(b"\n") + 1
+        sources = raw[:sources_end].decode("utf-8").split("\n")[:-1]
+
+        index = np.zeros(0, dtype=INDEX_DTYPE)
+        if os.path.exists(self.index_path):
+            index = np.fromfile(self.index_path, dtype=INDEX_DTYPE)
+
+        # Only trust entries whose record and source were fully written
+        data_size = os.path.getsize(self.records_path) if os.path.exists(self.records_path) else 0
+        valid = (index["offset"] + index["length"] <= data_size) & (index["source"] < len(sources))
+        n_rows = int(np.argmin(valid)) if not valid.all() else len(index)
+
+        # Metadata hashes are written before the index entries, so there are
+        # at least n_rows of them; stores from before meta.bin have none
+        meta = None
+        if os.path.exists(self.meta_path):
+            meta = np.fromfile(self.meta_path, dtype=META_DTYPE)
+            n_rows = min(n_rows, len(meta))
+            meta = meta[:n_rows]
+        elif not n_rows:
+            meta = np.zeros(0, dtype=META_DTYPE)
+
+        self._index = index[:n_rows]
+        self._meta = meta
+        self._sources = sources
+        self._sources_end = sources_end
+        self._source_ids = {source: i for i, source in enumerate(sources)}
+        self._end = int(self._index["offset"][-1] + self._index["length"][-1]) if n_rows else 0
+        self._rows = None
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    @property
+    def nbytes(self) -> int:
+        """On-disk size of the store"""
+        return sum(
+            os.path.getsize(p)
+            for p in (self.records_path, self.index_path, self.meta_path, self.sources_path)
+            if os.path.exists(p)
+        )
+
+    def sources(self) -> List[str]:
+        return list(self._sources)
+
+    def _point_bytes(self) -> List[bytes]:
+        raw = self._index["point"].tobytes()
+        return [raw[i:i + 16] for i in range(0, len(raw), 16)]
+
+    def point_ids(self) -> List[str]:
+        """Point ID of every row, from the index alone"""
+        if not self._ids_current():
+            # Written with other IDs: derive them from the records
+            return [chunk_point_id(chunk["source"], chunk["content"]) for chunk in self]
+        # str(uuid.UUID(bytes=...)) by hand; ~4x faster over a large index
+        hexes = (p.hex() for p in self._point_bytes())
+        return [f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}" for h in hexes]
+
+    def _ids_current(self) -> bool:
+        """Whether the index holds this version's point IDs. Rows are only
+        ever appended, so if the first row's ID is current every row's is"""
+        if not len(self._index):
+            return True
+        chunk = self[0]
+        expected = uuid.UUID(chunk_point_id(chunk["source"], chunk["content"])).bytes
+        return self._index["point"][0].tobytes() == expected
+
+    def metadata_hashes(self) -> List[str]:
+        """chunk_metadata_hash of every row, from meta.bin (or, for a store
+        written before it, from the records)"""
+        if self._meta is None:
+            return [chunk_metadata_hash(chunk) for chunk in self]
+        return [h.hex() for h in self._meta_bytes()]
+
+    def _meta_bytes(self) -> List[bytes]:
+        raw = self._meta.tobytes()
+        return [raw[i:i + 8] for i in range(0, len(raw), 8)]
+
+    def rows_for_source(self, source: str) -> np.ndarray:
+        source_id = self._source_ids.get(source)
+        if source_id is None:
+            return np.zeros(0, dtype=np.int64)
+        return np.flatnonzero(self._index["source"] == source_id)
+
+    def _reader(self):
+        if self._records is None:
+            self._records = open(self.records_path, "rb")
+        return self._records
+
+    def _decode(self, raw: bytes, source_id: int, flags: int) -> Dict:
+        if flags & FLAG_ZLIB:
+            raw = zlib.decompress(raw)
+        chunk = json.loads(raw)
+        # Put the source back where ingestion had it
+        return {"content": chunk.pop("content"), "source": self._sources[source_id], **chunk}
+
+    def _read(self, f, row: int) -> Dict:
+        offset, length, source_id, flags = self._index[["offset", "length", "source", "flags"]][row].item()
+        f.seek(offset)
+        return self._decode(f.read(length), source_id, flags)
+
+    def __getitem__(self, row: int) -> Dict:
+        return self._read(self._reader(), row)
+
+    def get(self, point_id: str) -> Optional[Dict]:
+        """The chunk with this point ID, or None"""
+        if self._rows is None:
+            self._rows = {p: i for i, p in enumerate(self._point_bytes())}
+        row = self._rows.get(uuid.UUID(point_id).bytes)
+        return None if row is None else self[row]
+
+    def get_many(self, rows: Sequence[int]) -> List[Dict]:
+        """Chunks for `rows`, in that order; records are read in file order"""
+        offsets = self._index["offset"]
+        out = [None] * len(rows)
+        with open(self.records_path, "rb") as f:
+            for i in sorted(range(len(rows)), key=lambda i: offsets[rows[i]]):
+                out[i] = self._read(f, rows[i])
+        return out
+
+    def by_source(self) -> "SourceChunks":
+        """Read-only {source: [chunks]} mapping that reads a source's records on access"""
+        return SourceChunks(self)
+
+    def __iter__(self) -> Iterator[Dict]:
+        """Stream every chunk in row order, one buffered pass over records.bin"""
+        if not len(self._index):
+            return
+        columns = [self._index[name].tolist() for name in ("offset", "length", "source", "flags")]
+        with open(self.records_path, "rb", buffering=1 << 20) as f:
+            position = 0
+            for offset, length, source_id, flags in zip(*columns):
+                if offset != position:
+                    f.seek(offset)
+                position = offset + length
+                yield self._decode(f.read(length), source_id, flags)
+
+    def extend(self, chunks: Iterable[Dict], flush_every: int = 1024) -> int:
+        """Append chunks; returns how many were written.
+
+        Records are written before the index entries that point at them, so
+        an interrupted run leaves at most some orphaned bytes, which the next
+        append truncates.
+        """
+        count = 0
+        batch = []
+        for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) >= flush_every:
+                count += self._append(batch)
+                batch = []
+        if batch:
+            count += self._append(batch)
+        return count
+
+    def append(self, chunk: Dict) -> int:
+        """Append one chunk; returns its row"""
+        self._append([chunk])
+        return len(self) - 1
+
+    def _append(self, chunks: List[Dict]) -> int:
+        backfill = self._meta is None
+        if backfill:
+            # Older store: fill in meta.bin for the rows already there
+            self._meta = np.frombuffer(
+                b"".join(bytes.fromhex(h) for h in self.metadata_hashes()), dtype=META_DTYPE
+            )
+        entries = np.zeros(len(chunks), dtype=INDEX_DTYPE)
+        meta = np.zeros(len(chunks), dtype=META_DTYPE)
+        records, new_sources = [], []
+        offset = self._end
+        for i, chunk in enumerate(chunks):
+            source = chunk.get("source", "")
+            source_id = self._source_ids.get(source)
+            if source_id is None:
+                source_id = self._source_ids[source] = len(self._sources)
+                self._sources.append(source)
+                new_sources.append(source)
+
+            raw = json.dumps(
+                {k: v for k, v in chunk.items() if k != "source"}, ensure_ascii=False, separators=(",", ":")
+            ).encode("utf-8")
+            flags = 0
+            if self.compress:
+                packed = zlib.compress(raw)
+                if len(packed) < len(raw):
+                    raw, flags = packed, FLAG_ZLIB
+            records.append(raw)
+            entries[i] = (offset, len(raw), source_id, flags, uuid.UUID(chunk_point_id(source, chunk["content"])).bytes)
+            meta[i] = np.void(bytes.fromhex(chunk_metadata_hash(chunk)))
+            offset += len(raw)
+
+        with open(self.records_path, "ab") as f:
+            f.truncate(self._end)
+            f.write(b"".join(records))
+        if new_sources:
+            lines = "".join(f"{s}\n" for s in new_sources).encode("utf-8")
+            with open(self.sources_path, "ab") as f:
+                f.truncate(self._sources_end)
+                f.write(lines)
+            self._sources_end += len(lines)
+        with open(self.meta_path, "ab") as f:
+            f.truncate(0 if backfill else len(self._index) * META_DTYPE.itemsize)
+            if backfill:
+                f.write(self._meta.tobytes())
+            f.write(meta.tobytes())
+        with open(self.index_path, "ab") as f:
+            f.truncate(len(self._index) * INDEX_DTYPE.itemsize)
+            f.write(entries.tobytes())
+
+        self._index = np.concatenate([self._index, entries])
+        self._meta = np.concatenate([self._meta, meta])
+        self._end = offset
+        self._rows = None
+        return len(chunks)
+
+    def close(self):
+        if self._records is not None:
+            self._records.close()
+            self._records = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SourceChunks(Mapping):
+    """Chunks grouped by source URL, read from the store one source at a time"""
+
+    def __init__(self, store: ChunkStore):
+        self.store = store
+        sources = store.sources()
+        rows = defaultdict(list)
+        for row, source_id in enumerate(store._index["source"].tolist()):
+            rows[sources[source_id]].append(row)
+        self._rows = dict(rows)
+
+    def __getitem__(self, source: str) -> List[Dict]:
+        return self.store.get_many(self._rows[source])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._rows)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, source) -> bool:
+        return source in self._rows
+
+
+def write_chunk_store(chunks: Iterable[Dict], path: str = DEFAULT_CHUNK_STORE, compress: bool = True) -> int:
+    """Stream chunks into a fresh store that replaces `path` once complete; returns the count.
+
+    `chunks` may be read from the store being replaced: it stays in place
+    until the new one is fully written.
+    """
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    with ChunkStore(tmp_path, compress=compress) as store:
+        count = store.extend(chunks)
+
+    old_path = f"{path}.old"
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(path):
+        os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    return count
+
+
+def open_chunks(path: str = DEFAULT_CHUNK_STORE, legacy_path: str = "chunks.json"):
+    """The chunk store at `path`, or the chunk list from `legacy_path` for
+    trees that predate the store; None if neither exists"""
+    if os.path.isdir(path) and os.path.exists(os.path.join(path, "index.bin")):
+        return ChunkStore(path)
+    if legacy_path and os.path.exists(legacy_path):
+        with open(legacy_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return None
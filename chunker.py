@@ -0,0 +1,117 @@
+# chunker.py
+
+import re
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+import tiktoken
+
+# Bump when chunk boundaries change so ingestion re-chunks every page
+CHUNKER_VERSION = 2
+# ~1000 characters of docs prose, the size the old character splitter used
+MAX_CHUNK_TOKENS = 256
+OVERLAP_TOKENS = 48
+HEADING_LEVELS = {"h1": 1, "h2": 2, "h3": 3}
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    global _encoding
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding("cl100k_base")
+    return len(_encoding.encode_ordinary(text))
+
+
+def iter_text_blocks(text: str) -> Iterator[Tuple[str, str]]:
+    """Blocks from extract_page_text output: "## " lines are headings"""
+    for line in text.split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("## "):
+            yield "h2", line[3:].strip()
+        else:
+            yield "p", line
+
+
+def _split_long(text: str, max_tokens: int) -> Iterator[Tuple[str, int]]:
+    """Yield (piece, tokens); a paragraph over budget is cut on sentence, then word, boundaries"""
+    n_tokens = count_tokens(text)
+    if n_tokens <= max_tokens:
+        yield text, n_tokens
+        return
+
+    piece, piece_tokens = [], 0
+    for sentence in re.split(r"(?<=[.!?])\s+", text):
+        sentence_tokens = count_tokens(sentence)
+        words = [(sentence, sentence_tokens)] if sentence_tokens <= max_tokens else [
+            (word, count_tokens(word)) for word in sentence.split(" ")
+        ]
+        for word, n in words:
+            if piece and piece_tokens + n + 1 > max_tokens:
+                yield " ".join(piece), piece_tokens
+                piece, piece_tokens = [], 0
+            piece.append(word)
+            piece_tokens += n + 1
+    if piece:
+        yield " ".join(piece), piece_tokens
+
+
+def chunk_blocks(
+    blocks: Iterable[Tuple[str, str]],
+    url: str,
+    max_tokens: int = MAX_CHUNK_TOKENS,
+    overlap_tokens: int = OVERLAP_TOKENS
+) -> Iterator[Dict]:
+    """Lazily turn a (tag, text) heading/paragraph stream into chunks.
+
+    A heading always starts a new chunk, so chunks never straddle sections;
+    each chunk repeats its section heading and carries the full heading path
+    as metadata. Long sections are split on paragraph boundaries by token
+    count, carrying up to `overlap_tokens` of trailing paragraphs forward.
+    """
+    path: List[Tuple[int, str]] = []
+    body: List[Tuple[str, int]] = []  # (paragraph, tokens) in the current chunk
+    body_tokens = 0
+    chunk_id = 0
+
+    def header() -> str:
+        return f"## {path[-1][1]}\n" if path else ""
+
+    def emit() -> Dict:
+        return {
+            "content": header() + "\n".join(p for p, _ in body),
+            "source": url,
+            "chunk_id": chunk_id,
+            "headings": [h for _, h in path]
+        }
+
+    for tag, text in blocks:
+        if tag in HEADING_LEVELS:
+            # Section boundary: close the current chunk first
+            if body:
+                yield emit()
+                chunk_id += 1
+                body, body_tokens = [], 0
+            level = HEADING_LEVELS[tag]
+            path = [(lvl, h) for lvl, h in path if lvl < level] + [(level, text)]
+            continue
+
+        budget = max_tokens - count_tokens(header())
+        for paragraph, n_tokens in _split_long(text, budget):
+            if body and body_tokens + n_tokens > budget:
+                yield emit()
+                chunk_id += 1
+                # Carry trailing paragraphs forward as overlap
+                carried, carried_tokens = [], 0
+                for prev, prev_tokens in reversed(body):
+                    if carried_tokens + prev_tokens > overlap_tokens or carried_tokens + prev_tokens + n_tokens > budget:
+                        break
+                    carried.insert(0, (prev, prev_tokens))
+                    carried_tokens += prev_tokens
+                body, body_tokens = carried, carried_tokens
+            body.append((paragraph, n_tokens))
+            body_tokens += n_tokens
+
+    if body:
+        yield emit()
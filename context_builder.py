@@ -0,0 +1,89 @@
+# context_builder.py
+
+import logging
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+CHAT_MODEL = "gpt-4o-mini"
+# About three average chunks (~175 tokens each). The old top-3 context was
+# uncapped and reached ~750 tokens with full-size chunks
+CONTEXT_TOKEN_BUDGET = 600
+# Candidates retrieved for packing; the budget decides how many are used
+CONTEXT_CANDIDATES = 6
+
+_encodings = {}
+
+
+def _encoding(model: str):
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except Exception as e:
+            # No network to fetch the model's encoding: cl100k is close enough for budgeting
+            logger.warning(f"Falling back to cl100k_base token counts for {model} ({type(e).__name__})")
+            _encodings[model] = tiktoken.get_encoding("cl100k_base")
+    return _encodings[model]
+
+
+@lru_cache(maxsize=16384)
+def count_tokens(text: str, model: str = CHAT_MODEL) -> int:
+    """Token count for `text`; memoized, since the same chunks come back again and again"""
+    return len(_encoding(model).encode_ordinary(text))
+
+
+def _new_lines(chunk: Dict, seen_lines: set, seen_headings: set) -> List[str]:
+    """Lines of a chunk not already in the context (chunker overlap, repeated headings)"""
+    source = chunk.get("metadata", {}).get("source")
+    lines = []
+    for line in chunk["content"].split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("## "):
+            if (source, line) in seen_headings:
+                continue
+        elif line in seen_lines:
+            continue
+        lines.append(line)
+    return lines
+
+
+def pack_context(
+    chunks: List[Dict],
+    budget: int = CONTEXT_TOKEN_BUDGET,
+    model: str = CHAT_MODEL
+) -> Tuple[str, List[Dict], int]:
+    """Pack ranked chunks into at most `budget` tokens of "Source N:" context.
+
+    Chunks are taken in rank order. Paragraphs already present (the overlap
+    the chunker carries between neighbours, or the same text retrieved
+    twice) are dropped, and a chunk with nothing new left is skipped. A
+    chunk that doesn't fit is skipped so a smaller one further down can
+    still be used. Returns (context, used chunks, context tokens).
+    """
+    seen_lines, seen_headings = set(), set()
+    parts, used = [], []
+    tokens = 0
+    for chunk in chunks:
+        lines = _new_lines(chunk, seen_lines, seen_headings)
+        if not any(not line.startswith("## ") for line in lines):
+            continue
+        block = f"Source {len(used) + 1}: " + "\n".join(lines) + "\n\n"
+        block_tokens = count_tokens(block, model)
+        if tokens + block_tokens > budget:
+            continue
+
+        source = chunk.get("metadata", {}).get("source")
+        for line in lines:
+            if line.startswith("## "):
+                seen_headings.add((source, line))
+            else:
+                seen_lines.add(line)
+        parts.append(block)
+        used.append(chunk)
+        tokens += block_tokens
+    return "".join(parts), used, tokens
@@ -0,0 +1,121 @@
+# credentials.py
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict
+
+from tracing import incr
+
+# How long a key check is trusted: valid keys for an hour, rejected ones
+# only briefly so a freshly created key isn't locked out
+VALID_KEY_TTL = 3600.0
+INVALID_KEY_TTL = 60.0
+MAX_CACHED_KEYS = 4096
+
+_http_client = None
+_http_lock = threading.Lock()
+
+
+def key_fingerprint(api_key: str) -> str:
+    """sha256 of the key: what caches and per-key state are keyed by, never the key itself"""
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()
+
+
+def shared_http_client():
+    """One pooled HTTP client for every per-key OpenAI client in the process.
+
+    An OpenAI client is just a key plus this pool, so scoping clients per
+    key costs a few objects instead of a connection pool each.
+    """
+    global _http_client
+    with _http_lock:
+        if _http_client is None:
+            # openai takes ~0.5s to import; the key screen doesn't need it
+            from openai import DefaultHttpxClient
+
+            _http_client = DefaultHttpxClient()
+        return _http_client
+
+
+def openai_client(api_key: str):
+    """Synchronous OpenAI client for `api_key` on the shared pool"""
+    from openai import OpenAI
+
+    return OpenAI(api_key=api_key, http_client=shared_http_client())
+
+
+class KeyValidator:
+    """Checks OpenAI keys with a zero-token call and remembers the verdict.
+
+    `GET /models` is authenticated but free, so it tells a good key from a
+    bad one without a completion. Verdicts are cached by key fingerprint for
+    `ttl` (valid) or `invalid_ttl` (rejected) seconds. Only an authentication
+    failure counts as invalid: a timeout or an OpenAI outage is raised to the
+    caller and nothing is cached.
+    """
+
+    def __init__(
+        self,
+        ttl: float = VALID_KEY_TTL,
+        invalid_ttl: float = INVALID_KEY_TTL,
+        max_entries: int = MAX_CACHED_KEYS,
+        timeout: float = 10.0
+    ):
+        self.ttl = ttl
+        self.invalid_ttl = invalid_ttl
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._verdicts = OrderedDict()  # fingerprint -> (valid, expires_at)
+        self.hits = 0
+        self.checks = 0
+
+    def validate(self, api_key: str) -> bool:
+        if not api_key:
+            return False
+        fingerprint = key_fingerprint(api_key)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._verdicts.get(fingerprint)
+            if cached is not None and cached[1] > now:
+                self._verdicts.move_to_end(fingerprint)
+                self.hits += 1
+                incr("key_checks", result="cached")
+                return cached[0]
+
+        valid = self._check(api_key)
+        with self._lock:
+            self.checks += 1
+            self._verdicts[fingerprint] = (valid, now + (self.ttl if valid else self.invalid_ttl))
+            self._verdicts.move_to_end(fingerprint)
+            while len(self._verdicts) > self.max_entries:
+                self._verdicts.popitem(last=False)
+        incr("key_checks", result="valid" if valid else "invalid")
+        return valid
+
+    def _check(self, api_key: str) -> bool:
+        from openai import AuthenticationError, PermissionDeniedError
+
+        client = openai_client(api_key).with_options(timeout=self.timeout, max_retries=0)
+        try:
+            client.models.list()
+            return True
+        except (AuthenticationError, PermissionDeniedError):
+            return False
+
+    def forget(self, api_key: str):
+        """Drop a cached verdict, e.g. when the key starts failing mid-session"""
+        with self._lock:
+            self._verdicts.pop(key_fingerprint(api_key), None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.checks
+            return {
+                "keys": len(self._verdicts),
+                "hits": self.hits,
+                "checks": self.checks,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,119 @@
+# embedding_cache.py
+
+import hashlib
+import os
+import re
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """Persistent on-disk embedding cache keyed by (model, sha256 of content).
+
+    Vectors live in a flat float32 file that is memory-mapped for reads, and
+    the row order is recorded in a sidecar index file holding one hex digest
+    per line. Both files are append-only, so a crashed run loses at most the
+    rows it was writing.
+    """
+
+    def __init__(self, model: str, dim: int, cache_dir: str = ".embedding_cache"):
+        self.model = model
+        self.dim = dim
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # One file pair per (model, dim) so different models never mix
+        stem = re.sub(r"[^A-Za-z0-9_.-]", "_", f"{model}-{dim}")
+        self.vectors_path = os.path.join(cache_dir, f"{stem}.f32")
+        self.index_path = os.path.join(cache_dir, f"{stem}.idx")
+
+        self._rows = {}
+        self._matrix = None
+        self._load_index()
+
+    @staticmethod
+    def key(text: str) -> str:
+        """Content hash used as the cache key"""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _load_index(self):
+        keys = []
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                keys = [line.strip() for line in f if line.strip()]
+
+        # Only trust rows that were fully written to the vectors file
+        row_bytes = self.dim * 4
+        n_vectors = 0
+        if os.path.exists(self.vectors_path):
+            n_vectors = os.path.getsize(self.vectors_path) // row_bytes
+        n_rows = min(len(keys), n_vectors)
+        if len(keys) > n_rows:
+            with open(self.index_path, "w", encoding="utf-8") as f:
+                f.write("".join(f"{k}\n" for k in keys[:n_rows]))
+
+        self._rows = {k: i for i, k in enumerate(keys[:n_rows])}
+        self._n_rows = n_rows
+        self._matrix = None
+
+    def _mapped(self) -> np.ndarray:
+        if self._matrix is None and self._n_rows:
+            self._matrix = np.memmap(
+                self.vectors_path, dtype=np.float32, mode="r",
+                shape=(self._n_rows, self.dim)
+            )
+        return self._matrix
+
+    def __len__(self) -> int:
+        return self._n_rows
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._rows
+
+    def get_many(self, keys: Sequence[str]) -> Tuple[np.ndarray, List[int]]:
+        """Return an (n, dim) matrix for keys plus the positions that missed.
+
+        Rows for missing keys are left as zeros for the caller to fill in.
+        """
+        out = np.zeros((len(keys), self.dim), dtype=np.float32)
+        hit_positions, hit_rows, missing = [], [], []
+        for i, k in enumerate(keys):
+            row = self._rows.get(k)
+            if row is None:
+                missing.append(i)
+            else:
+                hit_positions.append(i)
+                hit_rows.append(row)
+
+        if hit_rows:
+            out[hit_positions] = self._mapped()[hit_rows]
+        return out, missing
+
+    def put_many(self, keys: Sequence[str], vectors) -> None:
+        """Append new (key, vector) pairs, skipping keys already stored"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        new_keys, new_rows, seen = [], [], set()
+        for k, vec in zip(keys, vectors):
+            if k in self._rows or k in seen:
+                continue
+            seen.add(k)
+            new_keys.append(k)
+            new_rows.append(vec)
+        if not new_keys:
+            return
+
+        # Vectors first, then the index, so the index never points past the data.
+        # Truncating drops any orphan rows left behind by an interrupted run.
+        with open(self.vectors_path, "ab") as f:
+            f.truncate(self._n_rows * self.dim * 4)
+            f.write(np.ascontiguousarray(new_rows, dtype=np.float32).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            f.write("".join(f"{k}\n" for k in new_keys))
+
+        for k in new_keys:
+            self._rows[k] = self._n_rows
+            self._n_rows += 1
+        self._matrix = None  # remap lazily to pick up the new rows
@@ -1,26 +1,54 @@
 # embeddings.py
 
 import os
-import json
 from dotenv import load_dotenv
 
+from chunk_store import DEFAULT_CHUNK_STORE, open_chunks
+from tracing import span, tracer
 from vector_store import VectorStore
 
 load_dotenv()  # so OPENAI_API_KEY & QDRANT_URL are in os.environ
 
 def main():
-    # 1. Read in all your chunks
-    with open("chunks.json", "r", encoding="utf-8") as f:
-        chunks = json.load(f)
+    # 1. Open the chunk store written by ingestion.py: only its index is read
+    #    here, records are read for the chunks that need embedding
+    #    (falls back to a legacy chunks.json)
+    chunks = open_chunks(DEFAULT_CHUNK_STORE)
+    if chunks is None:
+        print(f"No {DEFAULT_CHUNK_STORE} or chunks.json found; run ingestion.py first.")
+        return
 
     print(f"Loaded {len(chunks)} chunks from disk.")
 
     # 2. Initialize your VectorStore (Qdrant + OpenAIEmbeddings)
+    #    In-memory Qdrant starts from the last snapshot, so both paths diff
+    #    against what's already indexed
     vs = VectorStore(api_key=os.getenv("OPENAI_API_KEY"))
 
-    # 3. Add all chunks to Qdrant
-    vs.add_chunks(chunks)
-    print("✅ All chunks have been embedded and upserted into Qdrant.")
+    # 3. Sync Qdrant with the chunk set: only new/changed chunks are embedded
+    #    (and only cache misses hit the OpenAI API), stale ones are deleted
+    def progress(done: int, total: int):
+        print(f"  embedded {done}/{total} new chunks", end="\r" if done < total else "\n")
+
+    with span("index.sync"):
+        stats = vs.sync_chunks(chunks, progress=progress)
+    print(
+        f"Synced {stats['total']} chunks: {stats['upserted']} upserted, "
+        f"{stats['deleted']} deleted, {stats['unchanged']} unchanged."
+    )
+    print(f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses.")
+    if stats["misses"]:
+        print(f"Embedded at {stats['chunks_per_sec']:.1f} chunks/sec ({stats['retries']} rate-limit retries).")
+    print("✅ Qdrant is up to date.")
+
+    # 4. Write the warm-start snapshot the Streamlit app loads at boot
+    with span("index.snapshot"):
+        count = vs.save_snapshot()
+    print(f"✅ Wrote {count} vectors to {vs.snapshot_path}.")
+
+    # 5. Where the time went
+    if tracer.enabled:
+        print(tracer.format_summary())
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,141 @@
+# extractor.py
+
+import importlib.util
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+
+# Page content lives in the first <article>, else the first <main>
+CONTAINER_TAGS = ("article", "main")
+# Headings and paragraphs are all that chunking uses
+BLOCK_TAGS = ("h1", "h2", "h3", "p")
+# Pages per task sent to a worker process, so pickling and IPC are paid per
+# batch rather than per (sub-millisecond) page
+EXTRACT_BATCH = 8
+
+# Workers start from a clean server process rather than a fork of the caller,
+# which may already be running threads (ingestion's fetcher loop); forking
+# those can copy a held lock into the child
+START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+# lxml builds the tree in C and is ~10x faster than BeautifulSoup; it's
+# optional, and html.parser with a SoupStrainer is the fallback
+DEFAULT_PARSER = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+
+Block = Tuple[str, str]
+
+
+def _lxml_blocks(html: str) -> Optional[List[Block]]:
+    import lxml.html
+    from lxml import etree
+
+    tree = lxml.html.fromstring(html)
+    for tag in CONTAINER_TAGS:
+        container = next(tree.iter(tag), None)
+        if container is not None:
+            break
+    else:
+        return None
+    # BeautifulSoup's get_text skips script/style contents; match it
+    etree.strip_elements(container, "script", "style", with_tail=False)
+    blocks = []
+    for elem in container.iter(*BLOCK_TAGS):
+        text = "".join(s.strip() for s in elem.itertext())
+        if text:
+            blocks.append((elem.tag, text))
+    return blocks
+
+
+def _soup_blocks(html: str, parser: str) -> Optional[List[Block]]:
+    from bs4 import BeautifulSoup, SoupStrainer
+
+    # Build only the container subtrees; nav, sidebars and scripts are skipped
+    soup = BeautifulSoup(html, parser, parse_only=SoupStrainer(CONTAINER_TAGS))
+    container = soup.find("article") or soup.find("main")
+    if container is None:
+        return None
+    blocks = []
+    for elem in container.find_all(BLOCK_TAGS):
+        text = elem.get_text(strip=True)
+        if text:
+            blocks.append((elem.name, text))
+    return blocks
+
+
+def parse_blocks(html: str, url: str = "", parser: str = None) -> List[Block]:
+    """(tag, text) for headings and paragraphs of the page content, in reading order"""
+    parser = parser or DEFAULT_PARSER
+    blocks = _lxml_blocks(html) if parser == "lxml" else _soup_blocks(html, parser)
+    if blocks is None:
+        raise ValueError(f"Could not find content container on {url}" if url else "Could not find content container")
+    return blocks
+
+
+def _extract_batch(htmls: List[str], parser: str) -> List[Tuple[Optional[List[Block]], Optional[str], float]]:
+    # Runs in a worker: errors come back as strings so one bad page doesn't fail the batch
+    results = []
+    for html in htmls:
+        start = time.perf_counter()
+        try:
+            results.append((parse_blocks(html, parser=parser), None, time.perf_counter() - start))
+        except Exception as e:
+            results.append((None, str(e), time.perf_counter() - start))
+    return results
+
+
+def extract_pages(
+    pages: Iterable[Tuple[Any, Optional[str]]],
+    workers: int = None,
+    parser: str = None
+) -> Iterator[Tuple[Any, Optional[List[Block]], Optional[str], float]]:
+    """Parse pages on a process pool, yielding results in input order as they finish.
+
+    `pages` yields (item, html) pairs; `item` is handed back untouched next
+    to (blocks, error, parse seconds), and html=None passes an item through
+    unparsed. At most a few batches per worker are in flight, so pages
+    stream from fetching to chunking without all being parsed up front.
+    """
+    parser = parser or DEFAULT_PARSER
+    workers = workers or int(os.getenv("EXTRACT_WORKERS", "0")) or os.cpu_count() or 1
+    if workers <= 1:
+        for item, html in pages:
+            if html is None:
+                yield item, None, None, 0.0
+            else:
+                yield (item,) + _extract_batch([html], parser)[0]
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(START_METHOD)) as pool:
+        window = deque()  # (items, future or None for pass-through) in input order
+        batch_items, batch_htmls = [], []
+
+        def flush():
+            if batch_items:
+                window.append((list(batch_items), pool.submit(_extract_batch, list(batch_htmls), parser)))
+                batch_items.clear()
+                batch_htmls.clear()
+
+        def drain(keep: int) -> Iterator:
+            while len(window) > keep:
+                items, future = window.popleft()
+                if future is None:
+                    yield items[0], None, None, 0.0
+                else:
+                    for item, result in zip(items, future.result()):
+                        yield (item,) + result
+
+        for item, html in pages:
+            if html is None:
+                flush()
+                window.append(([item], None))
+            else:
+                batch_items.append(item)
+                batch_htmls.append(html)
+                if len(batch_items) >= EXTRACT_BATCH:
+                    flush()
+            yield from drain(keep=workers * 2)
+        flush()
+        yield from drain(keep=0)
@@ -0,0 +1,213 @@
+# fetcher.py
+
+import asyncio
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from tracing import span
+
+
+class HttpCache:
+    """On-disk store of response bodies plus their ETag/Last-Modified validators"""
+
+    def __init__(self, cache_dir: str = ".http_cache"):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.entries = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def _body_path(self, url: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode("utf-8")).hexdigest() + ".html")
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        entry = self.entries.get(url)
+        if not entry or not os.path.exists(self._body_path(url)):
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def body(self, url: str) -> str:
+        with open(self._body_path(url), "r", encoding="utf-8") as f:
+            return f.read()
+
+    def put(self, url: str, headers, text: str):
+        etag = headers.get("etag")
+        last_modified = headers.get("last-modified")
+        if not etag and not last_modified:
+            return  # nothing to revalidate against next time
+        with open(self._body_path(url), "w", encoding="utf-8") as f:
+            f.write(text)
+        self.entries[url] = {"etag": etag, "last_modified": last_modified}
+
+    def save(self):
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+
+class AsyncFetcher:
+    """Concurrent page fetcher with connection reuse and per-host politeness.
+
+    At most `concurrency` requests are in flight overall and `per_host` per
+    host, with request starts to the same host spaced `host_delay` seconds
+    apart. With an HttpCache, requests are conditional and a 304 returns the
+    cached body flagged as `not_modified`.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 16,
+        per_host: int = 8,
+        host_delay: float = 0.0,
+        timeout: float = 10.0,
+        cache: Optional[HttpCache] = None
+    ):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.host_delay = host_delay
+        self.timeout = timeout
+        self.cache = cache
+
+    async def _fetch(self, client: httpx.AsyncClient, url: str, host_slots: Dict) -> Dict:
+        result = {"url": url, "status": None, "text": None, "not_modified": False, "error": None}
+        host = urlsplit(url).netloc
+        if host not in host_slots:
+            host_slots[host] = {"sem": asyncio.Semaphore(self.per_host), "lock": asyncio.Lock(), "last": 0.0}
+        slot = host_slots[host]
+
+        async with self._global, slot["sem"]:
+            # Space out request starts to the same host
+            if self.host_delay:
+                async with slot["lock"]:
+                    wait = slot["last"] + self.host_delay - time.monotonic()
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                    slot["last"] = time.monotonic()
+
+            headers = self.cache.conditional_headers(url) if self.cache else {}
+            try:
+                with span("ingest.fetch"):
+                    resp = await client.get(url, headers=headers)
+            except httpx.HTTPError as e:
+                result["error"] = f"{type(e).__name__}: {e}"
+                return result
+
+        result["status"] = resp.status_code
+        if resp.status_code == 304 and self.cache:
+            result["not_modified"] = True
+            result["text"] = self.cache.body(url)
+        elif resp.is_success:
+            result["text"] = resp.text
+            if self.cache:
+                self.cache.put(url, resp.headers, resp.text)
+        else:
+            result["error"] = f"HTTP {resp.status_code}"
+        return result
+
+    async def fetch_all(self, urls: List[str]) -> List[Dict]:
+        """Fetch every URL concurrently; results come back in input order"""
+        self._global = asyncio.Semaphore(self.concurrency)
+        limits = httpx.Limits(
+            max_connections=self.concurrency,
+            max_keepalive_connections=self.concurrency
+        )
+        host_slots = {}
+        async with httpx.AsyncClient(timeout=self.timeout, limits=limits, follow_redirects=True) as client:
+            results = await asyncio.gather(*(self._fetch(client, url, host_slots) for url in urls))
+        if self.cache:
+            self.cache.save()
+        return list(results)
+
+    def iter_fetch(self, urls: List[str], window: int = None) -> Iterator[Dict]:
+        """Fetch every URL concurrently, yielding results in input order as they arrive.
+
+        The fetches run on an event loop in a background thread. A URL is only
+        started once it's within `window` (default 2 x concurrency) of the
+        next result to be yielded, so at most that many pages' HTML is held
+        at once however long the list is.
+        """
+        window = window or 2 * self.concurrency
+        arrived = queue.Queue()
+        started = threading.Event()
+        state = {}
+
+        async def run():
+            # 1. Each started fetch holds a slot until the caller takes its result
+            state["loop"] = asyncio.get_running_loop()
+            state["slots"] = slots = asyncio.Semaphore(window)
+            started.set()
+            self._global = asyncio.Semaphore(self.concurrency)
+            limits = httpx.Limits(
+                max_connections=self.concurrency,
+                max_keepalive_connections=self.concurrency
+            )
+            host_slots = {}
+
+            async def fetch(i: int, url: str):
+                try:
+                    arrived.put((i, await self._fetch(client, url, host_slots), None))
+                except Exception as e:
+                    arrived.put((i, None, e))
+
+            async with httpx.AsyncClient(timeout=self.timeout, limits=limits, follow_redirects=True) as client:
+                tasks = []
+                for i, url in enumerate(urls):
+                    await slots.acquire()
+                    tasks.append(asyncio.create_task(fetch(i, url)))
+                await asyncio.gather(*tasks)
+            if self.cache:
+                self.cache.save()
+
+        def target():
+            try:
+                asyncio.run(run())
+            except Exception as e:
+                arrived.put((None, None, e))
+            finally:
+                started.set()
+
+        thread = threading.Thread(target=target, name="fetcher", daemon=True)
+        thread.start()
+        started.wait()
+
+        # 2. Results can finish out of order; hold early ones until their turn
+        early = {}
+        for i in range(len(urls)):
+            while i not in early:
+                position, result, error = arrived.get()
+                if error is not None:
+                    raise error
+                early[position] = result
+            result = early.pop(i)
+            try:
+                state["loop"].call_soon_threadsafe(state["slots"].release)
+            except RuntimeError:
+                pass  # every fetch has started and the loop is closed
+            yield result
+        thread.join()
+
+
+def fetch_all(urls: List[str], **kwargs) -> List[Dict]:
+    """Blocking wrapper around AsyncFetcher.fetch_all for scripts"""
+    return asyncio.run(AsyncFetcher(**kwargs).fetch_all(urls))
+
+
+def iter_fetch(urls: List[str], window: int = None, **kwargs) -> Iterator[Dict]:
+    """AsyncFetcher.iter_fetch for scripts: pages stream in, input order, bounded memory"""
+    return AsyncFetcher(**kwargs).iter_fetch(urls, window=window)
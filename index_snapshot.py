@@ -0,0 +1,81 @@
+# index_snapshot.py
+
+import json
+import mmap
+import os
+import struct
+from typing import Dict, List
+
+import numpy as np
+
+# Layout: fixed header | float32 vectors (count x dim) | JSON payload array
+MAGIC = b"CHAISNAP"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQQ")  # magic, version, dim, count, payload bytes
+
+
+class Snapshot:
+    """A loaded index snapshot; `vectors` is a read-only view over the mmap"""
+
+    def __init__(self, vectors: np.ndarray, payloads: List[Dict], mapped: mmap.mmap = None):
+        self.vectors = vectors
+        self.payloads = payloads
+        self._mapped = mapped  # keep the mapping alive as long as the view
+
+    def __len__(self) -> int:
+        return len(self.payloads)
+
+    @property
+    def dim(self) -> int:
+        return self.vectors.shape[1]
+
+    def close(self):
+        self.vectors = None
+        if self._mapped is not None:
+            try:
+                self._mapped.close()
+            except BufferError:
+                pass  # a caller still holds a view; the OS unmaps it later
+            self._mapped = None
+
+
+def write_snapshot(path: str, vectors, payloads: List[Dict]) -> int:
+    """Write vectors + payloads to one binary file atomically; returns its size.
+
+    Vectors are stored L2-normalized so readers can use them for cosine
+    search straight off the mmap.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim != 2 or len(vectors) != len(payloads):
+        raise ValueError("vectors must be a (count, dim) matrix matching payloads")
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = np.ascontiguousarray(vectors / np.maximum(norms, 1e-12), dtype=np.float32)
+
+    payload_bytes = json.dumps(payloads, ensure_ascii=False).encode("utf-8")
+    header = HEADER.pack(MAGIC, VERSION, vectors.shape[1], len(vectors), len(payload_bytes))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(vectors.tobytes())
+        f.write(payload_bytes)
+    os.replace(tmp_path, path)
+    return HEADER.size + vectors.nbytes + len(payload_bytes)
+
+
+def load_snapshot(path: str) -> Snapshot:
+    """Memory-map a snapshot; vectors are paged in lazily by the OS"""
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, dim, count, payload_len = HEADER.unpack_from(mapped, 0)
+    if magic != MAGIC or version != VERSION:
+        mapped.close()
+        raise ValueError(f"{path} is not a v{VERSION} index snapshot")
+
+    vectors = np.frombuffer(mapped, dtype=np.float32, count=count * dim, offset=HEADER.size)
+    vectors = vectors.reshape(count, dim)
+
+    payload_start = HEADER.size + vectors.nbytes
+    payloads = json.loads(mapped[payload_start:payload_start + payload_len].decode("utf-8"))
+    return Snapshot(vectors, payloads, mapped)
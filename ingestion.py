@@ -1,9 +1,20 @@
 # ingestion.py
 
+import hashlib
 import json
+import os
+from collections import defaultdict
+from collections.abc import Mapping
 import requests
-from bs4 import BeautifulSoup
-from langchain.text_splitter import CharacterTextSplitter
+from typing import Iterable, Iterator, Tuple
+
+from chunk_store import DEFAULT_CHUNK_STORE, ChunkStore, open_chunks, write_chunk_store
+from chunker import CHUNKER_VERSION, chunk_blocks, iter_text_blocks
+from extractor import extract_pages, parse_blocks
+from fetcher import HttpCache, iter_fetch
+from tracing import incr, observe, span, tracer
+
+FINGERPRINTS_PATH = "page_fingerprints.json"
 
 # 1. List of all docs pages (manually maintained)
 DOC_URLS = [
@@ -57,67 +68,176 @@ DOC_URLS = [
 def fetch_page_text(url: str) -> str:
     resp = requests.get(url, timeout=10)
     resp.raise_for_status()  # fail early if bad response
+    return extract_page_text(resp.text, url)
+
+
+def iter_page_blocks(html: str, url: str) -> Iterator[Tuple[str, str]]:
+    """Yield (tag, text) for headings and paragraphs in reading order"""
+    # extractor.CONTAINER_TAGS picks the docs' main content (article, else main)
+    yield from parse_blocks(html, url)
 
-    soup = BeautifulSoup(resp.text, "html.parser")
-    # adjust the selector to match your docs’ main content
-    container = soup.select_one("article") or soup.select_one("main")
-    if not container:
-        raise ValueError(f"Could not find content container on {url}")
 
+def extract_page_text(html: str, url: str) -> str:
     # Gather headings and paragraphs in reading order
     parts = []
-    for elem in container.find_all(["h1", "h2", "h3", "p"]):
-        text = elem.get_text(strip=True)
-        if text:
-            # prefix headings so reader sees structure
-            if elem.name.startswith("h"):
-                parts.append(f"\n\n## {text}\n\n")
-            else:
-                parts.append(text)
+    for tag, text in iter_page_blocks(html, url):
+        # prefix headings so reader sees structure
+        if tag.startswith("h"):
+            parts.append(f"\n\n## {text}\n\n")
+        else:
+            parts.append(text)
     return "\n".join(parts)
 
 
 # 3. Chunk long text into smaller pieces
-def chunk_text(text: str, url: str) -> list[dict]:
-    splitter = CharacterTextSplitter(
-        separator="\n",
-        chunk_size=1000,
-        chunk_overlap=200,
-        length_function=len
-    )
-    raw_chunks = splitter.split_text(text)
-
-    # Build metadata for each chunk
-    chunks = []
-    for i, chunk in enumerate(raw_chunks):
-        chunks.append({
-            "content": chunk,
-            "source": url,
-            "chunk_id": i
-        })
-    return chunks
+def chunk_text(text: str, url: str) -> Iterator[dict]:
+    # Section-aware, token-sized chunks with the heading path as metadata
+    return chunk_blocks(iter_text_blocks(text), url)
 
 
-def main():
-    all_chunks = []
-    for url in DOC_URLS:
+def write_chunks(chunks: Iterable[dict], path: str = "chunks.json") -> int:
+    """Stream chunks to a JSON array without holding them all in memory (export
+    format; ingestion itself writes a chunk store)"""
+    count = 0
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for chunk in chunks:
+            record = json.dumps(chunk, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+            f.write(("," if count else "") + "\n  " + record)
+            count += 1
+        f.write("\n]" if count else "]")
+    os.replace(tmp_path, path)
+    return count
+
+
+def load_previous_chunks(path: str = DEFAULT_CHUNK_STORE, legacy_path: str = "chunks.json") -> Mapping:
+    """Chunks from the last run, grouped by source URL.
+
+    From a chunk store, a page's chunks are only read when it is reused.
+    """
+    chunks = open_chunks(path, legacy_path)
+    if isinstance(chunks, ChunkStore):
+        return chunks.by_source()
+    by_source = defaultdict(list)
+    for chunk in chunks or []:
+        by_source[chunk["source"]].append(chunk)
+    return by_source
+
+
+def load_fingerprints(path: str = FINGERPRINTS_PATH) -> dict:
+    """Per-page content fingerprints from the last run (empty if the chunker changed since)"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        saved = json.load(f)
+    if saved.get("chunker_version") != CHUNKER_VERSION:
+        return {}
+    return saved.get("pages", {})
+
+
+def page_fingerprint(blocks: list) -> str:
+    digest = hashlib.sha256(f"chunker-v{CHUNKER_VERSION}\n".encode("utf-8"))
+    for tag, text in blocks:
+        digest.update(f"{tag}\t{text}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def iter_site_chunks(
+    results: Iterable[dict],
+    previous: dict,
+    fingerprints: dict,
+    new_fingerprints: dict,
+    workers: int = None
+) -> Iterator[dict]:
+    """Yield chunks page by page, in `results` order.
+
+    HTML is parsed on `workers` processes (EXTRACT_WORKERS, default: all
+    cores) a few pages ahead of chunking, so only those pages' text is in
+    memory at a time.
+    """
+
+    def reusable(result: dict) -> bool:
+        # 304 for a page we have chunks for: nothing to parse
+        url = result["url"]
+        return result["not_modified"] and url in fingerprints and url in previous
+
+    def to_parse(result: dict):
+        # Hand the HTML over rather than keep it on the result while the page is chunked
+        html = result.pop("text")
+        return None if result["error"] or reusable(result) else html
+
+    pages = ((result, to_parse(result)) for result in results)
+    for result, blocks, parse_error, parse_seconds in extract_pages(pages, workers=workers):
+        url = result["url"]
         try:
-            print(f"Fetching {url}")
-            text = fetch_page_text(url)
-            print(f" → Extracted {len(text)} characters")
-            
-            chunks = chunk_text(text, url)
-            print(f" → Split into {len(chunks)} chunks")
-            
-            all_chunks.extend(chunks)
+            if result["error"]:
+                raise RuntimeError(result["error"])
+
+            if reusable(result):
+                reused = previous[url]
+                new_fingerprints[url] = fingerprints[url]
+                incr("ingested_pages", status="not_modified")
+                print(f"{url} → unchanged, reused {len(reused)} chunks")
+                yield from reused
+                continue
+
+            # Parsing happened in a worker; its time still feeds the stage histogram
+            observe("ingest.parse", parse_seconds)
+            if parse_error:
+                raise ValueError(f"{parse_error} on {url}")
+            fingerprint = page_fingerprint(blocks)
+            if fingerprints.get(url) == fingerprint and url in previous:
+                # Page bytes changed (e.g. build hash) but the content didn't
+                reused = previous[url]
+                new_fingerprints[url] = fingerprint
+                incr("ingested_pages", status="content_unchanged")
+                print(f"{url} → content unchanged, reused {len(reused)} chunks")
+                yield from reused
+                continue
+
+            print(f"{url} → Extracted {len(blocks)} blocks")
+
+            with span("ingest.chunk"):
+                page_chunks = list(chunk_blocks(blocks, url))
+            incr("ingested_pages", status="changed")
+            yield from page_chunks
+            new_fingerprints[url] = fingerprint
+            print(f" → Split into {len(page_chunks)} chunks")
         except Exception as e:
+            incr("ingested_pages", status="error")
             print(f"Error with {url}: {e}")
+            # Keep the last good version rather than deleting the page downstream
+            if url in previous:
+                if url in fingerprints:
+                    new_fingerprints[url] = fingerprints[url]
+                yield from previous[url]
+
+
+def main():
+    # Fetch pages concurrently, a window ahead of chunking (unchanged pages
+    # come back as 304s); results stream straight into chunking
+    print(f"Fetching {len(DOC_URLS)} pages...")
+    results = iter_fetch(DOC_URLS, cache=HttpCache())
+    previous = load_previous_chunks()
+    fingerprints = load_fingerprints()
+
+    # Only pages still in DOC_URLS are carried forward, so removed pages
+    # drop out of the chunk store (and out of Qdrant on the next embeddings run).
+    # 4. Chunks are appended to a new store as they are produced; it replaces
+    #    the old one, which reused pages are read from, once complete
+    new_fingerprints = {}
+    with span("ingest.write"):
+        total = write_chunk_store(iter_site_chunks(results, previous, fingerprints, new_fingerprints))
 
-    # 4. Serialize to disk for downstream embedding
-    with open("chunks.json", "w", encoding="utf-8") as f:
-        json.dump(all_chunks, f, ensure_ascii=False, indent=2)
+    with open(FINGERPRINTS_PATH, "w", encoding="utf-8") as f:
+        json.dump({"chunker_version": CHUNKER_VERSION, "pages": new_fingerprints}, f, indent=2)
+    changed = sum(1 for url, fp in new_fingerprints.items() if fingerprints.get(url) != fp)
+    print(f"{changed} of {len(DOC_URLS)} pages changed")
 
-    print(f"✅ Completed ingestion: {len(all_chunks)} total chunks")
+    print(f"✅ Completed ingestion: {total} total chunks")
+    if tracer.enabled:
+        print(tracer.format_summary())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,141 @@
+# lexical_index.py
+
+import re
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Keeps identifiers whole: `--staged`, `limit_req`, `git-diff`, `v1.2`
+TOKEN_RE = re.compile(r"-{0,2}[a-z0-9]+(?:[_.\-][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased tokens; compound identifiers also index their parts"""
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower()):
+        tokens.append(token)
+        bare = token.lstrip("-")
+        if bare != token:
+            tokens.append(bare)
+        if any(sep in bare for sep in "_.-"):
+            tokens.extend(p for p in re.split(r"[_.\-]", bare) if p)
+    return tokens
+
+
+class BM25Index:
+    """In-process BM25 over chunk payloads with CSR-style postings.
+
+    All postings share two flat arrays (uint32 doc ids, uint16 term
+    frequencies) sliced per term through an offsets array, so the index
+    costs a few bytes per posting instead of a Python object each.
+    """
+
+    def __init__(self, payloads: List[Dict], k1: float = 1.2, b: float = 0.75):
+        self.payloads = payloads
+        self.k1 = k1
+        self.b = b
+
+        # 1. Term frequencies per document
+        postings = defaultdict(list)
+        doc_lens = np.zeros(len(payloads), dtype=np.float32)
+        for doc_id, payload in enumerate(payloads):
+            counts = defaultdict(int)
+            for token in tokenize(payload.get("page_content", "")):
+                counts[token] += 1
+            doc_lens[doc_id] = sum(counts.values())
+            for token, tf in counts.items():
+                postings[token].append((doc_id, min(tf, 65535)))
+
+        # 2. Flatten into CSR arrays
+        self.vocab = {}
+        offsets = [0]
+        doc_ids, tfs = [], []
+        for term_id, (token, plist) in enumerate(postings.items()):
+            self.vocab[token] = term_id
+            doc_ids.extend(d for d, _ in plist)
+            tfs.extend(t for _, t in plist)
+            offsets.append(len(doc_ids))
+        self._doc_ids = np.asarray(doc_ids, dtype=np.uint32)
+        self._tfs = np.asarray(tfs, dtype=np.uint16)
+        self._offsets = np.asarray(offsets, dtype=np.int64)
+
+        # 3. Precompute the length normalization and idf per term
+        n_docs = max(len(payloads), 1)
+        avg_len = float(doc_lens.mean()) if len(payloads) else 1.0
+        self._norm = k1 * (1 - b + b * doc_lens / max(avg_len, 1e-9))
+        df = np.diff(self._offsets).astype(np.float32)
+        self._idf = np.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+
+    def __len__(self) -> int:
+        return len(self.payloads)
+
+    def search_ids(self, query: str, k: int = 3, ranges: List[Tuple[int, int]] = None) -> List[Tuple[int, float]]:
+        """Return [(payload position, BM25 score)] for the top-k documents.
+
+        `ranges` limits scoring to documents in those [start, end) position
+        ranges; postings are sorted by document, so only the postings inside
+        a range are touched. Scores don't change (idf stays corpus-wide).
+        """
+        if k <= 0:
+            return []
+        terms = [self.vocab[token] for token in set(tokenize(query)) if token in self.vocab]
+        if not terms:
+            return []
+
+        ranked = []
+        for start, end in ranges if ranges is not None else [(0, len(self.payloads))]:
+            scores = np.zeros(end - start, dtype=np.float32)
+            for term_id in terms:
+                lo, hi = self._offsets[term_id], self._offsets[term_id + 1]
+                if ranges is not None:
+                    lo, hi = lo + np.searchsorted(self._doc_ids[lo:hi], [start, end])
+                docs = self._doc_ids[lo:hi]
+                tf = self._tfs[lo:hi].astype(np.float32)
+                scores[docs - start] += self._idf[term_id] * tf * (self.k1 + 1) / (tf + self._norm[docs])
+
+            candidates = np.flatnonzero(scores)
+            if len(candidates) > k:
+                candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+            ranked.extend((int(i) + start, float(scores[i])) for i in candidates)
+        ranked.sort(key=lambda hit: hit[1], reverse=True)
+        return ranked[:k]
+
+    def search(self, query: str, k: int = 3, ranges: List[Tuple[int, int]] = None) -> List[Dict]:
+        """Top-k hits in the same shape as VectorStore.search, with the payload position as `id`"""
+        hits = []
+        for i, score in self.search_ids(query, k, ranges):
+            payload = self.payloads[i]
+            hits.append({
+                "content": payload.get("page_content", ""),
+                "metadata": payload.get("metadata", {}),
+                "score": score,
+                "id": i
+            })
+        return hits
+
+    def partition_counts(self, starts) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Document frequency of every term within each partition.
+
+        Partition i holds documents [starts[i], starts[i + 1]). Returns
+        parallel (term id, partition, documents) arrays, sorted by term.
+        """
+        terms = np.repeat(np.arange(len(self.vocab)), np.diff(self._offsets))
+        parts = np.searchsorted(np.asarray(starts), self._doc_ids, side="right") - 1
+        pairs, counts = np.unique(terms * len(starts) + parts, return_counts=True)
+        return pairs // len(starts), pairs % len(starts), counts
+
+
+def reciprocal_rank_fusion(rankings: List[List[Dict]], k: int = 3, rrf_k: int = 60) -> List[Dict]:
+    """Fuse ranked hit lists; a chunk's score is the sum of 1 / (rrf_k + rank).
+
+    The fused score replaces the hit's own (cosine or BM25) "score".
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, hit in enumerate(ranking, start=1):
+            key = (hit["metadata"].get("source"), hit["content"])
+            if key not in fused:
+                fused[key] = dict(hit, score=0.0)
+            fused[key]["score"] += 1.0 / (rrf_k + rank)
+    return sorted(fused.values(), key=lambda hit: hit["score"], reverse=True)[:k]
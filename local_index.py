@@ -0,0 +1,283 @@
+# local_index.py
+
+import math
+import mmap
+import os
+import tempfile
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Below this many vectors an exact scan is already sub-millisecond
+IVF_THRESHOLD = 50_000
+# How the searched matrix is held in memory: float32 (exact), int8 (scalar
+# quantized, 4x smaller) or binary (1 bit per dimension, 32x smaller)
+STORAGE_MODES = ("float32", "int8", "binary")
+# Approximate searches shortlist k * this many rows, then rescore them with
+# the full-precision vectors
+RESCORE_FACTOR = 4
+# Rows scored per step when int8 codes are widened to float32; small enough
+# that the widened block stays in cache (16k rows ran 3x slower)
+SCAN_BLOCK = 1024
+
+
+# Set bits per byte value, for NumPy < 2.0 (no np.bitwise_count)
+_POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint8)
+
+
+def _popcount(codes: np.ndarray) -> np.ndarray:
+    """Set bits per row of a packed uint64 code matrix"""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(codes).sum(axis=1, dtype=np.int32)
+    return _POPCOUNT[codes.view(np.uint8)].sum(axis=1, dtype=np.int32)
+
+
+def _is_mapped(array: np.ndarray) -> bool:
+    """Whether an array is a view of a memory-mapped file"""
+    base = array
+    while base is not None:
+        if isinstance(base, (mmap.mmap, np.memmap)):
+            return True
+        base = getattr(base, "base", None)
+    return False
+
+
+def _spill(matrix: np.ndarray, directory: str) -> np.memmap:
+    """Copy a matrix into an unlinked temporary file and map it, so its pages
+    are file-backed (reclaimable) instead of private heap"""
+    os.makedirs(directory, exist_ok=True)
+    mapped = np.memmap(tempfile.TemporaryFile(dir=directory), dtype=np.float32, mode="w+", shape=matrix.shape)
+    for start in range(0, len(matrix), 65_536):
+        mapped[start:start + 65_536] = matrix[start:start + 65_536]
+    mapped.flush()
+    return mapped
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=-1, keepdims=True), 1e-12)
+
+
+class LocalIndex:
+    """In-process cosine index over a contiguous, pre-normalized float32 matrix.
+
+    Exact top-k is one matmul plus an argpartition. Once the corpus grows past
+    `ivf_threshold` rows, an IVF (inverted file) coarse quantizer is trained so
+    a query only scans the `n_probe` closest clusters.
+
+    To fit more vectors per node the searched matrix can be shrunk: `dims`
+    keeps only the leading dimensions (text-embedding-3 vectors are
+    Matryoshka-trained, so a prefix renormalized is a valid embedding) and
+    `storage` quantizes it to int8 or to sign bits. Those searches are
+    approximate, so the top `k * rescore_factor` rows are rescored against
+    the full-precision vectors. Those stay in the snapshot's mmap when they
+    came from one (paged in only for the rows being rescored); otherwise,
+    given a `spill_dir`, they're moved to a mapped file there rather than
+    kept on the heap.
+    """
+
+    def __init__(
+        self,
+        vectors,
+        payloads: List[Dict],
+        normalized: bool = False,
+        ivf_threshold: int = IVF_THRESHOLD,
+        n_lists: int = None,
+        n_probe: int = 16,
+        storage: str = "float32",
+        dims: int = None,
+        rescore_factor: int = RESCORE_FACTOR,
+        spill_dir: str = None
+    ):
+        if storage not in STORAGE_MODES:
+            raise ValueError(f"Unknown vector storage: {storage} (expected one of {', '.join(STORAGE_MODES)})")
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if not normalized:
+            matrix = _normalize(matrix)
+        # A read-only mmap view is fine as long as it's already C-contiguous
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.payloads = payloads
+        self.n_probe = n_probe
+        self.storage = storage
+        self.dims = min(dims or matrix.shape[1], matrix.shape[1])
+        if storage == "binary" and self.dims % 64:
+            raise ValueError("binary storage needs a multiple of 64 dimensions")
+        self.rescore_factor = rescore_factor
+
+        # 1. Full-precision vectors by payload position, kept for rescoring
+        #    only when the searched matrix is not already them. Unless they
+        #    are the snapshot's mmap they go to a file in `spill_dir`, or the
+        #    heap copy would outweigh what quantizing saves
+        self.full = None
+        if storage != "float32" or self.dims < matrix.shape[1]:
+            self.full = matrix if spill_dir is None or _is_mapped(matrix) else _spill(matrix, spill_dir)
+            matrix = np.ascontiguousarray(_normalize(matrix[:, :self.dims]), dtype=np.float32)
+        self.matrix = matrix
+
+        # Row -> payload position (and back); identity until IVF reorders the matrix
+        self._row_ids = None
+        self._rows = None
+        self._centroids = None
+        self._offsets = None
+        if len(self.matrix) >= ivf_threshold:
+            self._train_ivf(n_lists or int(math.sqrt(len(self.matrix))))
+
+        # 2. Quantize the (possibly reordered) search matrix
+        self._scale = None
+        if storage == "int8":
+            self.matrix, self._scale = self._quantize_int8(self.matrix)
+        elif storage == "binary":
+            self.matrix = np.packbits(self.matrix > 0, axis=1).view(np.uint64)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held in memory for search (full-precision vectors not counted)"""
+        extra = sum(a.nbytes for a in (self._scale, self._centroids, self._row_ids, self._rows) if a is not None)
+        return self.matrix.nbytes + extra
+
+    @staticmethod
+    def _quantize_int8(matrix: np.ndarray):
+        # Per-dimension symmetric range from a sample, clipping the rare outliers
+        rng = np.random.default_rng(0)
+        sample = matrix[rng.choice(len(matrix), size=min(len(matrix), 10_000), replace=False)]
+        scale = np.maximum(np.quantile(np.abs(sample), 0.999, axis=0), 1e-6).astype(np.float32) / 127
+        codes = np.empty(matrix.shape, dtype=np.int8)
+        for start in range(0, len(matrix), SCAN_BLOCK):
+            block = matrix[start:start + SCAN_BLOCK] / scale
+            codes[start:start + SCAN_BLOCK] = np.clip(np.rint(block), -127, 127)
+        return codes, scale
+
+    def __len__(self) -> int:
+        return len(self.payloads)
+
+    @property
+    def is_approximate(self) -> bool:
+        return self._centroids is not None
+
+    def _train_ivf(self, n_lists: int, iterations: int = 10, block: int = 65_536):
+        # 1. Spherical k-means on a sample of the corpus
+        rng = np.random.default_rng(0)
+        n = len(self.matrix)
+        sample = self.matrix[rng.choice(n, size=min(n, n_lists * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            order = np.argsort(assign, kind="stable")
+            counts = np.bincount(assign, minlength=n_lists)
+            nonempty = np.flatnonzero(counts)
+            starts = np.concatenate(([0], np.cumsum(counts)))[nonempty]
+            centroids[nonempty] = np.add.reduceat(sample[order], starts, axis=0)
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+
+        # 2. Assign every row, in blocks to bound the temporary score matrix
+        assign = np.empty(n, dtype=np.int32)
+        for start in range(0, n, block):
+            assign[start:start + block] = np.argmax(self.matrix[start:start + block] @ centroids.T, axis=1)
+
+        # 3. Reorder rows so each inverted list is one contiguous slice
+        order = np.argsort(assign, kind="stable")
+        self.matrix = self.matrix[order]
+        self._row_ids = order
+        self._rows = np.empty_like(order)
+        self._rows[order] = np.arange(n)
+        self._centroids = centroids
+        self._offsets = np.concatenate(([0], np.cumsum(np.bincount(assign, minlength=n_lists))))
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        if k >= len(scores):
+            return np.argsort(-scores)
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
+
+    def _scores(self, query: np.ndarray, rows=None) -> np.ndarray:
+        """Scores of the search matrix (or `rows` of it, an index array or a slice) against a normalized, truncated query.
+
+        float32/int8 give cosine similarity; binary gives the fraction of
+        matching signs, rescaled to [-1, 1].
+        """
+        codes = self.matrix if rows is None else self.matrix[rows]
+        if self.storage == "float32":
+            return codes @ query
+        if self.storage == "int8":
+            query = query * self._scale
+            scores = np.empty(len(codes), dtype=np.float32)
+            for start in range(0, len(codes), SCAN_BLOCK):
+                scores[start:start + SCAN_BLOCK] = codes[start:start + SCAN_BLOCK].astype(np.float32) @ query
+            return scores
+        signs = np.packbits(query > 0).view(np.uint64)
+        distance = _popcount(codes ^ signs)
+        return 1 - 2 * distance.astype(np.float32) / self.dims
+
+    def search_ids(self, vector, k: int = 3, ranges: List[Tuple[int, int]] = None) -> List[Tuple[int, float]]:
+        """Return [(payload position, cosine score)] for the top-k rows.
+
+        `ranges` limits the search to payload positions in those [start, end)
+        ranges, scanning only their rows.
+        """
+        if not len(self.matrix) or k <= 0 or ranges == []:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        shortlist = k if self.full is None else k * self.rescore_factor
+        search_query = query if self.full is None else _normalize(query[:self.dims])
+
+        rows = None
+        if self._centroids is not None:
+            # IVF: scan only the closest inverted lists (and, with ranges,
+            # only their rows inside the ranges)
+            probe = self._top_k(self._centroids @ search_query, self.n_probe)
+            rows = np.concatenate([
+                np.arange(self._offsets[p], self._offsets[p + 1]) for p in probe
+            ])
+            if ranges is not None:
+                original = self._row_ids[rows]
+                inside = np.zeros(len(rows), dtype=bool)
+                for start, end in ranges:
+                    inside |= (original >= start) & (original < end)
+                rows = rows[inside]
+                if len(rows) < shortlist:
+                    # The probed lists barely touch these ranges: scan them whole
+                    rows = self._rows[np.concatenate([np.arange(start, end) for start, end in ranges])]
+
+        if rows is not None:
+            scores = self._scores(search_query, rows)
+            top = self._top_k(scores, shortlist)
+            positions = self._row_ids[rows[top]]
+        elif ranges is not None:
+            # Ranges are contiguous rows: score each slice in place
+            scores = np.concatenate([self._scores(search_query, slice(start, end)) for start, end in ranges])
+            top = self._top_k(scores, shortlist)
+            positions = np.concatenate([np.arange(start, end) for start, end in ranges])[top]
+        else:
+            scores = self._scores(search_query)
+            top = self._top_k(scores, shortlist)
+            positions = top
+        if self.full is None:
+            return [(int(p), float(scores[i])) for p, i in zip(positions, top)]
+
+        # Rescore the shortlist with full-precision cosine (in row order, so
+        # an mmap is read front to back)
+        candidates = np.sort(positions)
+        exact = self.full[candidates] @ query
+        order = self._top_k(exact, k)
+        return [(int(candidates[i]), float(exact[i])) for i in order]
+
+    def vectors_at(self, positions) -> np.ndarray:
+        """Stored (normalized, full-precision) vectors for payload positions"""
+        positions = np.asarray(positions, dtype=np.int64)
+        if self.full is not None:
+            return self.full[positions]
+        return self.matrix[positions if self._rows is None else self._rows[positions]]
+
+    def search(self, vector, k: int = 3, ranges: List[Tuple[int, int]] = None) -> List[Dict]:
+        """Top-k hits in the same shape as VectorStore.search, with the payload position as `id`"""
+        hits = []
+        for i, score in self.search_ids(vector, k, ranges):
+            payload = self.payloads[i]
+            hits.append({
+                "content": payload.get("page_content", ""),
+                "metadata": payload.get("metadata", {}),
+                "score": score,
+                "id": i
+            })
+        return hits
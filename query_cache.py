@@ -0,0 +1,168 @@
+# query_cache.py
+
+import queue
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+
+def normalize_query(text: str) -> str:
+    """Cache key for a question: case, spacing and trailing punctuation don't matter"""
+    return " ".join(text.lower().split()).rstrip(" ?!.")
+
+
+class QueryEmbeddingCache:
+    """Bounded LRU of query embeddings, stored as read-only float32 arrays.
+
+    Keys are normalized question text, so "What is Git?" and "what is git"
+    share one entry. One instance can be shared by every session and API key
+    as long as they use the same embedding model.
+    """
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> vector, oldest use first
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, key: str, vector) -> np.ndarray:
+        vector = np.array(vector, dtype=np.float32).ravel()
+        vector.setflags(write=False)  # handed out to many callers
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return vector
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+class QueryBatcher:
+    """Merges query embeddings that arrive within `max_wait` seconds into one request.
+
+    Callers block in `embed(text)` while a background thread collects
+    texts for up to `max_wait` after the first one (or until
+    `max_batch_size`), then sends them as a single `embed_fn(texts)` call
+    on a small pool, so the next batch can form while this one is in flight.
+    A text that is already queued or in flight for the same `embed_fn` is
+    not sent again; its callers wait on the same result.
+
+    Callers can pass their own `embed_fn` (e.g. one per API key): texts
+    that arrive together are then sent as one request per function, so a
+    single batcher and its threads serve every key.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[List[str]], List[List[float]]],
+        max_wait: float = 0.005,
+        max_batch_size: int = 64,
+        max_in_flight: int = 4
+    ):
+        self.embed_fn = embed_fn
+        self.max_wait = max_wait
+        self.max_batch_size = max_batch_size
+        self._queue = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="query-embed")
+        self._lock = threading.Lock()
+        self._collector = None
+        self._pending = {}  # (text, embed_fn) -> Future shared by everyone waiting on it
+
+        self.requests = 0  # embed() calls, including ones that joined a pending text
+        self.batch_sizes = Counter()  # texts per embeddings request -> number of requests
+
+    def embed(self, text: str, embed_fn: Callable[[List[str]], List[List[float]]] = None) -> np.ndarray:
+        with self._lock:
+            self.requests += 1
+            # Keyed per function too, so one key never gets another key's vector or error
+            embed_fn = embed_fn or self.embed_fn
+            future = self._pending.get((text, embed_fn))
+            if future is None:
+                future = self._pending[text, embed_fn] = Future()
+                self._queue.put((text, embed_fn))
+            if self._collector is None:
+                self._collector = threading.Thread(target=self._collect, name="query-batcher", daemon=True)
+                self._collector.start()
+        return future.result()
+
+    def _collect(self):
+        while True:
+            # 1. Block for the first text, then give others max_wait to join
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            # 2. Send it off without holding up the next batch, one request
+            #    per embed_fn
+            groups = {}
+            for text, embed_fn in batch:
+                groups.setdefault(embed_fn, []).append(text)
+            for embed_fn, texts in groups.items():
+                self._pool.submit(self._send, embed_fn, texts)
+
+    def _send(self, embed_fn: Callable[[List[str]], List[List[float]]], texts: List[str]):
+        with self._lock:
+            self.batch_sizes[len(texts)] += 1
+        try:
+            vectors, error = np.asarray(embed_fn(texts), dtype=np.float32), None
+            if len(vectors) != len(texts):
+                raise ValueError(f"embeddings response has {len(vectors)} vectors for {len(texts)} texts")
+        except Exception as e:
+            vectors, error = None, e
+        with self._lock:
+            futures = [self._pending.pop((text, embed_fn), None) for text in texts]
+        # Every waiter gets an outcome, even if setting one of them fails
+        try:
+            for i, future in enumerate(futures):
+                if future is None:
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(vectors[i])
+        finally:
+            for future in futures:
+                if future is not None and not future.done():
+                    future.set_exception(error or RuntimeError("query embedding wasn't delivered"))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            batches = sum(self.batch_sizes.values())
+            sent = sum(size * n for size, n in self.batch_sizes.items())
+            return {
+                "requests": self.requests,
+                "batches": batches,
+                "avg_batch_size": sent / batches if batches else 0.0,
+                "max_batch_size": max(self.batch_sizes, default=0),
+                "batch_sizes": dict(sorted(self.batch_sizes.items()))
+            }
@@ -0,0 +1,84 @@
+# reranker.py
+
+import time
+from typing import Dict, List
+
+import numpy as np
+
+# Candidates fetched for reranking, and the MMR relevance/diversity trade-off
+# (1.0 = pure relevance)
+RERANK_FETCH_K = 20
+MMR_LAMBDA = 0.7
+
+
+def mmr(relevance: np.ndarray, vectors: np.ndarray, k: int, lambda_: float = MMR_LAMBDA) -> List[int]:
+    """Greedy Maximal Marginal Relevance; returns picked candidate positions in order.
+
+    `relevance` should be on a 0..1 scale and `vectors` L2-normalized rows.
+    Candidate-to-candidate similarity is one n x n matmul, and each pick
+    updates every candidate's redundancy in a single vectorized max.
+    """
+    n = len(relevance)
+    k = min(k, n)
+    similarity = vectors @ vectors.T
+    redundancy = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    picked = []
+    for _ in range(k):
+        scores = np.where(available, lambda_ * relevance - (1 - lambda_) * redundancy, -np.inf)
+        j = int(np.argmax(scores))
+        picked.append(j)
+        available[j] = False
+        np.maximum(redundancy, similarity[j], out=redundancy)
+    return picked
+
+
+class Reranker:
+    """Picks a diverse, relevant subset of over-fetched hits before prompting.
+
+    Relevance comes from the retriever's own scores, or from a local
+    cross-encoder when `cross_encoder` names a sentence-transformers model
+    (e.g. "cross-encoder/ms-marco-MiniLM-L-6-v2"). MMR then trades it off
+    against similarity to already-picked hits using the vectors attached by
+    `VectorStore.search(..., with_vectors=True)`. A hit without a vector
+    is never penalized as redundant.
+    """
+
+    def __init__(self, lambda_: float = MMR_LAMBDA, cross_encoder: str = None):
+        self.lambda_ = lambda_
+        self.cross_encoder = None
+        if cross_encoder:
+            # Optional dependency, and it pulls in torch: only import when asked for
+            try:
+                from sentence_transformers import CrossEncoder
+            except ImportError as e:
+                raise ImportError("Cross-encoder reranking needs `pip install sentence-transformers`") from e
+            self.cross_encoder = CrossEncoder(cross_encoder)
+        self.last_ms = 0.0
+
+    def _relevance(self, question: str, hits: List[Dict]) -> np.ndarray:
+        if self.cross_encoder is not None:
+            scores = self.cross_encoder.predict([(question, hit["content"]) for hit in hits])
+        else:
+            scores = [hit["score"] for hit in hits]
+        scores = np.asarray(scores, dtype=np.float32)
+        # Min-max to 0..1 so relevance and cosine redundancy are comparable
+        spread = float(scores.max() - scores.min())
+        return (scores - scores.min()) / spread if spread > 0 else np.ones_like(scores)
+
+    def rerank(self, question: str, hits: List[Dict], k: int) -> List[Dict]:
+        start = time.perf_counter()
+        if len(hits) <= 1:
+            return hits[:k]
+
+        relevance = self._relevance(question, hits)
+        dim = next((len(hit["vector"]) for hit in hits if hit.get("vector") is not None), 0)
+        vectors = np.zeros((len(hits), dim), dtype=np.float32)
+        for i, hit in enumerate(hits):
+            if hit.get("vector") is not None:
+                vectors[i] = hit["vector"]
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+        reranked = [hits[i] for i in mmr(relevance, vectors, k, self.lambda_)]
+        self.last_ms = (time.perf_counter() - start) * 1000
+        return reranked
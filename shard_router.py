@@ -0,0 +1,128 @@
+# shard_router.py
+
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import numpy as np
+
+from lexical_index import BM25Index, tokenize
+
+# Routing only pays off with a few shards to skip, and once scanning them
+# costs more than routing (~0.1 ms); below that everything is searched
+MIN_SHARDS = 3
+MIN_ROUTED_CHUNKS = 500
+# Shards scoring at least this fraction of the best one are searched; when
+# that's more than MAX_ROUTED_SHARDS the question searches everything. A
+# ratio, not a share of the total, so it holds as shards are added
+ROUTE_RATIO = 0.3
+MAX_ROUTED_SHARDS = 2
+# Softmax temperature over centroid cosines, which sit in a narrow band
+CENTROID_TEMPERATURE = 0.02
+
+Ranges = Dict[str, Tuple[int, int]]
+
+
+def series_of(source: str) -> str:
+    """Series a docs URL belongs to: /youtube/<series>/<page>/ -> <series>
+    (otherwise its first path segment)"""
+    parts = [p for p in urlparse(source or "").path.split("/") if p]
+    if len(parts) > 1 and parts[0] == "youtube":
+        return parts[1]
+    return parts[0] if parts else ""
+
+
+def partition(payloads: List[Dict]) -> Tuple[List[int], Ranges]:
+    """Order that groups payloads by series, and each series' [start, end) in it.
+
+    Series keep the order they first appear in and chunks keep their order
+    within a series, so an already grouped list maps to itself.
+    """
+    series = [series_of(p.get("metadata", {}).get("source", "")) for p in payloads]
+    first = {}
+    for name in series:
+        first.setdefault(name, len(first))
+    order = sorted(range(len(series)), key=lambda i: first[series[i]])
+
+    ranges, start = {}, 0
+    counts = np.bincount([first[name] for name in series], minlength=len(first))
+    for name, count in zip(first, counts):
+        ranges[name] = (start, start + int(count))
+        start += int(count)
+    return order, ranges
+
+
+class ShardRouter:
+    """Picks the series shards a question is about, from what was indexed.
+
+    Keywords: each term is weighted by the share of a shard's chunks that
+    contain it (read off the BM25 postings) and by how few shards use it at
+    all. Centroids: cosine of the question embedding to each shard's mean
+    vector. Each side becomes a distribution over shards and the two are
+    averaged. Shards within `ratio` of the best are searched, and a question
+    that leaves more than `max_shards` of them gets None (search everything).
+    """
+
+    def __init__(
+        self,
+        ranges: Ranges,
+        lexical: BM25Index = None,
+        centroids: np.ndarray = None,
+        ratio: float = ROUTE_RATIO,
+        max_shards: int = MAX_ROUTED_SHARDS,
+        min_chunks: int = MIN_ROUTED_CHUNKS
+    ):
+        self.names = list(ranges)
+        self.ratio = ratio
+        self.max_shards = max_shards
+        self.min_chunks = min_chunks
+        self.chunks = max((end for _, end in ranges.values()), default=0)
+        self.centroids = centroids
+        self.vocab = {}
+        if lexical is not None and len(lexical):
+            sizes = np.array([end - start for start, end in ranges.values()], dtype=np.float32)
+            terms, parts, counts = lexical.partition_counts([start for start, _ in ranges.values()])
+            # idf over shards: a term in every shard says nothing about where to look
+            shards_per_term = np.bincount(terms, minlength=len(lexical.vocab))
+            idf = np.log(1 + len(self.names) / np.maximum(shards_per_term, 1))
+            self.vocab = lexical.vocab
+            self._parts = parts
+            self._weights = (idf[terms] * counts / np.maximum(sizes[parts], 1)).astype(np.float32)
+            self._offsets = np.concatenate(([0], np.cumsum(shards_per_term)))
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def keyword_scores(self, query: str) -> Optional[np.ndarray]:
+        scores = np.zeros(len(self.names), dtype=np.float32)
+        for token in set(tokenize(query)):
+            term_id = self.vocab.get(token)
+            if term_id is not None:
+                start, end = self._offsets[term_id], self._offsets[term_id + 1]
+                scores[self._parts[start:end]] += self._weights[start:end]
+        total = float(scores.sum())
+        return scores / total if total > 0 else None
+
+    def centroid_scores(self, vector) -> Optional[np.ndarray]:
+        if vector is None or self.centroids is None:
+            return None
+        query = np.asarray(vector, dtype=np.float32)
+        cosines = self.centroids @ (query / max(float(np.linalg.norm(query)), 1e-12))
+        weights = np.exp((cosines - cosines.max()) / CENTROID_TEMPERATURE)
+        return weights / weights.sum()
+
+    def scores(self, query: str, vector=None) -> Optional[np.ndarray]:
+        """Probability-like weight per shard (in `names` order), or None with no signal"""
+        sides = [s for s in (self.keyword_scores(query), self.centroid_scores(vector)) if s is not None]
+        return np.mean(sides, axis=0) if sides else None
+
+    def route(self, query: str, vector=None) -> Optional[List[str]]:
+        """Shards to search for this question, or None to search them all"""
+        if len(self.names) < MIN_SHARDS or self.chunks < self.min_chunks:
+            return None
+        scores = self.scores(query, vector)
+        if scores is None:
+            return None
+        picked = np.flatnonzero(scores >= scores.max() * self.ratio)
+        if len(picked) > self.max_shards:
+            return None
+        return [self.names[i] for i in picked[np.argsort(-scores[picked])]]
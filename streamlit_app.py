@@ -1,11 +1,21 @@
 import streamlit as st
 import os
 import time
-from typing import Dict
-from openai import OpenAI
+from typing import Dict, Optional
 
 from vector_store import VectorStore
 from chatengine import ChatEngine
+from credentials import INVALID_KEY_TTL, VALID_KEY_TTL, KeyValidator, key_fingerprint
+from answer_cache import RecentAnswers, SemanticAnswerCache
+from answer_client import AnswerServiceClient
+from chat_history import ChatHistory, render_history, sources_html
+from query_cache import QueryEmbeddingCache
+from reranker import MMR_LAMBDA, Reranker
+from tracing import observe, serve_metrics, tracer
+
+# With ANSWER_SERVICE_URL set, questions go to answer_service.py and this
+# app is just the UI (no index or models loaded here)
+ANSWER_SERVICE_URL = os.getenv("ANSWER_SERVICE_URL")
 
 # Page setup
 st.set_page_config(
@@ -69,36 +79,129 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-def validate_api_key(api_key: str) -> bool:
-    """Test if the API key is valid by making a simple request"""
+@st.cache_resource
+def get_key_validator() -> KeyValidator:
+    """Key checks shared by every session, cached by key hash"""
+    return KeyValidator(
+        ttl=float(os.getenv("KEY_CHECK_TTL", VALID_KEY_TTL)),
+        invalid_ttl=float(os.getenv("INVALID_KEY_CHECK_TTL", INVALID_KEY_TTL))
+    )
+
+def validate_api_key(api_key: str):
+    """True/False for a good/bad key (free `models.list` call, cached); None if OpenAI couldn't be reached"""
     try:
-        client = OpenAI(api_key=api_key)
-        # Test with a minimal request
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": "Hi"}],
-            max_tokens=5
-        )
-        return True
-    except Exception as e:
-        return False
+        return get_key_validator().validate(api_key)
+    except Exception:
+        return None
+
+@st.cache_resource
+def get_answer_cache() -> SemanticAnswerCache:
+    """One semantic answer cache shared by every session and API key"""
+    return SemanticAnswerCache(
+        threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9")),
+        max_entries=int(os.getenv("SEMANTIC_CACHE_SIZE", "1000")),
+        ttl=float(os.getenv("SEMANTIC_CACHE_TTL", "1800"))
+    )
+
+@st.cache_resource
+def get_query_cache() -> QueryEmbeddingCache:
+    """Question embeddings shared by every session and API key"""
+    return QueryEmbeddingCache(max_entries=int(os.getenv("QUERY_CACHE_SIZE", "2048")))
+
+@st.cache_resource
+def get_reranker() -> Reranker:
+    """MMR reranker (plus the optional cross-encoder model) loaded once per process"""
+    return Reranker(
+        lambda_=float(os.getenv("MMR_LAMBDA", MMR_LAMBDA)),
+        cross_encoder=os.getenv("RERANKER_MODEL") or None
+    )
+
+@st.cache_resource
+def start_metrics_server():
+    """Serve Prometheus metrics on METRICS_PORT (once per process), if set"""
+    port = os.getenv("METRICS_PORT")
+    return serve_metrics(int(port)) if port else None
 
 @st.cache_resource
+def get_vector_store() -> VectorStore:
+    """One retrieval index for every API key; question embeddings are billed to the asker's key"""
+    return VectorStore(api_key=os.getenv("OPENAI_API_KEY"), query_cache=get_query_cache())
+
+@st.cache_resource(max_entries=int(os.getenv("MAX_CHAT_ENGINES", "1000")))
+def get_chat_engine(key_id: str, _api_key: str) -> ChatEngine:
+    """Per-key engine (just the key and an OpenAI client) on the shared store, cached by key hash"""
+    if ANSWER_SERVICE_URL:
+        return AnswerServiceClient(ANSWER_SERVICE_URL, _api_key)
+    return ChatEngine(
+        api_key=_api_key,
+        vector_store=get_vector_store(),
+        answer_cache=get_answer_cache(),
+        reranker=get_reranker()
+    )
+
 def get_chat_components(api_key: str):
-    """Setup chat components with user's API key"""
-    vector_store = VectorStore(api_key=api_key)
-    chat_engine = ChatEngine(api_key=api_key, vector_store=vector_store)
-    return vector_store, chat_engine
+    """Shared vector store plus the chat engine for the user's API key (no store with the answer service)"""
+    if ANSWER_SERVICE_URL:
+        return None, get_chat_engine(key_fingerprint(api_key), api_key)
+    return get_vector_store(), get_chat_engine(key_fingerprint(api_key), api_key)
+
+@st.cache_resource
+def get_streamed_answers() -> RecentAnswers:
+    """Answers produced by the streaming path, so repeat questions skip generation (30 min each)"""
+    return RecentAnswers(max_entries=500, ttl=1800)
+
+def remember_streamed_answer(question: str, api_key: str, response: Dict):
+    """Keep an answer for repeats; only call it for answers that completed normally"""
+    get_streamed_answers().put(question, key_fingerprint(api_key), response)
+
+def get_response(question: str, api_key: str) -> Optional[Dict]:
+    """This key's recent streamed answer to the question, or None"""
+    return get_streamed_answers().get(question, key_fingerprint(api_key))
 
-@st.cache_data(ttl=1800, show_spinner=False)
-def get_response(question: str, api_key: str) -> Dict:
-    """Get bot response with caching"""
-    _, engine = get_chat_components(api_key)
-    return engine.get_answer(question)
+@st.cache_data(ttl=10, show_spinner=False)
+def get_service_stats():
+    """Counters from the answer service, refreshed at most every 10s rather than every rerun"""
+    return AnswerServiceClient(ANSWER_SERVICE_URL, "").stats()
+
+def render_diagnostics():
+    """Per-stage latency percentiles, counters and the slowest recent request"""
+    snapshot = tracer.snapshot()
+    if not snapshot["stages"]:
+        st.caption("No requests traced yet.")
+        return
+    st.dataframe(
+        [
+            {
+                "stage": name,
+                "count": stats["count"],
+                "p50 ms": round(stats["p50_ms"], 1),
+                "p95 ms": round(stats["p95_ms"], 1),
+                "p99 ms": round(stats["p99_ms"], 1)
+            }
+            for name, stats in snapshot["stages"].items()
+        ],
+        hide_index=True,
+        use_container_width=True
+    )
+    st.caption(" · ".join(f"{name} {value:g}" for name, value in snapshot["counters"].items()))
+
+    answers = [trace for trace in snapshot["recent"] if trace["name"] == "answer"]
+    if answers:
+        slowest = max(answers, key=lambda trace: trace["ms"])
+        st.markdown(f"**Slowest of last {len(answers)} answers: {slowest['ms']:.0f} ms**")
+        st.code("\n".join(f"{'  ' * depth}{name:<{28 - 2 * depth}} {ms:>8.1f} ms" for depth, name, ms in slowest["stages"]))
+    st.download_button("⬇️ Prometheus metrics", tracer.render_prometheus(), file_name="metrics.txt")
+
+def render_sources(sources):
+    """Sources expander shown under an answer"""
+    with st.expander(f"📚 Sources ({len(sources)})"):
+        st.markdown(sources_html(sources), unsafe_allow_html=True)
+
+start_metrics_server()
 
 # Session state
 if "chat_history" not in st.session_state:
-    st.session_state.chat_history = []
+    st.session_state.chat_history = ChatHistory()
 if "api_key_validated" not in st.session_state:
     st.session_state.api_key_validated = False
 if "user_api_key" not in st.session_state:
@@ -129,11 +232,14 @@ if not st.session_state.api_key_validated:
         if st.button("🚀 Validate & Start Chat", use_container_width=True):
             if api_key_input:
                 with st.spinner("Validating your API key..."):
-                    if validate_api_key(api_key_input):
+                    valid = validate_api_key(api_key_input)
+                    if valid:
                         st.session_state.api_key_validated = True
                         st.session_state.user_api_key = api_key_input
                         st.success("✅ API key validated! You can now start chatting.")
                         st.rerun()
+                    elif valid is None:
+                        st.error("⚠️ Couldn't reach OpenAI to check your key. Please try again in a moment.")
                     else:
                         st.error("❌ Invalid API key. Please check and try again.")
             else:
@@ -166,32 +272,44 @@ with st.sidebar:
     
     st.markdown("### 🔒 Privacy")
     st.write("Your API key is only stored in your browser session and is never saved permanently.")
+
+    st.markdown("### ⚡ Answer cache")
+    if ANSWER_SERVICE_URL:
+        service_stats = get_service_stats()
+        cache_stats = (service_stats or {}).get("answer_cache") or get_answer_cache().stats()
+        st.caption(
+            f"Answer service worker {service_stats['worker']}: {service_stats['coalesced']} questions "
+            f"shared an in-flight answer, {service_stats['rejected']} turned away"
+            if service_stats else f"Answer service at {ANSWER_SERVICE_URL} is not reachable"
+        )
+    else:
+        cache_stats = get_answer_cache().stats()
+    st.caption(
+        f"Hit rate {cache_stats['hit_rate']:.0%} ({cache_stats['hits']}/{cache_stats['hits'] + cache_stats['misses']}) · "
+        f"saved {cache_stats['saved_seconds']:.1f}s and {cache_stats['saved_tokens']} tokens"
+    )
+    if st.session_state.chat_history and not ANSWER_SERVICE_URL:
+        # Components (and the libraries behind them) load with the first question
+        query_stats = get_vector_store().query_stats()
+        batch_stats = query_stats.get("batcher", {})
+        st.caption(
+            f"Query embeddings: hit rate {query_stats['cache']['hit_rate']:.0%} · "
+            f"avg batch {batch_stats.get('avg_batch_size', 0.0):.1f} (max {batch_stats.get('max_batch_size', 0)})"
+        )
+
+
+    if tracer.enabled:
+        with st.expander("🩺 Diagnostics"):
+            render_diagnostics()
     
     if st.button("🔄 Change API Key"):
         st.session_state.api_key_validated = False
         st.session_state.user_api_key = ""
-        st.session_state.chat_history = []
+        st.session_state.chat_history.clear()
         st.rerun()
 
-# Display chat history
-for chat in st.session_state.chat_history:
-    with st.chat_message("user"):
-        st.write(chat["question"])
-    
-    with st.chat_message("assistant"):
-        st.write(chat["answer"])
-        
-        if chat.get("sources"):
-            with st.expander(f"📚 Sources ({len(chat['sources'])})"):
-                for i, src in enumerate(chat["sources"]):
-                    source_url = src.get('source', 'Unknown')
-                    st.markdown(f"""
-                    <div class="source-box">
-                        <strong>[{src.get('number', i+1)}]</strong> 
-                        <a href="{source_url}" target="_blank" style="color: #667eea; text-decoration: none; font-weight: 500;">{source_url}</a>
-                        <br><small style="color: #6c757d;">{src.get('preview', 'No preview')}</small>
-                    </div>
-                    """, unsafe_allow_html=True)
+# Display chat history (most recent page only; each turn was rendered when it was added)
+render_history(st.session_state.chat_history)
 
 # Chat input
 user_input = st.chat_input("Ask me anything about ChaiCode documentation...")
@@ -207,49 +325,81 @@ if user_input:
         loading_placeholder.markdown("🤔 **Thinking...**")
         
         try:
-            start_time = time.time()
-            response = get_response(user_input, st.session_state.user_api_key)
-            response_time = time.time() - start_time
-            
-            loading_placeholder.empty()
-            
-            answer = response.get("answer", "Sorry, couldn't get an answer.")
-            sources = response.get("sources", [])
-            
-            st.write(answer)
-            
-            if sources:
-                with st.expander(f"📚 Sources ({len(sources)})"):
-                    for i, src in enumerate(sources):
-                        source_url = src.get('source', 'Unknown')
-                        st.markdown(f"""
-                        <div class="source-box">
-                            <strong>[{src.get('number', i+1)}]</strong> 
-                            <a href="{source_url}" target="_blank" style="color: #667eea; text-decoration: none; font-weight: 500;">{source_url}</a>
-                            <br><small style="color: #6c757d;">{src.get('preview', 'No preview')}</small>
-                        </div>
-                        """, unsafe_allow_html=True)
-            
-            st.caption(f"⏱️ {response_time:.1f}s")
+            api_key = st.session_state.user_api_key
+            start_time = time.perf_counter()
+
+            response = get_response(user_input, api_key)
+            if response is not None:
+                # Repeat question: served from the recent answers
+                response_time = time.perf_counter() - start_time
+                first_token_time = response_time
+
+                loading_placeholder.empty()
+
+                answer = response.get("answer", "Sorry, couldn't get an answer.")
+                sources = response.get("sources", [])
+                usage = None  # served from cache, nothing billed
+
+                st.write(answer)
+                if sources:
+                    render_sources(sources)
+            else:
+                # New question: show sources as soon as retrieval is done,
+                # then stream the answer text into the bubble
+                _, engine = get_chat_components(api_key)
+                answer_slot = st.container()
+                sources_slot = st.container()
+                sources = []
+                timing = {}
+
+                def answer_deltas():
+                    for event in engine.stream_answer(user_input):
+                        if event["type"] == "sources":
+                            sources.extend(event["sources"])
+                            if sources:
+                                with sources_slot:
+                                    render_sources(sources)
+                        elif event["type"] == "delta":
+                            if "first_token" not in timing:
+                                timing["first_token"] = time.perf_counter() - start_time
+                                loading_placeholder.empty()
+                            yield event["text"]
+                        elif event["type"] == "usage":
+                            timing["usage"] = event["usage"]
+                        elif event["type"] == "error":
+                            timing["error"] = event["error"]
+
+                with answer_slot:
+                    answer = st.write_stream(answer_deltas())
+                loading_placeholder.empty()
+                response_time = time.perf_counter() - start_time
+                first_token_time = timing.get("first_token", response_time)
+                usage = timing.get("usage")
+
+                if isinstance(answer, list):
+                    answer = "".join(str(part) for part in answer)
+                answer = answer.strip() or "Sorry, couldn't get an answer."
+                # Error and busy answers aren't kept, so asking again retries
+                if "error" not in timing:
+                    remember_streamed_answer(user_input, api_key, {"answer": answer, "sources": sources})
+
+            observe("ui.response", response_time)
+            caption = f"⏱️ {response_time:.1f}s · first token {first_token_time:.2f}s"
+            if usage:
+                caption += (
+                    f" · 🪙 {usage['prompt_tokens']} in ({usage['cached_tokens']} cached, "
+                    f"{usage['context_tokens']} context) / {usage['completion_tokens']} out"
+                )
+            st.caption(caption)
             
             # Save to history
-            st.session_state.chat_history.append({
-                "question": user_input,
-                "answer": answer,
-                "sources": sources,
-                "time": response_time
-            })
+            st.session_state.chat_history.append(user_input, answer, sources, response_time)
             
         except Exception as e:
             loading_placeholder.empty()
             st.error(f"Something went wrong: {str(e)}")
             
-            st.session_state.chat_history.append({
-                "question": user_input,
-                "answer": "Error occurred",
-                "sources": [],
-                "time": 0
-            })
+            st.session_state.chat_history.append(user_input, "Error occurred")
 
 st.markdown('</div>', unsafe_allow_html=True)
 
@@ -0,0 +1,240 @@
+# tracing.py
+
+import bisect
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+METRIC_PREFIX = "chaibot"
+# Histogram bucket bounds in seconds, 1 ms .. 60 s
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Latest samples kept per stage for p50/p95/p99
+WINDOW_SIZE = 1024
+# Finished top-level traces kept for the diagnostics panel
+RECENT_TRACES = 50
+
+# Innermost open span of the current thread / asyncio task
+_current = contextvars.ContextVar("tracing_span", default=None)
+
+
+class Histogram:
+    """Cumulative buckets for export plus a sliding window for percentiles"""
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.window = deque(maxlen=WINDOW_SIZE)
+
+    def observe(self, seconds: float):
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.window.append(seconds)
+
+    def summary(self) -> Dict:
+        p50, p95, p99 = np.percentile(self.window, [50, 95, 99]) * 1000 if self.window else (0.0, 0.0, 0.0)
+        return {
+            "count": self.count,
+            "mean_ms": self.sum / self.count * 1000 if self.count else 0.0,
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99)
+        }
+
+
+class Span:
+    """One timed stage. Always measures (`ms` works with tracing off); only
+    records histograms and trace trees when the tracer is enabled."""
+
+    __slots__ = ("tracer", "name", "attributes", "start", "seconds", "children", "_token")
+
+    def __init__(self, tracer: "Tracer", name: str, attributes: Dict):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.seconds = 0.0
+        self.children = None
+        self._token = None
+
+    def __enter__(self) -> "Span":
+        if self.tracer.enabled:
+            self.children = []
+            self._token = _current.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.seconds = time.perf_counter() - self.start
+        if self._token is not None:
+            try:
+                _current.reset(self._token)
+            except ValueError:
+                # Exited from another context (e.g. an abandoned generator)
+                pass
+            self.tracer._finish(self, exc_type is not None)
+        return False
+
+    @property
+    def ms(self) -> float:
+        return self.seconds * 1000
+
+    def flatten(self, depth: int = 0) -> List[Tuple[int, str, float]]:
+        """(depth, name, ms) for this span and its children, in start order"""
+        rows = [(depth, self.name, self.ms)]
+        for child in sorted(self.children or [], key=lambda s: s.start):
+            rows.extend(child.flatten(depth + 1))
+        return rows
+
+
+class Tracer:
+    """Per-stage latency histograms, counters and recent trace trees.
+
+    Spans nest through a context variable, so a stage opened inside another
+    (in the same thread, in an asyncio task, or in a worker started with
+    `contextvars.copy_context().run`) becomes its child. Every span feeds a
+    histogram named after the stage; top-level spans are also kept as
+    traces, so a slow request can be broken down stage by stage.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Histogram] = {}
+        self._counters: Dict[Tuple[str, Tuple], float] = {}
+        self._recent = deque(maxlen=RECENT_TRACES)
+
+    def span(self, name: str, **attributes) -> Span:
+        return Span(self, name, attributes)
+
+    def observe(self, name: str, seconds: float):
+        """Record a duration that isn't a span (e.g. time to first token)"""
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def incr(self, name: str, value: float = 1, **labels):
+        if not self.enabled or not value:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def _finish(self, span: Span, failed: bool):
+        self.observe(span.name, span.seconds)
+        if failed:
+            self.incr("errors", stage=span.name)
+        parent = _current.get()
+        if parent is not None and parent is not span and parent.children is not None:
+            parent.children.append(span)
+        else:
+            self._recent.append({
+                "name": span.name,
+                "attributes": span.attributes,
+                "ms": span.ms,
+                "finished": time.time(),
+                "stages": span.flatten()
+            })
+
+    def snapshot(self) -> Dict:
+        """Stage percentiles, counters and recent traces (newest first)"""
+        with self._lock:
+            stages = {name: h.summary() for name, h in sorted(self._histograms.items())}
+            counters = {
+                name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else ""): value
+                for (name, labels), value in sorted(self._counters.items())
+            }
+            recent = list(reversed(self._recent))
+        return {"stages": stages, "counters": counters, "recent": recent}
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+
+        if histograms:
+            metric = f"{METRIC_PREFIX}_stage_seconds"
+            lines += [f"# HELP {metric} Time spent per pipeline stage", f"# TYPE {metric} histogram"]
+            for stage, h in histograms:
+                cumulative = 0
+                for bound, count in zip(BUCKETS + (float("inf"),), h.buckets):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{metric}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{stage="{stage}"}} {h.sum:.6f}')
+                lines.append(f'{metric}_count{{stage="{stage}"}} {h.count}')
+
+        typed = set()
+        for (name, labels), value in counters:
+            metric = f"{METRIC_PREFIX}_{name}_total"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+            lines.append(f"{metric}{{{label_text}}} {value:g}" if label_text else f"{metric} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def format_summary(self) -> str:
+        """Plain-text stage table for scripts"""
+        rows = [f"{'stage':<24} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"]
+        for name, s in self.snapshot()["stages"].items():
+            rows.append(f"{name:<24} {s['count']:>7} {s['p50_ms']:>9.1f} {s['p95_ms']:>9.1f} {s['p99_ms']:>9.1f}")
+        return "\n".join(rows)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._recent.clear()
+
+
+# Process-wide tracer; TRACING=0 turns recording off
+tracer = Tracer(enabled=os.getenv("TRACING", "1").lower() not in ("0", "false", "off"))
+
+
+def span(name: str, **attributes) -> Span:
+    """`with span("search.dense"): ...` times a stage on the process tracer"""
+    return tracer.span(name, **attributes)
+
+
+def observe(name: str, seconds: float):
+    tracer.observe(name, seconds)
+
+
+def incr(name: str, value: float = 1, **labels):
+    tracer.incr(name, value, **labels)
+
+
+def serve_metrics(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve the process tracer on http://host:port/metrics from a daemon thread"""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = tracer.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
@@ -1,64 +1,812 @@
 # vector_store.py
 
+import contextvars
+import logging
 import os
-from typing import List, Dict
-from langchain_openai import OpenAIEmbeddings
-from langchain_qdrant import QdrantVectorStore
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable, List, Dict, Optional, Union
+import numpy as np
+
+from batch_embedder import BatchEmbedder, MAX_TOKENS_PER_BATCH
+from chunk_store import ChunkStore, chunk_metadata_hash, chunk_point_id
+from credentials import key_fingerprint, shared_http_client
+from embedding_cache import EmbeddingCache
+from index_snapshot import load_snapshot, write_snapshot
+from lexical_index import BM25Index, reciprocal_rank_fusion
+from local_index import RESCORE_FACTOR, STORAGE_MODES, LocalIndex
+from query_cache import QueryBatcher, QueryEmbeddingCache, normalize_query
+from shard_router import ShardRouter, partition
+from tracing import incr, span
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "chai_docs"
+EMBEDDING_MODEL = "text-embedding-3-large"
+# text-embedding-3-large has 3072 dimensions
+EMBEDDING_SIZE = 3072
+UPSERT_BATCH_SIZE = 256
+DEFAULT_SNAPSHOT_PATH = "index_snapshot.bin"
+# Each retriever contributes this many candidates per result to fusion
+FUSION_FETCH_FACTOR = 4
+# Payload layout used by langchain_qdrant.QdrantVectorStore
+CONTENT_KEY = "page_content"
+METADATA_KEY = "metadata"
+# Keyword-indexed in Qdrant so a routed search filters to its shards' pages
+SOURCE_KEY = f"{METADATA_KEY}.source"
+# chunk_metadata_hash of the point's metadata, so a sync spots metadata drift
+METADATA_HASH_KEY = "metadata_hash"
+# Per-key query embedders kept around for callers searching with their own key
+MAX_KEY_EMBEDDERS = 256
+
+# langchain_openai and qdrant_client take seconds to import, so they are
+# imported where first used: a Streamlit script that only renders the
+# API-key screen, or a search served from the snapshot, never pays for them.
+
 
 class VectorStore:
-    def __init__(self, api_key: str):
-        # 1. Init OpenAI embeddings (text-embedding-3-large)
-        self.embeddings = OpenAIEmbeddings(
-            model="text-embedding-3-large",
-            openai_api_key=api_key
-        )
+    def __init__(
+        self,
+        api_key: str,
+        cache_dir: str = None,
+        snapshot_path: str = None,
+        backend: str = None,
+        warm_start: bool = True,
+        query_cache: QueryEmbeddingCache = None,
+        storage: str = None,
+        dims: int = None,
+        routing: bool = None
+    ):
+        # 1. OpenAI embeddings are created lazily, so a fully cached rebuild
+        #    works offline (and without a key). Searches can bring their own
+        #    key: the index is shared, only the embeddings client is per key
+        self.api_key = api_key
+        self._embeddings = None
+        self._bulk_embeddings = None
+        self._key_embeddings = OrderedDict()  # key fingerprint -> OpenAIEmbeddings
+        self._query_batcher = None
+        self._lazy_lock = threading.RLock()  # sessions share a store
+
+        # 1b. Vector storage: "float32", or "int8"/"binary" quantized with
+        #     full-precision rescoring (in Qdrant and the local index); the
+        #     local index can also search only the leading `dims` dimensions
+        self.storage = storage or os.getenv("VECTOR_STORAGE", "float32")
+        if self.storage not in STORAGE_MODES:
+            raise ValueError(f"Unknown vector storage: {self.storage}")
+        self.dims = int(dims or os.getenv("VECTOR_DIMS", EMBEDDING_SIZE))
+        self.rescore_factor = int(os.getenv("RESCORE_FACTOR", RESCORE_FACTOR))
+        self.cache_dir = cache_dir or os.getenv("EMBEDDING_CACHE_DIR", ".embedding_cache")
 
-        # 2. Connect to Qdrant: either memory or your Docker URL
+        # 2. Qdrant: your Docker URL (connected now, so a bad URL fails fast)
+        #    or a fresh in-memory collection, created when first needed
         qdrant_url = os.getenv("QDRANT_URL")
+        self.qdrant_url = qdrant_url
+        self.collection_name = COLLECTION_NAME
+        self._client = None
         if qdrant_url:
-            self.client = QdrantClient(url=qdrant_url, prefer_grpc=True)
-        else:
-            self.client = QdrantClient(":memory:")
-        
-        # 3. Ensure collection exists
-        collection_name = "chai_docs"
-        if not self.client.collection_exists(collection_name):
-            # text-embedding-3-large has 3072 dimensions
-            embedding_size = 3072
-            self.client.create_collection(
-                collection_name=collection_name,
-                vectors_config=VectorParams(
-                    size=embedding_size,
-                    distance=Distance.COSINE
-                )
+            self.client
+
+        # 3b. Search backend: "local" (NumPy matrix in-process) or "qdrant"
+        self.backend = backend or os.getenv("VECTOR_BACKEND") or ("qdrant" if qdrant_url else "local")
+        if self.backend not in ("local", "qdrant"):
+            raise ValueError(f"Unknown vector backend: {self.backend}")
+        self.local_index = None
+        self.lexical_index = None
+
+        # 3d. Series shards: the local index and BM25 keep each series' chunks
+        #     contiguous, and a router picks the ones a question needs
+        self.routing = os.getenv("SHARD_ROUTING", "1") != "0" if routing is None else routing
+        self.local_shards = None  # series -> [start, end) rows of local_index
+        self.lexical_shards = None  # series -> [start, end) rows of lexical_index
+        self.shard_sources = None  # series -> source URLs, for Qdrant filters
+        self.router = None
+        self.last_route = None
+
+        # Dense retrieval (query embedding + vector search) runs here while
+        # BM25 runs on the caller's thread
+        self.dense_timeout = float(os.getenv("DENSE_TIMEOUT", "3.0"))
+        self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="dense-search")
+        self.last_timings = {}
+
+        # 3c. Warm-start a fresh in-memory collection from the prebuilt snapshot
+        self.snapshot_path = snapshot_path or os.getenv("INDEX_SNAPSHOT", DEFAULT_SNAPSHOT_PATH)
+        self.snapshot = None
+        self._snapshot_pending = False
+        if warm_start and not qdrant_url and os.path.exists(self.snapshot_path):
+            self.load_snapshot(self.snapshot_path)
+
+        # 4. Content-addressed embedding cache on disk
+        self.cache = EmbeddingCache(
+            model=EMBEDDING_MODEL,
+            dim=EMBEDDING_SIZE,
+            cache_dir=self.cache_dir
+        )
+
+        # 5. Question embeddings: in-memory LRU (pass one in to share it
+        #    across stores) in front of a micro-batcher
+        self.query_cache = query_cache or QueryEmbeddingCache(
+            max_entries=int(os.getenv("QUERY_CACHE_SIZE", "2048"))
+        )
+
+    @property
+    def client(self):
+        # 3. Connect on first use and ensure the collection exists
+        with self._lazy_lock:
+            if self._client is None:
+                from qdrant_client import QdrantClient
+                from qdrant_client.models import Distance, VectorParams
+
+                if self.qdrant_url:
+                    client = QdrantClient(url=self.qdrant_url, prefer_grpc=True)
+                else:
+                    client = QdrantClient(":memory:")
+                if not client.collection_exists(self.collection_name):
+                    quantization = self._quantization_config()
+                    client.create_collection(
+                        collection_name=self.collection_name,
+                        vectors_config=VectorParams(
+                            size=EMBEDDING_SIZE,
+                            distance=Distance.COSINE,
+                            # Quantized vectors stay in RAM; originals are only read to rescore
+                            on_disk=quantization is not None
+                        ),
+                        quantization_config=quantization
+                    )
+                if self.qdrant_url:
+                    # Routed searches filter on source; a no-op if the index exists
+                    from qdrant_client.models import PayloadSchemaType
+
+                    client.create_payload_index(
+                        collection_name=self.collection_name,
+                        field_name=SOURCE_KEY,
+                        field_schema=PayloadSchemaType.KEYWORD
+                    )
+                self._client = client
+            return self._client
+
+    def disconnect(self):
+        """Close a remote Qdrant connection; the next use reconnects.
+
+        Call it before forking workers: a gRPC channel can't be shared across
+        a fork. The in-memory client holds the index itself, so it's kept.
+        """
+        with self._lazy_lock:
+            if self.qdrant_url and self._client is not None:
+                self._client.close()
+                self._client = None
+
+    def _quantization_config(self):
+        from qdrant_client import models
+
+        if self.storage == "int8":
+            return models.ScalarQuantization(
+                scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True)
             )
+        if self.storage == "binary":
+            return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+        return None
+
+    def search_params(self):
+        """Qdrant search params: oversample the quantized index and rescore with the originals.
+
+        In-memory Qdrant always searches exactly, so it gets none.
+        """
+        if self.storage == "float32" or not self.qdrant_url:
+            return None
+        from qdrant_client import models
+
+        return models.SearchParams(
+            quantization=models.QuantizationSearchParams(rescore=True, oversampling=float(self.rescore_factor))
+        )
+
+    def _make_local(self, vectors, payloads: List[Dict], normalized: bool = False) -> LocalIndex:
+        # Rows are grouped by series so each shard is one contiguous slice;
+        # snapshots are saved grouped, so theirs stay a zero-copy mmap view
+        order, self.local_shards = partition(payloads)
+        if order != list(range(len(order))):
+            vectors = np.asarray(vectors)[order]
+            payloads = [payloads[i] for i in order]
+        return LocalIndex(
+            vectors,
+            payloads,
+            normalized=normalized,
+            storage=self.storage,
+            dims=self.dims,
+            rescore_factor=self.rescore_factor,
+            # Full-precision vectors not already in the snapshot's mmap go to disk
+            spill_dir=self.cache_dir
+        )
+
+    @staticmethod
+    def _make_embeddings(api_key: str, max_retries: int = 2):
+        from langchain_openai import OpenAIEmbeddings
 
-        # 4. Wrap it in LangChain’s store
-        self.vector_store = QdrantVectorStore(
-            client=self.client,
-            collection_name=collection_name,
-            embedding=self.embeddings
+        # Token budgeting already happens in BatchEmbedder and chunks are
+        # far below the model's context, so skip LangChain's re-tokenizing
+        return OpenAIEmbeddings(
+            model=EMBEDDING_MODEL,
+            openai_api_key=api_key,
+            check_embedding_ctx_length=False,
+            max_retries=max_retries,
+            http_client=shared_http_client()
         )
 
-    def add_chunks(self, chunks: List[Dict]):
-        # Extract texts + metadata, then upsert in batch
+    @property
+    def embeddings(self):
+        # Init OpenAI embeddings (text-embedding-3-large) on first use
+        with self._lazy_lock:
+            if self._embeddings is None:
+                self._embeddings = self._make_embeddings(self.api_key)
+            return self._embeddings
+
+    @property
+    def bulk_embeddings(self):
+        # No client-side retries: BatchEmbedder has to see every 429 so its
+        # limiter can back off, instead of the client sleeping on them
+        with self._lazy_lock:
+            if self._bulk_embeddings is None:
+                self._bulk_embeddings = self._make_embeddings(self.api_key, max_retries=0)
+            return self._bulk_embeddings
+
+    def embeddings_for(self, api_key: str = None):
+        """Embeddings client billed to `api_key` (the store's own by default)"""
+        if not api_key or api_key == self.api_key:
+            return self.embeddings
+        fingerprint = key_fingerprint(api_key)
+        with self._lazy_lock:
+            embeddings = self._key_embeddings.get(fingerprint)
+            if embeddings is None:
+                embeddings = self._key_embeddings[fingerprint] = self._make_embeddings(api_key)
+                while len(self._key_embeddings) > MAX_KEY_EMBEDDERS:
+                    self._key_embeddings.popitem(last=False)
+            self._key_embeddings.move_to_end(fingerprint)
+            return embeddings
+
+    @property
+    def query_batcher(self) -> QueryBatcher:
+        # Concurrent sessions on this store share embeddings requests, whatever key they use
+        with self._lazy_lock:
+            if self._query_batcher is None:
+                self._query_batcher = QueryBatcher(
+                    lambda texts: self.embeddings.embed_documents(texts),
+                    max_wait=float(os.getenv("QUERY_BATCH_WAIT_MS", "5")) / 1000
+                )
+            return self._query_batcher
+
+    def _upsert(self, texts: List[str], metadatas: List[Dict], vectors):
+        # Upsert straight into Qdrant using LangChain's payload layout
+        from qdrant_client.models import PointStruct
+
+        for start in range(0, len(texts), UPSERT_BATCH_SIZE):
+            end = start + UPSERT_BATCH_SIZE
+            points = [
+                PointStruct(
+                    id=chunk_point_id(metadata.get("source", ""), text),
+                    vector=vector.tolist(),
+                    payload={
+                        CONTENT_KEY: text,
+                        METADATA_KEY: metadata,
+                        METADATA_HASH_KEY: chunk_metadata_hash(metadata)
+                    }
+                )
+                for text, metadata, vector in zip(
+                    texts[start:end], metadatas[start:end], vectors[start:end]
+                )
+            ]
+            self.client.upsert(collection_name=self.collection_name, points=points)
+
+    def add_chunks(self, chunks: List[Dict], progress: Callable[[int, int], None] = None) -> Dict:
+        """Embed cache misses only, then upsert every chunk; returns hit/miss and throughput stats"""
+        self._flush_snapshot()
         texts = [chunk["content"] for chunk in chunks]
         metadatas = [
             {k: v for k, v in chunk.items() if k != "content"}
             for chunk in chunks
         ]
-        self.vector_store.add_texts(texts=texts, metadatas=metadatas)
 
-    def search(self, query: str, k: int = 3) -> List[Dict]:
-        # Return top-k similar chunks, plus scores
-        results = self.vector_store.similarity_search_with_score(query, k=k)
+        # 1. Look every chunk up in the on-disk cache; hits go straight in
+        keys = [EmbeddingCache.key(text) for text in texts]
+        vectors, missing = self.cache.get_many(keys)
+        missing_set = set(missing)
+        hits = [i for i in range(len(texts)) if i not in missing_set]
+        self._upsert([texts[i] for i in hits], [metadatas[i] for i in hits], vectors[hits])
+
+        # 2. Embed misses in token-budgeted parallel batches; each finished
+        #    batch is cached and upserted while the next ones are embedding
+        stats = {"chunks_per_sec": 0.0, "retries": 0}
+        if missing:
+            def on_batch(batch: List[int], fresh):
+                positions = [missing[j] for j in batch]
+                self.cache.put_many([keys[i] for i in positions], fresh)
+                self._upsert([texts[i] for i in positions], [metadatas[i] for i in positions], fresh)
+
+            embedder = BatchEmbedder(
+                self.bulk_embeddings.embed_documents,
+                max_tokens_per_batch=int(os.getenv("EMBED_BATCH_TOKENS", MAX_TOKENS_PER_BATCH)),
+                max_workers=int(os.getenv("EMBED_WORKERS", "4"))
+            )
+            stats = embedder.embed([texts[i] for i in missing], on_batch=on_batch, progress=progress)
+
+        # The local mirrors are rebuilt from Qdrant on the next search
+        self._invalidate()
+
+        return {
+            "total": len(texts),
+            "hits": len(hits),
+            "misses": len(missing),
+            "chunks_per_sec": stats["chunks_per_sec"],
+            "retries": stats["retries"]
+        }
+
+    def sync_chunks(self, chunks: Union[List[Dict], ChunkStore], progress: Callable[[int, int], None] = None) -> Dict:
+        """Make the collection match `chunks`: upsert new, update drifted metadata, delete stale.
+
+        Point IDs are source URL + content hash, so a chunk that only moved
+        (new chunk_id, headings) keeps its point: the metadata hash stored in
+        the payload spots the drift and the payload is rewritten in place,
+        with no embedding or vector upload.
+
+        With a ChunkStore the point IDs and metadata hashes come from its
+        index, and only the records of new or drifted chunks are read.
+        """
+        self._flush_snapshot()
+
+        # 1. Desired state, keyed by stable IDs (duplicates collapse) -> (chunk or store row, metadata hash)
+        wanted = {}
+        if isinstance(chunks, ChunkStore):
+            for row, (point_id, digest) in enumerate(zip(chunks.point_ids(), chunks.metadata_hashes())):
+                wanted.setdefault(point_id, (row, digest))
+        else:
+            for chunk in chunks:
+                wanted.setdefault(
+                    chunk_point_id(chunk.get("source", ""), chunk["content"]), (chunk, chunk_metadata_hash(chunk))
+                )
+
+        # 2. Current state: IDs and metadata hashes only, no vectors over the wire
+        existing = {}
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                limit=1024,
+                offset=offset,
+                with_payload=[METADATA_HASH_KEY],
+                with_vectors=False
+            )
+            existing.update((str(point.id), (point.payload or {}).get(METADATA_HASH_KEY)) for point in points)
+            if offset is None:
+                break
+
+        # 3. Only the diff touches embeddings and Qdrant
+        new_chunks = [chunk for point_id, (chunk, _) in wanted.items() if point_id not in existing]
+        drifted = [
+            (point_id, chunk, digest) for point_id, (chunk, digest) in wanted.items()
+            if point_id in existing and existing[point_id] != digest
+        ]
+        if isinstance(chunks, ChunkStore):
+            new_chunks = chunks.get_many(new_chunks)
+            drifted = [
+                (point_id, chunk, digest)
+                for (point_id, _, digest), chunk in zip(drifted, chunks.get_many([row for _, row, _ in drifted]))
+            ]
+        stale = [point_id for point_id in existing if point_id not in wanted]
+
+        stats = {"total": len(wanted), "hits": 0, "misses": 0, "chunks_per_sec": 0.0, "retries": 0}
+        if new_chunks:
+            stats.update(self.add_chunks(new_chunks, progress=progress))
+            stats["total"] = len(wanted)
+        from qdrant_client.models import PointIdsList, SetPayload, SetPayloadOperation
+
+        # 4. Same content, new metadata: rewrite the payload, keep the vector
+        for start in range(0, len(drifted), UPSERT_BATCH_SIZE):
+            self.client.batch_update_points(
+                collection_name=self.collection_name,
+                update_operations=[
+                    SetPayloadOperation(set_payload=SetPayload(
+                        payload={
+                            METADATA_KEY: {k: v for k, v in chunk.items() if k != "content"},
+                            METADATA_HASH_KEY: digest
+                        },
+                        points=[point_id]
+                    ))
+                    for point_id, chunk, digest in drifted[start:start + UPSERT_BATCH_SIZE]
+                ]
+            )
+        if drifted:
+            self._invalidate()
+
+        for start in range(0, len(stale), UPSERT_BATCH_SIZE):
+            self.client.delete(
+                collection_name=self.collection_name,
+                points_selector=PointIdsList(points=stale[start:start + UPSERT_BATCH_SIZE])
+            )
+        if stale:
+            self._invalidate()
+
+        stats.update({
+            "upserted": len(new_chunks),
+            "deleted": len(stale),
+            "metadata_updated": len(drifted),
+            "unchanged": len(wanted) - len(new_chunks) - len(drifted)
+        })
+        return stats
+
+    def load_snapshot(self, path: str) -> int:
+        """Load a snapshot file; returns the point count.
+
+        With the local backend searches run straight off the mmapped matrix and
+        the Qdrant upload is deferred until something actually needs Qdrant.
+        The Qdrant backend copies the points into the collection, so it loads
+        at upload speed, not mmap speed. Loading is idempotent: points keep
+        their chunk IDs and ones already in the collection aren't re-sent.
+        """
+        self.snapshot = load_snapshot(path)
+        self._snapshot_pending = True
+        if self.backend == "local":
+            self.local_index = self._make_local(self.snapshot.vectors, self.snapshot.payloads, normalized=True)
+        else:
+            self._flush_snapshot()
+        return len(self.snapshot)
+
+    def _flush_snapshot(self):
+        """Upload the pending snapshot, skipping points the collection already has"""
+        if not self._snapshot_pending:
+            return
+        self._snapshot_pending = False
+        # 1. Same IDs as _upsert, so a later add/sync of the same chunks overwrites
+        ids = [
+            chunk_point_id(p.get(METADATA_KEY, {}).get("source", ""), p.get(CONTENT_KEY, ""))
+            for p in self.snapshot.payloads
+        ]
+        vectors, payloads = self.snapshot.vectors, self.snapshot.payloads
+
+        # 2. Rebuilds and repeated loads only send what's missing
+        if self.client.count(collection_name=self.collection_name).count:
+            existing = set()
+            for start in range(0, len(ids), UPSERT_BATCH_SIZE):
+                points = self.client.retrieve(
+                    collection_name=self.collection_name,
+                    ids=ids[start:start + UPSERT_BATCH_SIZE],
+                    with_payload=False,
+                    with_vectors=False
+                )
+                existing.update(str(point.id) for point in points)
+            keep = [i for i, point_id in enumerate(ids) if point_id not in existing]
+            if not keep:
+                return
+            ids = [ids[i] for i in keep]
+            vectors = vectors[keep]
+            payloads = [payloads[i] for i in keep]
+
+        # 3. upload_collection batches the matrix, no per-point objects up front
+        self.client.upload_collection(
+            collection_name=self.collection_name,
+            vectors=vectors,
+            payload=payloads,
+            ids=ids,
+            batch_size=UPSERT_BATCH_SIZE
+        )
+
+    def _invalidate(self):
+        self.local_index = None
+        self.lexical_index = None
+        self.router = None
+
+    def _scroll_points(self, with_vectors: bool = True):
+        """Yield every point in the collection with its payload (and vector)"""
+        self._flush_snapshot()
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                limit=UPSERT_BATCH_SIZE,
+                offset=offset,
+                with_payload=True,
+                with_vectors=with_vectors
+            )
+            yield from points
+            if offset is None:
+                break
+
+    def _local(self) -> LocalIndex:
+        # Built under the lock: the dense worker thread and the caller's
+        # thread can both get here first
+        local_index = self.local_index
+        if local_index is None:
+            with self._lazy_lock:
+                if self.local_index is None:
+                    vectors, payloads = [], []
+                    for point in self._scroll_points():
+                        vectors.append(point.vector)
+                        payloads.append(point.payload)
+                    self.local_index = self._make_local(
+                        np.asarray(vectors, dtype=np.float32).reshape(-1, EMBEDDING_SIZE),
+                        payloads
+                    )
+                local_index = self.local_index
+        return local_index
+
+    def _lexical(self) -> BM25Index:
+        lexical_index = self.lexical_index
+        if lexical_index is None:
+            with self._lazy_lock:
+                if self.lexical_index is None:
+                    self._build_lexical()
+                lexical_index = self.lexical_index
+        return lexical_index
+
+    def _build_lexical(self):
+        # With the local backend both indexes share one payload list, so
+        # BM25 hit ids are also rows of the vector index
+        if self.backend == "local" or self.local_index is not None:
+            payloads = self._local().payloads
+            ranges = self.local_shards
+        else:
+            if self.snapshot is not None and self._snapshot_pending:
+                payloads = self.snapshot.payloads
+            else:
+                payloads = [point.payload for point in self._scroll_points(with_vectors=False)]
+            order, ranges = partition(payloads)
+            payloads = [payloads[i] for i in order]
+        self.lexical_shards = ranges
+        self.shard_sources = {
+            name: sorted({p.get(METADATA_KEY, {}).get("source", "") for p in payloads[start:end]})
+            for name, (start, end) in ranges.items()
+        }
+        # Set last, so a lock-free reader never sees the index without its shards
+        self.lexical_index = BM25Index(payloads)
+
+    def _router(self) -> ShardRouter:
+        router = self.router
+        if router is None:
+            with self._lazy_lock:
+                if self.router is None:
+                    lexical = self._lexical()
+                    centroids = None
+                    if self.local_index is not None and self.local_shards == self.lexical_shards:
+                        # Mean vector per shard, a block of rows at a time
+                        centroids = np.zeros((len(self.local_shards), EMBEDDING_SIZE), dtype=np.float32)
+                        for i, (start, end) in enumerate(self.local_shards.values()):
+                            for block in range(start, end, 65_536):
+                                rows = np.arange(block, min(end, block + 65_536))
+                                centroids[i] += self.local_index.vectors_at(rows).sum(axis=0)
+                        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+                    self.router = ShardRouter(self.lexical_shards, lexical, centroids)
+                router = self.router
+        return router
+
+    def route(self, query: str, vector: List[float] = None) -> Optional[List[str]]:
+        """Series shards worth searching for a question, or None for all of them.
+
+        Keyword-only unless the question's embedding is passed in; see
+        ShardRouter. Off with SHARD_ROUTING=0.
+        """
+        if not self.routing:
+            return None
+        return self._router().route(query, vector)
+
+    def shard_filter(self, shards: List[str] = None):
+        """Qdrant filter limiting a query to the pages of these shards (None for all)"""
+        if not shards:
+            return None
+        from qdrant_client import models
+
+        self._lexical()
+        sources = [source for name in shards for source in self.shard_sources.get(name, [])]
+        return models.Filter(must=[models.FieldCondition(key=SOURCE_KEY, match=models.MatchAny(any=sources))])
+
+    @staticmethod
+    def _shard_ranges(ranges: Dict, shards: List[str] = None):
+        return None if shards is None else [ranges[name] for name in shards if name in ranges]
+
+    def save_snapshot(self, path: str = None) -> int:
+        """Dump every point in the collection to a snapshot file; returns the point count"""
+        vectors, payloads = [], []
+        for point in self._scroll_points():
+            vectors.append(point.vector)
+            payloads.append(point.payload)
+
+        # Grouped by series, so loading it needs no reordering copy
+        order, _ = partition(payloads)
+        write_snapshot(
+            path or self.snapshot_path,
+            np.asarray(vectors, dtype=np.float32).reshape(-1, EMBEDDING_SIZE)[order],
+            [payloads[i] for i in order]
+        )
+        return len(payloads)
+
+    def embed_query(self, query: str, api_key: str = None) -> np.ndarray:
+        """Embed a question once so callers can reuse the vector.
+
+        Repeat questions come from the query cache; misses from concurrent
+        callers are merged into one embeddings request (per key) by the
+        batcher. `api_key` bills the call to the caller's key. The normalized
+        question is only the cache key; the question itself is what's embedded.
+        """
+        key = normalize_query(query)
+        vector = self.query_cache.get(key)
+        incr("query_embeddings", cache="miss" if vector is None else "hit")
+        if vector is None:
+            embed_fn = self.embeddings_for(api_key).embed_documents if api_key else None
+            vector = self.query_cache.put(key, self.query_batcher.embed(query, embed_fn))
+        return vector
+
+    def embed_query_within(self, query: str, api_key: str = None) -> Optional[np.ndarray]:
+        """embed_query bounded by `dense_timeout`, like the dense side of a
+        hybrid search; None when it's slower or fails (answer from BM25)"""
+        future = self._executor.submit(contextvars.copy_context().run, self.embed_query, query, api_key)
+        try:
+            return future.result(timeout=self.dense_timeout)
+        except FutureTimeout:
+            incr("dense_fallbacks", reason="timeout")
+            logger.warning(f"Question embedding slower than {self.dense_timeout}s, answering from BM25 only")
+        except Exception as e:
+            incr("dense_fallbacks", reason="error")
+            logger.warning(f"Question embedding failed ({e}), answering from BM25 only")
+        return None
+
+    def query_stats(self) -> Dict:
+        """Query-embedding cache hit rate and batch sizes"""
+        stats = {"cache": self.query_cache.stats()}
+        if self._query_batcher is not None:
+            stats["batcher"] = self._query_batcher.stats()
+        return stats
+
+    def search(
+        self,
+        query: str,
+        k: int = 3,
+        vector: List[float] = None,
+        mode: str = "hybrid",
+        with_vectors: bool = False,
+        api_key: str = None,
+        shards: List[str] = None
+    ) -> List[Dict]:
+        """Top-k chunks for a question, plus scores.
+
+        A hit's "score" ranks it within this result only: cosine similarity
+        for mode="dense", BM25 for mode="lexical", and the reciprocal rank
+        fusion value (sum of 1 / (60 + rank), at most ~0.03) for a fused
+        hybrid result. Hybrid results that fell back to one retriever carry
+        that retriever's score. Don't compare it to a cosine threshold.
+
+        mode="hybrid" runs BM25 and dense retrieval concurrently and fuses them
+        with reciprocal rank fusion; if the dense side (which needs an
+        embeddings call unless `vector` is given) misses `dense_timeout`,
+        the lexical results are used alone. mode="lexical" makes no API call
+        at all; mode="dense" is vector search only. `with_vectors` adds each
+        hit's stored vector as "vector" (for reranking) and `api_key` is
+        used to embed the question, if needed. Both retrievers only search
+        the series in `shards`; by default the router picks them (all of
+        them when it isn't confident), and if the routed shards come up
+        with fewer than k hits the search is repeated over all of them.
+        Each stage is a
+        `search.*` tracing span; this call's latencies (ms) also end up in
+        `last_timings`.
+        """
+        timings = {}
+        with span("search", mode=mode) as total:
+            routed = shards is None
+            if routed:
+                with span("search.route") as stage:
+                    shards = self.route(query, vector)
+                timings["route"] = stage.ms
+            incr("shard_routes", result="routed" if shards else "all")
+            self.last_route = shards
+            results = self._retrieve(query, vector, k, mode, timings, api_key, shards)
+            if routed and shards and len(results) < k:
+                # The router's shards were too narrow: search everything instead
+                incr("shard_routes", result="fallback")
+                self.last_route = None
+                results = self._retrieve(query, vector, k, mode, timings, api_key, None)
+            if with_vectors:
+                self._attach_vectors(results, timings)
+        timings["total"] = total.ms
+
+        self.last_timings = timings
+        logger.info("search timings (ms): " + ", ".join(f"{name}={ms:.1f}" for name, ms in timings.items()))
+        return results
+
+    def _retrieve(
+        self, query: str, vector: List[float], k: int, mode: str, timings: Dict, api_key: str, shards: List[str]
+    ) -> List[Dict]:
+        if mode == "dense":
+            return self._dense(query, vector, k, timings, api_key, shards)
+        return self._hybrid(query, vector, k, mode, timings, api_key, shards)
+
+    def _hybrid(
+        self, query: str, vector: List[float], k: int, mode: str, timings: Dict, api_key: str = None,
+        shards: List[str] = None
+    ) -> List[Dict]:
+        fetch_k = k * FUSION_FETCH_FACTOR
+        dense_future = None
+        if mode == "hybrid":
+            # The worker runs in a copy of this context, so its spans nest under "search"
+            dense_future = self._executor.submit(
+                contextvars.copy_context().run, self._dense, query, vector, fetch_k, timings, api_key, shards
+            )
+
+        with span("search.lexical") as stage:
+            lexical = self.lexical_search(query, k=fetch_k, shards=shards)
+        timings["lexical"] = stage.ms
+
+        dense = []
+        if dense_future is not None:
+            try:
+                dense = dense_future.result(timeout=self.dense_timeout)
+            except FutureTimeout:
+                incr("dense_fallbacks", reason="timeout")
+                logger.warning(f"Dense retrieval slower than {self.dense_timeout}s, answering from BM25 only")
+            except Exception as e:
+                incr("dense_fallbacks", reason="error")
+                logger.warning(f"Dense retrieval failed ({e}), answering from BM25 only")
+
+        with span("search.fuse") as stage:
+            if dense and lexical:
+                results = reciprocal_rank_fusion([dense, lexical], k=k)
+            else:
+                results = (dense or lexical)[:k]
+        timings["fuse"] = stage.ms
+        return results
+
+    def _attach_vectors(self, hits: List[Dict], timings: Dict):
+        with span("search.vectors") as stage:
+            if self.backend == "local":
+                # Hit ids are rows of the in-process matrix: no copy over the wire
+                vectors = self._local().vectors_at([hit["id"] for hit in hits])
+            else:
+                # One retrieve call for every hit, keyed by the stable point IDs
+                ids = [chunk_point_id(hit["metadata"].get("source", ""), hit["content"]) for hit in hits]
+                points = self.client.retrieve(
+                    collection_name=self.collection_name,
+                    ids=ids,
+                    with_payload=False,
+                    with_vectors=True
+                )
+                by_id = {str(point.id): point.vector for point in points}
+                vectors = [by_id.get(point_id) for point_id in ids]
+            for hit, vec in zip(hits, vectors):
+                hit["vector"] = None if vec is None else np.asarray(vec, dtype=np.float32)
+        timings["vectors"] = stage.ms
+
+    def _dense(
+        self, query: str, vector: List[float], k: int, timings: Dict, api_key: str = None, shards: List[str] = None
+    ) -> List[Dict]:
+        if vector is None:
+            with span("search.embed") as stage:
+                vector = self.embed_query(query, api_key)
+            timings["embed"] = stage.ms
+        with span("search.dense", backend=self.backend) as stage:
+            results = self.search_by_vector(vector, k=k, shards=shards)
+        timings["dense"] = stage.ms
+        return results
+
+    def lexical_search(self, query: str, k: int = 3, shards: List[str] = None) -> List[Dict]:
+        """BM25 hits only (within `shards`, if given); never calls the embeddings API"""
+        index = self._lexical()
+        return index.search(query, k=k, ranges=self._shard_ranges(self.lexical_shards, shards))
+
+    def search_by_vector(self, vector: List[float], k: int = 3, shards: List[str] = None) -> List[Dict]:
+        if self.backend == "local":
+            index = self._local()
+            return index.search(vector, k=k, ranges=self._shard_ranges(self.local_shards, shards))
+
+        # Straight to Qdrant: a vector query needs no embeddings client (or key)
+        self._flush_snapshot()
+        response = self.client.query_points(
+            collection_name=self.collection_name,
+            query=np.asarray(vector, dtype=np.float32).tolist(),
+            limit=k,
+            with_payload=True,
+            search_params=self.search_params(),
+            query_filter=self.shard_filter(shards)
+        )
         return [
             {
-                "content": doc.page_content,
-                "metadata": doc.metadata,
-                "score": score
+                "content": point.payload.get(CONTENT_KEY, ""),
+                "metadata": point.payload.get(METADATA_KEY, {}),
+                "score": point.score
             }
-            for doc, score in results
+            for point in response.points
         ]